@@ -128,4 +128,87 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-RIOT_API_KEY = os.getenv('RIOT_API_KEY')
\ No newline at end of file
+RIOT_API_KEY = os.getenv('RIOT_API_KEY')
+
+# Pula połączeń do Riot API (stats.utils.RiotClient)
+RIOT_HTTP_POOL_SIZE = int(os.getenv('RIOT_HTTP_POOL_SIZE', 10))
+RIOT_HTTP_TIMEOUT = (3.05, float(os.getenv('RIOT_HTTP_READ_TIMEOUT', 10)))
+RIOT_HTTP_RETRIES = int(os.getenv('RIOT_HTTP_RETRIES', 3))
+
+# Limiter zapytań do Riot API (stats.ratelimit.RateLimiter) – kubełki współdzielone
+# przez wszystkie procesy przez plik SQLite.
+RIOT_RATE_LIMIT_DB = BASE_DIR / 'riot_ratelimit.sqlite3'
+RIOT_RATE_LIMIT_DEFAULT = os.getenv('RIOT_RATE_LIMIT_DEFAULT', '20:1,100:120')
+RIOT_RATE_LIMIT_MAX_WAIT = float(os.getenv('RIOT_RATE_LIMIT_MAX_WAIT', 30))
+RIOT_RATE_LIMIT_RETRIES = int(os.getenv('RIOT_RATE_LIMIT_RETRIES', 2))
+# Część każdego kubełka, której dana klasa priorytetu nie może zużyć – zostaje dla klas ważniejszych
+RIOT_PRIORITY_RESERVES = {
+    'interactive': 0.0,
+    'user': 0.1,
+    'background': 0.5,
+}
+
+# Liczba wątków pobierających równolegle szczegóły meczów
+RIOT_FETCH_WORKERS = int(os.getenv('RIOT_FETCH_WORKERS', 8))
+
+# Cache odpowiedzi Riot API (stats.riot_cache.ResponseCache) – czas życia w sekundach per metoda
+RIOT_CACHE_DB = BASE_DIR / 'riot_cache.sqlite3'
+RIOT_CACHE_MAX_ENTRIES = int(os.getenv('RIOT_CACHE_MAX_ENTRIES', 20000))
+RIOT_CACHE_NEGATIVE_TTL = 5 * 60
+RIOT_CACHE_TTLS = {
+    'match-v5.match': 30 * 24 * 3600,     # zakończone mecze się nie zmieniają
+    'match-v5.match-ids': 60,
+    'account-v1.by-riot-id': 6 * 3600,
+    'account-v1.by-puuid': 6 * 3600,
+    'account-v1.region-by-puuid': 6 * 3600,
+    'summoner-v4.by-puuid': 10 * 60,
+    'league-v4.by-summoner': 2 * 60,      # zmienia się po każdej grze
+    'static.queues': 24 * 3600,           # zmienia się raz na patch
+    'ddragon.versions': 3600,
+    'ddragon.champions': 30 * 24 * 3600,  # adres zawiera numer patcha
+}
+
+# Wersja Data Dragon używana, zanim `sync_static_data` zapisze aktualną (adresy ikon)
+DDRAGON_DEFAULT_VERSION = os.getenv('DDRAGON_DEFAULT_VERSION', '15.11.1')
+# Co ile sekund proces sprawdza, czy inny proces nie zsynchronizował nowszych danych statycznych
+STATIC_DATA_CHECK_INTERVAL = int(os.getenv('STATIC_DATA_CHECK_INTERVAL', 60))
+# Po ilu sekundach strona główna ponawia nieudaną synchronizację danych statycznych na pustej bazie
+STATIC_DATA_SYNC_RETRY = int(os.getenv('STATIC_DATA_SYNC_RETRY', 300))
+
+# Ile sekund po udanym pobraniu danych Summonera kolejna aktualizacja jest odrzucana
+INGESTION_REFRESH_COOLDOWN = int(os.getenv('INGESTION_REFRESH_COOLDOWN', 120))
+
+# Po ilu sekundach dane profilu uznawane są za nieaktualne – wejście na taki profil pokazuje
+# zapisane dane od razu i zleca ich odświeżenie w tle (stale-while-revalidate)
+PROFILE_FRESHNESS = int(os.getenv('PROFILE_FRESHNESS', 30 * 60))
+
+# Harmonogram odświeżania popularnych profili (manage.py refresh_scheduler): jaka część limitu
+# klucza Riot API może iść na odświeżanie w tle, okres połowicznego wygasania popularności
+# i co ile sekund najwyżej zapisywane jest wejście na profil danego Summonera. Znacznik wejścia
+# leży w CACHES, więc przy kilku workerach cache musi być wspólny (PAGE_CACHE_DIR, Redis, Memcached) –
+# w pamięci procesu każdy worker ma własny znacznik i zapisuje wejścia niezależnie
+REFRESH_SCHEDULER_SHARE = float(os.getenv('REFRESH_SCHEDULER_SHARE', 0.2))
+VIEW_SCORE_HALF_LIFE = int(os.getenv('VIEW_SCORE_HALF_LIFE', 24 * 3600))
+VIEW_TRACK_INTERVAL = int(os.getenv('VIEW_TRACK_INTERVAL', 60))
+
+# Cache wyrenderowanych fragmentów stron (stats.page_cache) – klucz zawiera wersję danych Summonera,
+# więc wpisy nie są unieważniane, tylko wypierane: po PAGE_CACHE_TIMEOUT sekundach albo
+# po przekroczeniu PAGE_CACHE_MAX_ENTRIES (usuwana jest wtedy 1/PAGE_CACHE_CULL_FREQUENCY wpisów).
+# Domyślnie pamięć procesu; PAGE_CACHE_DIR przełącza na cache w plikach wspólny dla workerów.
+PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR')
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 15 * 60))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', 2000))
+PAGE_CACHE_CULL_FREQUENCY = 4
+
+CACHES = {
+    'default': {
+        'BACKEND': ('django.core.cache.backends.filebased.FileBasedCache' if PAGE_CACHE_DIR
+                    else 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': PAGE_CACHE_DIR or 'lolstats-pages',
+        'TIMEOUT': PAGE_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': PAGE_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': PAGE_CACHE_CULL_FREQUENCY,
+        },
+    },
+}
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Summoner, Match, Participant, Champion, Queue
+from .models import (Summoner, Match, Participant, Champion, Queue, IngestionJob, BackfillCheckpoint,
+                     SummonerChampionBreakdown)
 
 @admin.register(Summoner)
 class SummonerAdmin(admin.ModelAdmin):
@@ -16,5 +17,19 @@ class ParticipantAdmin(admin.ModelAdmin):
     list_display = ('summoner', 'match', 'champion', 'kills', 'deaths', 'assists', 'win')
     search_fields = ('summoner__name', 'match__match_id')
 
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ('summoner', 'kind', 'status', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+
+@admin.register(BackfillCheckpoint)
+class BackfillCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('summoner', 'next_start', 'matches_ingested', 'finished', 'updated_at')
+
+@admin.register(SummonerChampionBreakdown)
+class SummonerChampionBreakdownAdmin(admin.ModelAdmin):
+    list_display = ('summoner', 'champion', 'queue', 'lane', 'matches_num', 'wins')
+    list_filter = ('lane',)
+
 admin.site.register(Champion)
 admin.site.register(Queue)
\ No newline at end of file
@@ -0,0 +1,173 @@
+# stats/api.py
+
+import json
+from collections.abc import Callable
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from .models import Participant, Summoner, SummonerChampion, SummonerChampionBreakdown, SummonerQueueStats
+from .page_cache import cached_render, page_cache_key
+from .pagination import KeysetPage
+from .views import HISTORY_PAGE_SIZE, history_filters
+
+
+API_MAX_AGE = 0  # klient zawsze pyta, ale dostaje 304 bez ciała, dopóki dane się nie zmienią
+
+
+def _find_summoner(request, gameName: str, tagLine: str) -> Summoner | None:
+    summoners = Summoner.objects.filter(gameName__iexact=gameName, tagLine__iexact=tagLine)
+    region = request.GET.get('region')
+    if region:
+        summoners = summoners.filter(region=region)
+    return summoners.order_by('pk').first()
+
+
+def _api_response(request, gameName: str, tagLine: str, name: str, parts: tuple,
+                  build: Callable[[Summoner], dict]) -> HttpResponse:
+    """
+    Wspólna obsługa endpointów: odnajduje Summonera (tylko z bazy – API niczego nie pobiera z Riot API),
+    wylicza silny ETag z wersji danych Summonera i parametrów oraz Last-Modified z czasu ostatniego
+    zapisu, a przy zgodnym If-None-Match / If-Modified-Since odpowiada 304 bez budowania odpowiedzi.
+    Ciało odpowiedzi trzymane jest w cache stron pod tym samym kluczem co ETag.
+    """
+    summ = _find_summoner(request, gameName, tagLine)
+    if summ is None:
+        return JsonResponse({'error': f"Nie ma w bazie Summonera {gameName}#{tagLine}."}, status=404)
+
+    etag = quote_etag(page_cache_key(f'api-{name}', summ, *parts).replace(':', '-'))
+    last_modified = summ.data_updated or summ.date_added
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if conditional is None:
+        body = cached_render(f'api-{name}', summ, parts,
+                             lambda: json.dumps(build(summ), cls=DjangoJSONEncoder, ensure_ascii=False))
+        conditional = HttpResponse(body, content_type='application/json')
+    conditional['ETag'] = etag
+    conditional['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(conditional, public=True, max_age=API_MAX_AGE)
+    return conditional
+
+
+def _rank(rank: str | None, wins: int | None, losses: int | None) -> dict | None:
+    if not rank:
+        return None
+    return {'rank': rank, 'wins': wins, 'losses': losses}
+
+
+def serialize_summoner(summ: Summoner) -> dict:
+    # Bez last_refreshed – zmienia się też przy odświeżeniu bez nowych danych, a ETag zależy tylko od data_version
+    return {
+        'puuid': summ.puuid,
+        'game_name': summ.gameName,
+        'tag_line': summ.tagLine,
+        'region': summ.region,
+        'server': summ.server,
+        'level': summ.summoner_level,
+        'icon': summ.icon,
+        'rank_solo': _rank(summ.rank_solo, summ.solo_wins, summ.solo_loses),
+        'rank_flex': _rank(summ.rank_flex, summ.flex_wins, summ.flex_loses),
+        'data_version': summ.data_version,
+    }
+
+
+def serialize_queue_stats(qs: SummonerQueueStats) -> dict:
+    return {
+        'queue_id': qs.queue.queue_id,
+        'name': qs.queue.display_name,
+        'games': qs.games,
+        'wins': qs.wins,
+        'losses': qs.losses,
+        'winratio': round(qs.wins / qs.games * 100, 1) if qs.games else 0.0,
+        'kda': qs.kda,
+        'main_role': qs.main_role,
+        'vision_avg': round(qs.vision_avg, 2),
+        'gold_per_min': qs.gold_per_min,
+        'minions_per_min': round(qs.minions_per_min, 2),
+    }
+
+
+def serialize_participant(p: Participant) -> dict:
+    return {
+        'match_id': p.match.match_id,
+        'queue_id': p.queue_id,
+        'game_name': p.match.game_name,
+        'duration': p.match.game_duration,
+        'timestamp': p.timestamp,
+        'champion': {'key': p.champion.key, 'name': p.champion.name},
+        'lane': p.lane,
+        'win': p.win,
+        'kills': p.kills,
+        'deaths': p.deaths,
+        'assists': p.assists,
+        'kill_participation': p.kill_participation,
+        'farm': p.farm,
+        'gold_earned': p.gold_earned,
+        'wards': p.wards,
+    }
+
+
+@require_GET
+def summoner_profile(request, gameName, tagLine):
+    return _api_response(request, gameName, tagLine, 'profile', (), serialize_summoner)
+
+
+@require_GET
+def summoner_queues(request, gameName, tagLine):
+    def build(summ):
+        stats = (SummonerQueueStats.objects.filter(summoner=summ, games__gt=0)
+                 .select_related('queue').order_by('-games'))
+        return {'results': [serialize_queue_stats(qs) for qs in stats]}
+
+    return _api_response(request, gameName, tagLine, 'queues', (), build)
+
+
+@require_GET
+def summoner_champions(request, gameName, tagLine):
+    def build(summ):
+        breakdown = {}
+        for row in (SummonerChampionBreakdown.objects.filter(summoner=summ)
+                    .select_related('queue').order_by('-matches_num')):
+            breakdown.setdefault(row.champion_id, []).append({
+                'queue_id': row.queue.queue_id,
+                'lane': row.lane,
+                'games': row.matches_num,
+                'wins': row.wins,
+                'winratio': row.winratio,
+                'kda': row.kda,
+            })
+        champions = (SummonerChampion.objects.filter(summoner=summ)
+                     .select_related('champion').order_by('-matches_num'))
+        return {'results': [{
+            'champion': {'key': sc.champion.key, 'name': sc.champion.name, 'icon': sc.champion.icon},
+            'games': sc.matches_num,
+            'winratio': float(sc.winratio or 0),
+            'kda': float(sc.kda or 0),
+            'breakdown': breakdown.get(sc.champion_id, []),
+        } for sc in champions]}
+
+    return _api_response(request, gameName, tagLine, 'champions', (), build)
+
+
+@require_GET
+def summoner_matches(request, gameName, tagLine):
+    """
+    Historia meczów stronicowana kursorem (`after` / `before`) z tymi samymi filtrami co strona profilu.
+    """
+    condition, filters = history_filters(request.GET)
+    after, before = request.GET.get('after'), request.GET.get('before')
+
+    def build(summ):
+        participants = (Participant.objects.filter(condition, summoner=summ)
+                        .select_related('match', 'champion'))
+        page = KeysetPage(participants, HISTORY_PAGE_SIZE, after=after, before=before)
+        return {
+            'filters': filters,
+            'results': [serialize_participant(p) for p in page.object_list],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
+
+    return _api_response(request, gameName, tagLine, 'matches', (after, before, sorted(filters.items())), build)
@@ -3,4 +3,9 @@ from django.apps import AppConfig
 
 class StatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'stats'
\ No newline at end of file
+    name = 'stats'
+
+    def ready(self):
+        # Rejestruje sygnały unieważniające rejestr danych statycznych; sam rejestr
+        # wczytywany jest leniwie przy pierwszym użyciu (bez zapytań do bazy przy starcie)
+        from . import registry  # noqa: F401
\ No newline at end of file
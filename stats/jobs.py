@@ -0,0 +1,202 @@
+# stats/jobs.py
+
+import math
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from .models import IngestionJob, Summoner
+from .ratelimit import BACKGROUND, USER, riot_priority
+from .services import (save_recent_matches_for_summoner, save_summoner_rank_info,
+                       asave_recent_matches_for_summoner, asave_summoner_rank_info,
+                       recalculate_summoner_champions)
+
+
+# Klasa priorytetu zapytań do Riot API dla danego rodzaju zlecenia
+JOB_PRIORITIES = {
+    IngestionJob.KIND_INITIAL: USER,
+    IngestionJob.KIND_UPDATE: USER,
+    IngestionJob.KIND_REFRESH: BACKGROUND,
+}
+
+
+class RefreshCooldown(Exception):
+    """Dane Summonera były odświeżane przed chwilą – aktualizacja możliwa za `retry_after` sekund."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Kolejna aktualizacja możliwa za {retry_after} s.")
+        self.retry_after = retry_after
+
+
+def enqueue_ingestion(summ: Summoner, kind: str = IngestionJob.KIND_UPDATE) -> IngestionJob:
+    """
+    Zleca pobranie danych Summonera w tle (single-flight). Jeżeli dla tego Summonera czeka
+    lub trwa już inne zlecenie, zwraca je zamiast tworzyć kolejne – także gdy dwa procesy
+    zlecają pobranie w tej samej chwili (pilnuje tego unikalny indeks na aktywnych zleceniach).
+    Aktualizacja (także odświeżenie w tle) w ciągu INGESTION_REFRESH_COOLDOWN sekund
+    od poprzedniej kończy się wyjątkiem RefreshCooldown.
+    """
+    job = active_job_for(summ)
+    if job is not None:
+        return _join_job(job, kind)
+
+    if kind in (IngestionJob.KIND_UPDATE, IngestionJob.KIND_REFRESH):
+        retry_after = refresh_cooldown_remaining(summ)
+        if retry_after > 0:
+            raise RefreshCooldown(retry_after)
+
+    try:
+        with transaction.atomic():
+            return IngestionJob.objects.create(summoner=summ, kind=kind)
+    except IntegrityError:
+        # Inny proces zdążył zlecić pobranie – dołączamy do niego
+        job = active_job_for(summ)
+        if job is None:
+            raise
+        return _join_job(job, kind)
+
+
+def _join_job(job: IngestionJob, kind: str) -> IngestionJob:
+    """
+    Dołącza do aktywnego zlecenia. Gdy użytkownik prosi o dane, a czeka jeszcze odświeżenie w tle,
+    zlecenie przejmuje rodzaj z prośby – a z nim priorytet w kolejce i w limiterze Riot API.
+    Warunkowy UPDATE nie zmienia zlecenia, które worker zdążył już rozpocząć.
+    """
+    if job.kind == IngestionJob.KIND_REFRESH and kind != IngestionJob.KIND_REFRESH:
+        upgraded = (IngestionJob.objects
+                    .filter(pk=job.pk, status=IngestionJob.STATUS_PENDING, kind=IngestionJob.KIND_REFRESH)
+                    .update(kind=kind))
+        if upgraded:
+            job.kind = kind
+    return job
+
+
+def refresh_cooldown_remaining(summ: Summoner) -> int:
+    if summ.last_refreshed is None:
+        return 0
+    elapsed = (timezone.now() - summ.last_refreshed).total_seconds()
+    return max(0, math.ceil(settings.INGESTION_REFRESH_COOLDOWN - elapsed))
+
+
+def is_stale(summ: Summoner) -> bool:
+    """
+    Czy dane Summonera są starsze niż PROFILE_FRESHNESS sekund. Summoner bez `last_refreshed`
+    (zapisany, zanim dane pobierały zlecenia) też jest nieaktualny. Po nieudanej próbie
+    (np. 429 z Riot API) kolejna odczekuje INGESTION_REFRESH_COOLDOWN, żeby wejścia na profil
+    nie zlecały w kółko zleceń, które i tak się nie powiodą.
+    """
+    now = timezone.now()
+    if summ.last_refreshed is not None and now - summ.last_refreshed < timedelta(seconds=settings.PROFILE_FRESHNESS):
+        return False
+    recent_failure = timedelta(seconds=settings.INGESTION_REFRESH_COOLDOWN)
+    return not summ.jobs.filter(status=IngestionJob.STATUS_FAILED, finished_at__gte=now - recent_failure).exists()
+
+
+def active_job_for(summ: Summoner) -> IngestionJob | None:
+    return (IngestionJob.objects
+            .filter(summoner=summ, status__in=IngestionJob.ACTIVE_STATUSES)
+            .order_by('created_at')
+            .first())
+
+
+def claim_next_job() -> IngestionJob | None:
+    """
+    Rezerwuje najstarsze oczekujące zlecenie, zaczynając od zleceń użytkowników
+    (odświeżenia w tle czekają, aż tamtych zabraknie). Warunkowy UPDATE gwarantuje,
+    że przy kilku workerach jedno zlecenie trafi tylko do jednego z nich.
+    """
+    background_last = Case(When(kind=IngestionJob.KIND_REFRESH, then=Value(1)), default=Value(0))
+    while True:
+        job = (IngestionJob.objects
+               .filter(status=IngestionJob.STATUS_PENDING)
+               .order_by(background_last, 'created_at')
+               .select_related('summoner')
+               .first())
+        if job is None:
+            return None
+        if claim_job(job):
+            return job
+
+
+def claim_job(job: IngestionJob) -> bool:
+    """
+    Rezerwuje wskazane zlecenie, o ile nadal czeka – zwraca False, gdy wziął je już inny proces.
+    """
+    now = timezone.now()
+    claimed = (IngestionJob.objects
+               .filter(pk=job.pk, status=IngestionJob.STATUS_PENDING)
+               .update(status=IngestionJob.STATUS_RUNNING, started_at=now))
+    if claimed:
+        job.status = IngestionJob.STATUS_RUNNING
+        job.started_at = now
+    return bool(claimed)
+
+
+def requeue_stale_jobs(timeout: timedelta) -> int:
+    """
+    Przywraca do kolejki zlecenia, które utknęły w stanie "running" (np. po awarii workera).
+    """
+    return (IngestionJob.objects
+            .filter(status=IngestionJob.STATUS_RUNNING, started_at__lt=timezone.now() - timeout)
+            .update(status=IngestionJob.STATUS_PENDING, started_at=None))
+
+
+def run_ingestion_job(job: IngestionJob) -> None:
+    """
+    Wykonuje zlecenie i zapisuje jego wynik (status, ewentualny błąd, czas zakończenia).
+    """
+    summ = job.summoner
+    try:
+        with riot_priority(JOB_PRIORITIES.get(job.kind, BACKGROUND)):
+            if job.kind == IngestionJob.KIND_INITIAL:
+                save_summoner_rank_info(summ)
+                save_recent_matches_for_summoner(summ)
+            elif job.kind == IngestionJob.KIND_REFRESH:
+                save_summoner_rank_info(summ)
+                save_recent_matches_for_summoner(summ, incremental=True)
+            else:
+                save_recent_matches_for_summoner(summ, incremental=True)
+            recalculate_summoner_champions(summ)
+    except Exception as e:
+        job.status = IngestionJob.STATUS_FAILED
+        job.error = str(e) or e.__class__.__name__
+    else:
+        job.status = IngestionJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    if job.status == IngestionJob.STATUS_DONE:
+        summ.last_refreshed = job.finished_at
+        Summoner.objects.filter(pk=summ.pk).update(last_refreshed=job.finished_at)
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+async def arun_ingestion_job(job: IngestionJob) -> None:
+    """
+    Wersja `run_ingestion_job` dla asyncio – zapytania do Riot API idą przez klienta httpx,
+    więc worker może wykonywać kilka zleceń naraz w jednej pętli zdarzeń.
+    """
+    summ = job.summoner
+    try:
+        with riot_priority(JOB_PRIORITIES.get(job.kind, BACKGROUND)):
+            if job.kind == IngestionJob.KIND_INITIAL:
+                await asave_summoner_rank_info(summ)
+                await asave_recent_matches_for_summoner(summ)
+            elif job.kind == IngestionJob.KIND_REFRESH:
+                await asave_summoner_rank_info(summ)
+                await asave_recent_matches_for_summoner(summ, incremental=True)
+            else:
+                await asave_recent_matches_for_summoner(summ, incremental=True)
+            await sync_to_async(recalculate_summoner_champions)(summ)
+    except Exception as e:
+        job.status = IngestionJob.STATUS_FAILED
+        job.error = str(e) or e.__class__.__name__
+    else:
+        job.status = IngestionJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    if job.status == IngestionJob.STATUS_DONE:
+        summ.last_refreshed = job.finished_at
+        await Summoner.objects.filter(pk=summ.pk).aupdate(last_refreshed=job.finished_at)
+    await job.asave(update_fields=['status', 'error', 'finished_at'])
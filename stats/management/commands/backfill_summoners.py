@@ -0,0 +1,187 @@
+import queue
+import sys
+import threading
+import time
+from contextvars import copy_context
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.http import Http404
+from django.utils import timezone
+
+from stats.models import BackfillCheckpoint, Participant, Summoner
+from stats.ratelimit import BACKGROUND, riot_priority
+from stats.services import (ingest_match_payloads, link_summoner_participants, save_summoner_rank_info,
+                            recalculate_summoner_champions)
+from stats.utils import (get_account_by_puuid, get_match_by_id, get_match_ids_by_puuid,
+                         get_summoner_by_name_and_tag, get_summoner_server, riot_client)
+
+
+def resolve_summoner(identifier: str, region: str) -> Summoner:
+    """
+    Zwraca Summonera dla "gameName#tagLine" albo PUUID – z bazy, a jeśli go nie ma, z Riot API.
+    """
+    if '#' in identifier:
+        gameName, tagLine = identifier.rsplit('#', 1)
+        summ = Summoner.objects.filter(gameName__iexact=gameName, tagLine__iexact=tagLine).first()
+        if summ:
+            return summ
+        account = get_summoner_by_name_and_tag(gameName, tagLine, region)
+    else:
+        summ = Summoner.objects.filter(puuid=identifier).first()
+        if summ:
+            return summ
+        account = get_account_by_puuid(identifier, region)
+
+    summ = Summoner.objects.create(
+        puuid=account['puuid'],
+        gameName=account['gameName'],
+        tagLine=account['tagLine'],
+        region=region,
+        server=get_summoner_server(account['puuid']),
+    )
+    link_summoner_participants(summ)
+    save_summoner_rank_info(summ)
+    return summ
+
+
+def backfill_worker(tasks, results, stop, page_size, max_matches):
+    """
+    Pobiera z Riot API kolejne strony historii Summonerów z kolejki `tasks`.
+    Nie dotyka bazy – gotowe strony trafiają do `results`, a zapisuje je wątek główny.
+    """
+    while not stop.is_set():
+        try:
+            summ, start, known = tasks.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            while start < max_matches and not stop.is_set():
+                count = min(page_size, max_matches - start)
+                match_ids = get_match_ids_by_puuid(summ.puuid, summ.region, count=count, start=start)
+                payloads = []
+                for match_id in match_ids:
+                    if stop.is_set():
+                        return
+                    if match_id in known:
+                        continue
+                    try:
+                        payloads.append(get_match_by_id(match_id, summ.region))
+                    except Http404:
+                        continue
+                start += len(match_ids)
+                done = len(match_ids) < count or start >= max_matches
+                results.put((summ, start, payloads, done, None))
+                if done:
+                    break
+        except Exception as e:
+            results.put((summ, start, [], True, e))
+
+
+class Command(BaseCommand):
+    help = ("Pobiera historię meczów wielu Summonerów (Riot ID \"gameName#tagLine\" albo PUUID, "
+            "po jednym w linii) z pliku lub stdin. Postęp zapisywany jest per Summoner, "
+            "więc przerwany backfill wznawia się od miejsca przerwania.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', default='-',
+                            help="Plik z listą Summonerów (domyślnie stdin).")
+        parser.add_argument('--region', default='europe')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--max-matches', type=int, default=1000,
+                            help="Ile najnowszych meczów pobrać dla każdego Summonera.")
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignoruj zapisany postęp i zacznij od najnowszego meczu.")
+
+    def read_identifiers(self, path):
+        if path == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            except OSError as e:
+                raise CommandError(f"Nie można odczytać pliku {path}: {e}")
+        return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+    def report(self, started, matches, calls_at_start):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        calls = riot_client.request_count - calls_at_start
+        self.stdout.write(
+            f"{matches} meczów, {calls} zapytań API w {elapsed:.0f}s "
+            f"({matches / elapsed:.2f} meczów/s, {calls / elapsed:.2f} zapytań/s)"
+        )
+
+    def handle(self, *args, **options):
+        # Backfill korzysta tylko z budżetu ponad rezerwy dla stron i zleceń użytkowników
+        with riot_priority(BACKGROUND):
+            self.backfill(options)
+
+    def backfill(self, options):
+        tasks = queue.Queue()
+        checkpoints = {}
+        for identifier in self.read_identifiers(options['file']):
+            try:
+                summ = resolve_summoner(identifier, options['region'])
+            except Exception as e:
+                self.stderr.write(f"Pominięto {identifier}: {e}")
+                continue
+            checkpoint, _ = BackfillCheckpoint.objects.get_or_create(summoner=summ)
+            if options['restart']:
+                checkpoint.next_start, checkpoint.finished = 0, False
+                checkpoint.save()
+            if checkpoint.finished or summ.pk in checkpoints:
+                continue
+            checkpoints[summ.pk] = checkpoint
+            known = set(Participant.objects.filter(puuid=summ.puuid).values_list('match__match_id', flat=True))
+            tasks.put((summ, checkpoint.next_start, known))
+
+        if not checkpoints:
+            self.stdout.write("Brak Summonerów do pobrania.")
+            return
+
+        results = queue.Queue()
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=copy_context().run, daemon=True,
+                             args=(backfill_worker, tasks, results, stop, options['page_size'], options['max_matches']))
+            for _ in range(max(1, options['workers']))
+        ]
+        started = time.monotonic()
+        calls_at_start = riot_client.request_count
+        last_report = started
+        matches = 0
+
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers) or not results.empty():
+                try:
+                    summ, next_start, payloads, done, error = results.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                close_old_connections()
+                checkpoint = checkpoints[summ.pk]
+                if error is not None:
+                    self.stderr.write(f"{summ}: {error} (wznowienie od meczu {checkpoint.next_start})")
+                    continue
+
+                ingested = ingest_match_payloads(payloads)
+                matches += ingested
+                checkpoint.next_start = next_start
+                checkpoint.matches_ingested += ingested
+                checkpoint.finished = done
+                checkpoint.save()
+                if done:
+                    recalculate_summoner_champions(summ)
+                    Summoner.objects.filter(pk=summ.pk).update(last_refreshed=timezone.now())
+                    self.stdout.write(f"{summ}: zakończono ({checkpoint.matches_ingested} meczów).")
+
+                if time.monotonic() - last_report >= 10:
+                    self.report(started, matches, calls_at_start)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            stop.set()
+            self.stdout.write("Przerwano – postęp zapisany, uruchom ponownie, aby wznowić.")
+        self.report(started, matches, calls_at_start)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from stats.models import Summoner
+from stats.services import recalculate_summoner_advanced_stats, recalculate_summoner_champions
+
+
+class Command(BaseCommand):
+    help = ("Przebudowuje od zera statystyki Summonerów (per kolejka i per champion) "
+            "z zapisanych meczów – np. po wczytaniu danych przez loaddata.")
+
+    def handle(self, *args, **options):
+        count = 0
+        for summ in Summoner.objects.iterator():
+            recalculate_summoner_advanced_stats(summ)
+            recalculate_summoner_champions(summ)
+            count += 1
+        self.stdout.write(f"Przeliczono statystyki {count} Summonerów.")
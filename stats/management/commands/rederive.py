@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from stats.models import MatchArchive, Summoner
+from stats.services import ingest_match_payloads, recalculate_summoner_champions
+
+
+class Command(BaseCommand):
+    help = ("Przelicza kolumny Match/Participant z lokalnego archiwum surowych payloadów "
+            "(MatchArchive), bez zapytań do Riot API – np. po dodaniu nowej kolumny.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Ile meczów zapisywać w jednej transakcji.")
+        parser.add_argument('--skip-stats', action='store_true',
+                            help="Nie przeliczaj statystyk Summonerów po zakończeniu.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        total = 0
+        batch = []
+
+        archive = MatchArchive.objects.order_by('pk').values_list('payload', flat=True)
+        for payload in archive.iterator(chunk_size=batch_size):
+            batch.append(MatchArchive.decompress(bytes(payload)))
+            if len(batch) >= batch_size:
+                total += ingest_match_payloads(batch, archive=False)
+                batch = []
+                self.stdout.write(f"Przeliczono {total} meczów…")
+        total += ingest_match_payloads(batch, archive=False)
+
+        if not options['skip_stats']:
+            for summ in Summoner.objects.iterator():
+                recalculate_summoner_champions(summ)
+
+        self.stdout.write(f"Przeliczono {total} meczów w {time.monotonic() - started:.1f}s.")
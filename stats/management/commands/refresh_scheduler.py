@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from stats.ratelimit import riot_pacing
+from stats.scheduler import refresh_candidates, refresh_summoner, scheduler_pacer
+
+
+class Command(BaseCommand):
+    help = ("Odświeża w tle dane najpopularniejszych Summonerów, zanim ktoś wejdzie na ich profil, "
+            "zużywając tylko część limitu Riot API (REFRESH_SCHEDULER_SHARE).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Odśwież jedną porcję kandydatów i zakończ działanie.")
+        parser.add_argument('--batch', type=int, default=20,
+                            help="Ilu kandydatów wybierać naraz.")
+        parser.add_argument('--poll', type=float, default=60.0,
+                            help="Co ile sekund szukać kandydatów, gdy nie ma żadnego.")
+        parser.add_argument('--share', type=float, default=None,
+                            help="Część limitu klucza Riot API dla harmonogramu (domyślnie REFRESH_SCHEDULER_SHARE).")
+
+    def handle(self, *args, **options):
+        pacer = scheduler_pacer(options['share'])
+        self.stdout.write(f"Budżet harmonogramu: {pacer.rate():.3f} zapytań/s "
+                          f"({pacer.share:.0%} limitu klucza, aktualizowany z nagłówków Riot API).")
+
+        try:
+            # Odstępy wyznacza dozownik przed każdym zapytaniem do Riot API (także w wątkach pobierających mecze)
+            with riot_pacing(pacer):
+                while True:
+                    close_old_connections()
+                    candidates = refresh_candidates(options['batch'])
+                    if not candidates:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll'])
+                        continue
+
+                    for summ in candidates:
+                        job = refresh_summoner(summ)
+                        if job is None:
+                            continue
+                        if job.error:
+                            self.stderr.write(f"{job}: {job.error}")
+                        else:
+                            self.stdout.write(f"{job}")
+
+                    if options['once']:
+                        break
+        except KeyboardInterrupt:
+            self.stdout.write("Zatrzymano harmonogram.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from stats.ratelimit import RateLimiter
+
+
+class Command(BaseCommand):
+    help = ("Pokazuje stan klas priorytetu zapytań do Riot API (wspólny dla wszystkich procesów): "
+            "ile zapytań czeka teraz na budżet i jak długo czekały dotąd.")
+
+    def handle(self, *args, **options):
+        stats = RateLimiter().priority_stats()
+        self.stdout.write(f"{'klasa':<12} {'czeka':>6} {'przeszło':>9} {'czekało':>8} {'odrzucono':>10} "
+                          f"{'śr. czekania':>13} {'maks.':>8}")
+        for priority, row in stats.items():
+            self.stdout.write(
+                f"{priority:<12} {row['waiting']:>6} {row['acquired']:>9} {row['delayed']:>8} {row['rejected']:>10} "
+                f"{row['avg_wait']:>12.2f}s {row['max_wait']:>7.2f}s"
+            )
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from stats.jobs import arun_ingestion_job, claim_next_job, requeue_stale_jobs, run_ingestion_job
+from stats.utils import async_riot_client
+
+
+class Command(BaseCommand):
+    help = "Przetwarza w tle zlecenia pobrania danych Summonerów (IngestionJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Przetwórz oczekujące zlecenia i zakończ działanie.")
+        parser.add_argument('--poll', type=float, default=2.0,
+                            help="Co ile sekund sprawdzać kolejkę, gdy jest pusta.")
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Po ilu sekundach zlecenie w stanie 'running' wraca do kolejki.")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Ile zleceń wykonywać naraz (powyżej 1 – asynchronicznie, w jednym procesie).")
+
+    def requeue(self, options):
+        # Co obieg pętli, nie tylko przy starcie: zlecenie porzucone przez inny worker blokowałoby
+        # Summonera (jedno aktywne zlecenie naraz), dopóki któryś worker nie zostałby zrestartowany
+        requeued = requeue_stale_jobs(timedelta(seconds=options['stale_after']))
+        if requeued:
+            self.stdout.write(f"Przywrócono do kolejki {requeued} zleceń.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] > 1:
+            try:
+                # async_to_sync zamiast asyncio.run: zapytania ORM wracają do wątku komendy
+                async_to_sync(self.run_async)(options)
+            except KeyboardInterrupt:
+                self.stdout.write("Zatrzymano worker.")
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                self.requeue(options)
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                run_ingestion_job(job)
+                if job.error:
+                    self.stderr.write(f"{job}: {job.error}")
+                else:
+                    self.stdout.write(f"{job}")
+        except KeyboardInterrupt:
+            self.stdout.write("Zatrzymano worker.")
+
+    async def run_async(self, options):
+        """
+        `--concurrency` pętli pobierających zlecenia z kolejki; czekanie na Riot API
+        w jednej z nich nie wstrzymuje pozostałych.
+        """
+        async def claimer():
+            while True:
+                await sync_to_async(self.requeue)(options)
+                job = await sync_to_async(claim_next_job)()
+                if job is None:
+                    if options['once']:
+                        return
+                    await asyncio.sleep(options['poll'])
+                    continue
+
+                await arun_ingestion_job(job)
+                if job.error:
+                    self.stderr.write(f"{job}: {job.error}")
+                else:
+                    self.stdout.write(f"{job}")
+
+        try:
+            await asyncio.gather(*(claimer() for _ in range(options['concurrency'])))
+        finally:
+            await async_riot_client.aclose()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from stats.registry import get_registry
+from stats.services import sync_static_data
+
+
+class Command(BaseCommand):
+    help = ("Synchronizuje championów i kolejki z aktualną wersją Data Dragon. "
+            "Gdy wersja się nie zmieniła, kończy się na jednym zapytaniu – można ją uruchamiać z crona.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Porównaj i zapisz dane nawet przy niezmienionej wersji.")
+
+    def handle(self, *args, **options):
+        result = sync_static_data(force=options['force'])
+        if result is None:
+            self.stdout.write(f"Dane statyczne aktualne (wersja {get_registry().ddragon_version}).")
+            return
+        self.stdout.write(
+            f"Zsynchronizowano wersję {result['version']}: "
+            f"{result['champions']} championów, {result['queues']} kolejek zmienionych."
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0015_alter_summoner_summoner_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='summonerchampion',
+            name='kda',
+            field=models.DecimalField(decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.AlterField(
+            model_name='summonerchampion',
+            name='winratio',
+            field=models.DecimalField(decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('initial', 'Pierwsze pobranie'), ('update', 'Aktualizacja')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Oczekuje'), ('running', 'W trakcie'), ('done', 'Zakończone'), ('failed', 'Błąd')], db_index=True, default='pending', max_length=10)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('summoner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='stats.summoner')),
+            ],
+        ),
+    ]
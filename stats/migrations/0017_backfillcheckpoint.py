@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0016_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_start', models.PositiveIntegerField(default=0)),
+                ('matches_ingested', models.PositiveIntegerField(default=0)),
+                ('finished', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('summoner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='backfill', to='stats.summoner')),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+
+
+def fill_participant_puuid(apps, schema_editor):
+    Participant = apps.get_model('stats', 'Participant')
+    Summoner = apps.get_model('stats', 'Summoner')
+    Participant.objects.update(
+        puuid=Subquery(Summoner.objects.filter(pk=OuterRef('summoner_id')).values('puuid')[:1])
+    )
+    # Wcześniejsze odświeżenia mogły zostawić kilka wierszy tego samego gracza w jednym meczu
+    duplicates = (Participant.objects
+                  .values('match_id', 'puuid')
+                  .annotate(rows=Count('id'), keep=Min('id'))
+                  .filter(rows__gt=1))
+    for row in duplicates:
+        (Participant.objects
+         .filter(match_id=row['match_id'], puuid=row['puuid'])
+         .exclude(pk=row['keep'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0017_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='puuid',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.RunPython(fill_participant_puuid, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='participant',
+            name='puuid',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='summoner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='stats.summoner'),
+        ),
+        migrations.AddConstraint(
+            model_name='participant',
+            constraint=models.UniqueConstraint(fields=('match', 'puuid'), name='unique_participant_per_match'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0018_participant_puuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_id', models.CharField(max_length=100, unique=True)),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
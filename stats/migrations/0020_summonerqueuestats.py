@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_queue_stats(apps, schema_editor):
+    Participant = apps.get_model('stats', 'Participant')
+    SummonerQueueStats = apps.get_model('stats', 'SummonerQueueStats')
+    rows = (Participant.objects
+            .filter(summoner__isnull=False, match__queue__isnull=False)
+            .values('summoner_id', 'match__queue_id')
+            .annotate(
+                games=Count('id'),
+                wins=Count('id', filter=Q(win=True)),
+                kills=Sum('kills'),
+                deaths=Sum('deaths'),
+                assists=Sum('assists'),
+                wards=Sum('wards'),
+                gold=Sum('gold_earned'),
+                farm=Sum('farm'),
+                duration=Sum('match__game_duration'),
+                lane_top=Count('id', filter=Q(lane='TOP')),
+                lane_jungle=Count('id', filter=Q(lane='JUNGLE')),
+                lane_middle=Count('id', filter=Q(lane__in=['MIDDLE', 'MID'])),
+                lane_bottom=Count('id', filter=Q(lane__in=['BOTTOM', 'BOT'])),
+            ))
+    SummonerQueueStats.objects.bulk_create([
+        SummonerQueueStats(
+            summoner_id=row.pop('summoner_id'),
+            queue_id=row.pop('match__queue_id'),
+            lane_none=row['games'] - row['lane_top'] - row['lane_jungle'] - row['lane_middle'] - row['lane_bottom'],
+            **{field: value or 0 for field, value in row.items()},
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0019_matcharchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummonerQueueStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('games', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('kills', models.PositiveIntegerField(default=0)),
+                ('deaths', models.PositiveIntegerField(default=0)),
+                ('assists', models.PositiveIntegerField(default=0)),
+                ('wards', models.PositiveIntegerField(default=0)),
+                ('gold', models.PositiveBigIntegerField(default=0)),
+                ('farm', models.PositiveIntegerField(default=0)),
+                ('duration', models.PositiveBigIntegerField(default=0)),
+                ('lane_top', models.PositiveIntegerField(default=0)),
+                ('lane_jungle', models.PositiveIntegerField(default=0)),
+                ('lane_middle', models.PositiveIntegerField(default=0)),
+                ('lane_bottom', models.PositiveIntegerField(default=0)),
+                ('lane_none', models.PositiveIntegerField(default=0)),
+                ('queue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stats.queue')),
+                ('summoner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queue_stats', to='stats.summoner')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('summoner', 'queue'), name='unique_summoner_queue_stats')],
+            },
+        ),
+        migrations.RunPython(build_queue_stats, migrations.RunPython.noop),
+    ]
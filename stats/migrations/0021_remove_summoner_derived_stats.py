@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0020_summonerqueuestats'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='summoner',
+            name='flex_gold_per_min',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='flex_kda',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='flex_main_role',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='flex_minions_per_min',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='flex_vision_avg',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='solo_gold_per_min',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='solo_kda',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='solo_main_role',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='solo_minions_per_min',
+        ),
+        migrations.RemoveField(
+            model_name='summoner',
+            name='solo_vision_avg',
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedupe_summoner_champions(apps, schema_editor):
+    # Równoległe przeliczenia mogły zostawić kilka wierszy tego samego championa
+    SummonerChampion = apps.get_model('stats', 'SummonerChampion')
+    duplicates = (SummonerChampion.objects
+                  .values('summoner_id', 'champion_id')
+                  .annotate(rows=Count('id'), keep=Min('id'))
+                  .filter(rows__gt=1))
+    for row in duplicates:
+        (SummonerChampion.objects
+         .filter(summoner_id=row['summoner_id'], champion_id=row['champion_id'])
+         .exclude(pk=row['keep'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0021_remove_summoner_derived_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummonerChampionBreakdown',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lane', models.CharField(max_length=7)),
+                ('matches_num', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('kills', models.PositiveIntegerField(default=0)),
+                ('deaths', models.PositiveIntegerField(default=0)),
+                ('assists', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(dedupe_summoner_champions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='summonerchampion',
+            constraint=models.UniqueConstraint(fields=('summoner', 'champion'), name='unique_summoner_champion'),
+        ),
+        migrations.AddField(
+            model_name='summonerchampionbreakdown',
+            name='champion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stats.champion'),
+        ),
+        migrations.AddField(
+            model_name='summonerchampionbreakdown',
+            name='queue',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stats.queue'),
+        ),
+        migrations.AddField(
+            model_name='summonerchampionbreakdown',
+            name='summoner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='champion_breakdown', to='stats.summoner'),
+        ),
+        migrations.AddConstraint(
+            model_name='summonerchampionbreakdown',
+            constraint=models.UniqueConstraint(fields=('summoner', 'champion', 'queue', 'lane'), name='unique_summoner_champion_breakdown'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:21
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_participant_sort_key(apps, schema_editor):
+    Participant = apps.get_model('stats', 'Participant')
+    Match = apps.get_model('stats', 'Match')
+    match = Match.objects.filter(pk=OuterRef('match_id'))
+    Participant.objects.update(
+        queue_id=Subquery(match.values('queue__queue_id')[:1]),
+        timestamp=Subquery(match.values('timestamp')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0022_summonerchampionbreakdown'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='queue_id',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='timestamp',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_participant_sort_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['summoner', 'timestamp', 'match'], name='participant_summ_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['summoner', 'queue_id', 'timestamp', 'match'], name='participant_summ_queue_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['summoner', 'champion', 'timestamp', 'match'], name='participant_summ_champ_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['summoner', 'lane', 'timestamp', 'match'], name='participant_summ_lane_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['summoner', 'win', 'timestamp', 'match'], name='participant_summ_win_ts_idx'),
+        ),
+    ]
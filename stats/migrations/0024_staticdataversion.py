@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0023_participant_denormalized_sort_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaticDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True)),
+                ('version', models.CharField(max_length=64)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
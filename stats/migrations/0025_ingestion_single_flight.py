@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:29
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def close_duplicate_active_jobs(apps, schema_editor):
+    IngestionJob = apps.get_model('stats', 'IngestionJob')
+    Summoner = apps.get_model('stats', 'Summoner')
+    active = IngestionJob.objects.filter(status__in=('pending', 'running'))
+    duplicates = active.values('summoner_id').annotate(jobs=Count('id'), keep=Min('id')).filter(jobs__gt=1)
+    for row in duplicates:
+        (active.filter(summoner_id=row['summoner_id'])
+         .exclude(pk=row['keep'])
+         .update(status='failed', error="Zduplikowane zlecenie"))
+    # Cooldown liczony od ostatniego udanego pobrania
+    for row in IngestionJob.objects.filter(status='done').values('summoner_id').annotate(last=Max('finished_at')):
+        Summoner.objects.filter(pk=row['summoner_id']).update(last_refreshed=row['last'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0024_staticdataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='last_refreshed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(close_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingestionjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('pending', 'running'))), fields=('summoner',), name='unique_active_job_per_summoner'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0025_ingestion_single_flight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
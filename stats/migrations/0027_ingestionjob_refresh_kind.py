@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0026_summoner_data_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestionjob',
+            name='kind',
+            field=models.CharField(choices=[('initial', 'Pierwsze pobranie'), ('update', 'Aktualizacja'), ('refresh', 'Odświeżenie w tle')], max_length=10),
+        ),
+    ]
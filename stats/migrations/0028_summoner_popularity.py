@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0027_ingestionjob_refresh_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='last_viewed',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='summoner',
+            name='view_score',
+            field=models.FloatField(default=0),
+        ),
+    ]
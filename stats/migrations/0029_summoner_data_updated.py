@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0028_summoner_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='data_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
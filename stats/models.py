@@ -1,6 +1,18 @@
+import json
+import zlib
+
 from django.db import models
 
 
+GAME_MODE_TO_NAME = {
+    "5v5 Ranked Solo games": "Solo/Duo",
+    "5v5 Ranked Flex games": "Flex",
+    "5v5 Blind Pick games": "Blind Pick",
+    "5v5 ARAM games": "ARAM",
+    "SWIFTPLAY": "Swiftplay",
+}
+
+
 class Queue(models.Model):
     queue_id = models.IntegerField(unique=True)
     description = models.CharField(max_length=50, null=True, blank=True)
@@ -8,6 +20,25 @@ class Queue(models.Model):
     def __str__(self):
         return f"{self.description or 'brak opisu'}"
 
+    @property
+    def display_name(self):
+        if self.description:
+            return GAME_MODE_TO_NAME.get(self.description, self.description)
+        return "Quickplay" if self.queue_id == 480 else f"Kolejka {self.queue_id}"
+
+
+class StaticDataVersion(models.Model):
+    """
+    Wersja danych statycznych zapisanych w bazie: numer patcha Data Dragon dla championów
+    albo suma kontrolna listy kolejek. Gdy się nie zmieniła, synchronizacja nic nie zapisuje.
+    """
+    name = models.CharField(max_length=30, unique=True)
+    version = models.CharField(max_length=64)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} {self.version}"
+
 
 class Champion(models.Model):
     key = models.IntegerField(unique=True)
@@ -33,20 +64,22 @@ class Summoner(models.Model):
     rank_solo = models.CharField(max_length=13, null=True, blank=True)
     solo_wins = models.PositiveIntegerField(null=True)
     solo_loses = models.PositiveIntegerField(null=True)
-    solo_kda = models.DecimalField(max_digits=4, decimal_places=2, null=True)
-    solo_main_role = models.CharField(max_length=7, null=True, blank=True)
-    solo_vision_avg = models.FloatField(null=True)
-    solo_gold_per_min = models.PositiveIntegerField(null=True)
-    solo_minions_per_min = models.FloatField(null=True)
 
     rank_flex = models.CharField(max_length=13, null=True, blank=True)
     flex_wins = models.PositiveIntegerField(null=True)
     flex_loses = models.PositiveIntegerField(null=True)
-    flex_kda = models.DecimalField(max_digits=4, decimal_places=2, null=True)
-    flex_main_role = models.CharField(max_length=7, null=True, blank=True)
-    flex_vision_avg = models.FloatField(null=True)
-    flex_gold_per_min = models.PositiveIntegerField(null=True)
-    flex_minions_per_min = models.FloatField(null=True)
+
+    # Koniec ostatniego udanego pobrania danych – podstawa cooldownu odświeżania
+    last_refreshed = models.DateTimeField(null=True, blank=True)
+    # Zwiększana przy każdym zapisie danych widocznych na profilu – część klucza cache stron
+    # i ETag-ów API; `data_updated` to czas tego zapisu (Last-Modified)
+    data_version = models.PositiveIntegerField(default=0)
+    data_updated = models.DateTimeField(null=True, blank=True)
+
+    # Popularność profilu dla harmonogramu odświeżania – liczba wejść wygaszana wykładniczo
+    # (VIEW_SCORE_HALF_LIFE) i stan na chwilę ostatniego wejścia
+    view_score = models.FloatField(default=0)
+    last_viewed = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return f"{self.gameName}#{self.tagLine} ({self.server})"
@@ -84,14 +117,6 @@ class Summoner(models.Model):
         if rank_type == "CHALLENGER":
             return "Challenger"
         return f"{rank_type[0].upper()}{rank_type[1:].lower()} {rank_num}"
-    
-    @property
-    def solo_main_role_formatted(self):
-        return f"{self.solo_main_role.capitalize()}" if self.solo_main_role else "Brak"
-    
-    @property
-    def flex_main_role_formatted(self):
-        return f"{self.flex_main_role.capitalize()}" if self.flex_main_role else "Brak"
 
 
 class SummonerChampion(models.Model):
@@ -101,10 +126,147 @@ class SummonerChampion(models.Model):
     winratio = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     kda = models.DecimalField(max_digits=6, decimal_places=2, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['summoner', 'champion'], name='unique_summoner_champion'),
+        ]
+
     def __str__(self):
         return f"{self.champion.name} ({self.summoner.gameName}#{self.summoner.tagLine})"
 
 
+class SummonerChampionBreakdown(models.Model):
+    """
+    Statystyki Summonera na championie rozbite na kolejkę i rolę (linię).
+    Mecze bez przypisanej linii trafiają do roli "NONE".
+    """
+    summoner = models.ForeignKey(Summoner, on_delete=models.CASCADE, related_name='champion_breakdown')
+    champion = models.ForeignKey(Champion, on_delete=models.CASCADE)
+    queue = models.ForeignKey(Queue, on_delete=models.CASCADE)
+    lane = models.CharField(max_length=7)
+    matches_num = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    kills = models.PositiveIntegerField(default=0)
+    deaths = models.PositiveIntegerField(default=0)
+    assists = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['summoner', 'champion', 'queue', 'lane'],
+                                    name='unique_summoner_champion_breakdown'),
+        ]
+
+    def __str__(self):
+        return f"{self.champion.name} {self.lane} ({self.summoner.gameName}#{self.summoner.tagLine})"
+
+    @property
+    def winratio(self):
+        return round(self.wins / self.matches_num * 100, 2) if self.matches_num else 0
+
+    @property
+    def kda(self):
+        return round((self.kills + self.assists) / (self.deaths or 1), 2)
+
+
+class SummonerQueueStats(models.Model):
+    """
+    Bieżące sumy statystyk Summonera w jednej kolejce. Aktualizowane w tej samej transakcji,
+    w której zapisywane są wiersze Participant, więc odczyt KDA, GPM czy głównej roli
+    nie wymaga żadnej agregacji.
+    """
+    LANE_FIELDS = {
+        'TOP': 'lane_top',
+        'JUNGLE': 'lane_jungle',
+        'MIDDLE': 'lane_middle',
+        'MID': 'lane_middle',
+        'BOTTOM': 'lane_bottom',
+        'BOT': 'lane_bottom',
+    }
+    SUM_FIELDS = [
+        'games', 'wins', 'kills', 'deaths', 'assists', 'wards', 'gold', 'farm', 'duration',
+        'lane_top', 'lane_jungle', 'lane_middle', 'lane_bottom', 'lane_none',
+    ]
+
+    summoner = models.ForeignKey(Summoner, on_delete=models.CASCADE, related_name='queue_stats')
+    queue = models.ForeignKey(Queue, on_delete=models.CASCADE)
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    kills = models.PositiveIntegerField(default=0)
+    deaths = models.PositiveIntegerField(default=0)
+    assists = models.PositiveIntegerField(default=0)
+    wards = models.PositiveIntegerField(default=0)
+    gold = models.PositiveBigIntegerField(default=0)
+    farm = models.PositiveIntegerField(default=0)
+    duration = models.PositiveBigIntegerField(default=0)  # suma czasu gier w sekundach
+    lane_top = models.PositiveIntegerField(default=0)
+    lane_jungle = models.PositiveIntegerField(default=0)
+    lane_middle = models.PositiveIntegerField(default=0)
+    lane_bottom = models.PositiveIntegerField(default=0)
+    lane_none = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['summoner', 'queue'], name='unique_summoner_queue_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.summoner} – {self.queue}"
+
+    @classmethod
+    def contribution(cls, win, kills, deaths, assists, wards, gold, farm, duration, lane) -> dict:
+        """
+        Wkład jednego wiersza Participant w sumy (do dodania albo odjęcia).
+        """
+        values = {
+            'games': 1,
+            'wins': 1 if win else 0,
+            'kills': kills or 0,
+            'deaths': deaths or 0,
+            'assists': assists or 0,
+            'wards': wards or 0,
+            'gold': gold or 0,
+            'farm': farm or 0,
+            'duration': duration or 0,
+        }
+        values[cls.LANE_FIELDS.get(lane, 'lane_none')] = 1
+        return values
+
+    @property
+    def losses(self):
+        return self.games - self.wins
+
+    @property
+    def winratio(self):
+        return f"{(self.wins / self.games)*100:.1f}%" if self.games else "0.0%"
+
+    @property
+    def kda(self):
+        return round((self.kills + self.assists) / self.deaths, 2) if self.deaths else 0.0
+
+    @property
+    def vision_avg(self):
+        return self.wards / self.games if self.games else 0.0
+
+    @property
+    def gold_per_min(self):
+        return int(self.gold / (self.duration / 60)) if self.duration else 0
+
+    @property
+    def minions_per_min(self):
+        return self.farm / (self.duration / 60) if self.duration else 0.0
+
+    @property
+    def main_role(self):
+        lanes = {'TOP': self.lane_top, 'JUNGLE': self.lane_jungle,
+                 'MIDDLE': self.lane_middle, 'BOTTOM': self.lane_bottom}
+        lane, count = max(lanes.items(), key=lambda item: item[1])
+        return lane if count else None
+
+    @property
+    def main_role_formatted(self):
+        return self.main_role.capitalize() if self.main_role else "Brak"
+
+
 class Match(models.Model):
     match_id = models.CharField(max_length=100, unique=True)
     queue = models.ForeignKey(Queue, on_delete=models.CASCADE, null=True)
@@ -135,8 +297,13 @@ class Match(models.Model):
 
 
 class Participant(models.Model):
-    summoner = models.ForeignKey(Summoner, on_delete=models.CASCADE)
+    # Zapisujemy wszystkich 10 graczy meczu; `summoner` jest ustawiony tylko dla śledzonych graczy
+    summoner = models.ForeignKey(Summoner, on_delete=models.SET_NULL, null=True, blank=True)
+    puuid = models.CharField(max_length=100, db_index=True)
     match = models.ForeignKey(Match, on_delete=models.CASCADE)
+    # Kopie z Match utrzymywane przez ingestię – historia i filtry działają na jednej tabeli, bez JOIN-a
+    queue_id = models.IntegerField(null=True)  # queueId z Riot API (Queue.queue_id, nie klucz Queue)
+    timestamp = models.DateTimeField(null=True)
     team_id = models.IntegerField(null=True) # 100 - team 0, 200 - team 1
     champion = models.ForeignKey(Champion, on_delete=models.CASCADE)
     lane = models.CharField(max_length=7, null=True)
@@ -154,5 +321,110 @@ class Participant(models.Model):
     damage_dealt = models.PositiveIntegerField(null=True)
     gold_earned = models.PositiveBigIntegerField(null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['match', 'puuid'], name='unique_participant_per_match'),
+        ]
+        indexes = [
+            # Historia meczów Summonera: sortowanie i kursor (timestamp, match)
+            models.Index(fields=['summoner', 'timestamp', 'match'], name='participant_summ_ts_idx'),
+            # Filtry historii – każdy kończy się kluczem sortowania, więc filtr + strona to jeden zakres indeksu
+            models.Index(fields=['summoner', 'queue_id', 'timestamp', 'match'], name='participant_summ_queue_ts_idx'),
+            models.Index(fields=['summoner', 'champion', 'timestamp', 'match'], name='participant_summ_champ_ts_idx'),
+            models.Index(fields=['summoner', 'lane', 'timestamp', 'match'], name='participant_summ_lane_ts_idx'),
+            models.Index(fields=['summoner', 'win', 'timestamp', 'match'], name='participant_summ_win_ts_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.summoner.gameName} in {self.match.match_id}"
+        name = self.summoner.gameName if self.summoner else self.puuid
+        return f"{name} in {self.match.match_id}"
+
+
+class IngestionJob(models.Model):
+    """
+    Zlecenie pobrania danych Summonera z Riot API, wykonywane w tle
+    przez `manage.py run_ingestion_worker` (bez zewnętrznego brokera).
+    """
+    KIND_INITIAL = 'initial'  # ranga + cała historia + statystyki
+    KIND_UPDATE = 'update'    # tylko nowe mecze + statystyki
+    KIND_REFRESH = 'refresh'  # ranga + nowe mecze + statystyki, zlecane samo przy wejściu na nieaktualny profil
+    KIND_CHOICES = [
+        (KIND_INITIAL, 'Pierwsze pobranie'),
+        (KIND_UPDATE, 'Aktualizacja'),
+        (KIND_REFRESH, 'Odświeżenie w tle'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Oczekuje'),
+        (STATUS_RUNNING, 'W trakcie'),
+        (STATUS_DONE, 'Zakończone'),
+        (STATUS_FAILED, 'Błąd'),
+    ]
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    summoner = models.ForeignKey(Summoner, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Najwyżej jedno aktywne zlecenie na Summonera – działa też na SQLite (indeks częściowy),
+            # więc dwa procesy nie mogą równocześnie zlecić pobrania tych samych danych
+            models.UniqueConstraint(fields=['summoner'], condition=models.Q(status__in=('pending', 'running')),
+                                    name='unique_active_job_per_summoner'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.summoner} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    Postęp `manage.py backfill_summoners` dla jednego Summonera – pozwala wznowić
+    przerwany backfill od ostatniej zapisanej strony historii.
+    """
+    summoner = models.OneToOneField(Summoner, on_delete=models.CASCADE, related_name='backfill')
+    next_start = models.PositiveIntegerField(default=0)
+    matches_ingested = models.PositiveIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Backfill {self.summoner} (start={self.next_start}, finished={self.finished})"
+
+
+class MatchArchive(models.Model):
+    """
+    Surowy payload Match-V5 skompresowany zlib-em. Pozwala przeliczyć kolumny
+    `Match`/`Participant` lokalnie (`manage.py rederive`), bez ponownego pobierania z Riot API.
+    """
+    match_id = models.CharField(max_length=100, unique=True)
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Archiwum {self.match_id}"
+
+    @staticmethod
+    def compress(match_data: dict) -> bytes:
+        return zlib.compress(json.dumps(match_data, separators=(',', ':')).encode('utf-8'), level=6)
+
+    @staticmethod
+    def decompress(payload: bytes) -> dict:
+        return json.loads(zlib.decompress(payload))
+
+    @property
+    def data(self) -> dict:
+        return self.decompress(bytes(self.payload))
@@ -0,0 +1,33 @@
+# stats/page_cache.py
+
+import hashlib
+from collections.abc import Callable
+
+from django.core.cache import cache
+
+from .models import Summoner
+from .registry import get_registry
+
+
+def page_cache_key(prefix: str, summ: Summoner, *parts) -> str:
+    """
+    Klucz wpisu: rodzaj strony, Summoner, jego wersja danych i wersja Data Dragon (adresy ikon)
+    oraz skrót pozostałych parametrów (kursor, filtry, region).
+    Po zmianie danych zmienia się wersja, więc stare wpisy nie są już czytane i same wygasają.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f"{prefix}:{summ.pk}:{summ.data_version}:{get_registry().ddragon_version}:{digest}"
+
+
+def cached_render(prefix: str, summ: Summoner, parts: tuple, render: Callable[[], str]) -> str:
+    """
+    Zwraca fragment strony z cache albo renderuje go (`render`) i zapisuje.
+    Przy trafieniu w cache `render` nie jest wołane, więc nie padają zapytania do bazy.
+    """
+    key = page_cache_key(prefix, summ, *parts)
+    content = cache.get(key)
+    if content is None:
+        content = render()
+        cache.set(key, content)
+    return content
+
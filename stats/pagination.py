@@ -0,0 +1,86 @@
+# stats/pagination.py
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(timestamp: datetime, pk: int) -> str:
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    """
+    Odczytuje kursor z adresu strony. Niepoprawny kursor traktowany jest jak brak kursora.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """
+    Strona historii meczów stronicowana po kluczu (czas meczu, id meczu) zamiast OFFSET-u.
+
+    Każda strona to jedno zapytanie "WHERE (timestamp, id) < kursor ORDER BY ... LIMIT n+1",
+    więc jej koszt nie zależy od tego, jak daleko w historii jesteśmy, i nie ma COUNT(*).
+    Dodatkowy (n+1) wiersz mówi tylko, czy istnieje kolejna strona w danym kierunku.
+    """
+
+    def __init__(self, queryset, per_page: int, after: str | None = None, before: str | None = None,
+                 timestamp_field: str = 'timestamp', id_field: str = 'match_id'):
+        self.per_page = per_page
+        self.timestamp_field = timestamp_field
+        self.id_field = id_field
+        queryset = queryset.filter(**{f'{timestamp_field}__isnull': False})
+
+        before_key = decode_cursor(before)
+        after_key = decode_cursor(after) if before_key is None else None
+        if before_key is not None:
+            # Strona poprzednia: idziemy "w górę" od kursora i odwracamy wynik
+            rows = list(queryset.filter(self._newer_than(*before_key))
+                        .order_by(timestamp_field, id_field)[:per_page + 1])
+            self.has_previous = len(rows) > per_page
+            self.has_next = True
+            self.object_list = rows[:per_page][::-1]
+        else:
+            if after_key is not None:
+                queryset = queryset.filter(self._older_than(*after_key))
+            rows = list(queryset.order_by(f'-{timestamp_field}', f'-{id_field}')[:per_page + 1])
+            self.has_next = len(rows) > per_page
+            self.has_previous = after_key is not None
+            self.object_list = rows[:per_page]
+
+        if not self.object_list:
+            # Kursor wskazał poza historię (np. po usunięciu meczów) – nie pokazujemy linków donikąd
+            self.has_previous = self.has_next = False
+
+    def _older_than(self, timestamp, pk) -> Q:
+        return (Q(**{f'{self.timestamp_field}__lt': timestamp})
+                | Q(**{self.timestamp_field: timestamp, f'{self.id_field}__lt': pk}))
+
+    def _newer_than(self, timestamp, pk) -> Q:
+        return (Q(**{f'{self.timestamp_field}__gt': timestamp})
+                | Q(**{self.timestamp_field: timestamp, f'{self.id_field}__gt': pk}))
+
+    def _cursor(self, obj) -> str:
+        timestamp = obj
+        for part in self.timestamp_field.split('__'):
+            timestamp = getattr(timestamp, part)
+        return encode_cursor(timestamp, getattr(obj, self.id_field))
+
+    @property
+    def next_cursor(self) -> str | None:
+        return self._cursor(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self) -> str | None:
+        return self._cursor(self.object_list[0]) if self.has_previous else None
@@ -0,0 +1,429 @@
+# stats/ratelimit.py
+
+import asyncio
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+# Klasy priorytetu zapytań do Riot API – od najważniejszej
+INTERACTIVE = 'interactive'  # użytkownik czeka na stronę (wyszukanie nowego Summonera)
+USER = 'user'                # zlecenia użytkownika: pierwsze pobranie, „Aktualizuj”
+BACKGROUND = 'background'    # odświeżanie w tle, harmonogram, backfill
+PRIORITIES = (INTERACTIVE, USER, BACKGROUND)
+
+_priority: ContextVar[str] = ContextVar('riot_priority', default=INTERACTIVE)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def riot_priority(priority: str):
+    """
+    Ustawia klasę priorytetu zapytań do Riot API w bieżącym kontekście (wątku lub zadaniu asyncio).
+    Wątki z puli nie dziedziczą kontekstu – zadania trzeba zlecać przez `contextvars.copy_context().run`.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class CallPacer:
+    """
+    Rozkłada zapytania jednego odbiorcy (np. harmonogramu odświeżania) równo w czasie:
+    każde zapytanie do hosta dostaje kolejny termin co 1 / (`share` × limit aplikacji) sekund,
+    zamiast wysyłać całą serię naraz. Limit czytany jest z kubełków limitera przy każdym
+    zapytaniu, więc uwzględnia wartości poznane z nagłówków Riot API.
+    """
+
+    def __init__(self, limiter: 'RateLimiter', share: float):
+        self.limiter = limiter
+        self.share = share
+        self._next: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def rate(self, host: str | None = None) -> float:
+        return self.share * self.limiter.app_rate(host)
+
+    def reserve(self, host: str) -> float:
+        """Rezerwuje termin kolejnego zapytania do hosta i zwraca, ile sekund trzeba do niego poczekać."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + 1 / self.rate(host)
+            return slot - now
+
+    def pace(self, host: str) -> None:
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def apace(self, host: str) -> None:
+        wait = await asyncio.to_thread(self.reserve, host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_pacer: ContextVar[CallPacer | None] = ContextVar('riot_pacer', default=None)
+
+
+def current_pacer() -> CallPacer | None:
+    return _pacer.get()
+
+
+@contextmanager
+def riot_pacing(pacer: CallPacer):
+    """
+    Wszystkie zapytania do Riot API w bieżącym kontekście (także w wątkach i zadaniach,
+    które go skopiowały) przechodzą przez `pacer`.
+    """
+    token = _pacer.set(pacer)
+    try:
+        yield
+    finally:
+        _pacer.reset(token)
+
+
+def parse_rate_limits(header: str | None) -> list[tuple[int, int]]:
+    """
+    Parsuje nagłówek w formacie Riot API, np. "20:1,100:120",
+    na listę par (limit, okno w sekundach).
+    """
+    limits = []
+    for part in (header or '').split(','):
+        try:
+            value, window = part.strip().split(':')
+            limits.append((int(value), int(window)))
+        except ValueError:
+            continue
+    return limits
+
+
+class RateLimiter:
+    """
+    Limiter zapytań do Riot API oparty o kubełki tokenów (token bucket).
+
+    Kubełki trzymane są per host regionalny (limit aplikacji) oraz per host i metodę
+    (limit metody) we wspólnym pliku SQLite, więc wszystkie procesy (np. workery gunicorna)
+    korzystające z tego samego klucza API dzielą jeden budżet.
+    Limity odczytywane są z nagłówków X-App-Rate-Limit / X-Method-Rate-Limit,
+    a Retry-After z odpowiedzi 429 blokuje dany zakres do podanego czasu.
+
+    Każda klasa priorytetu ma zarezerwowaną część kubełków dla klas ważniejszych
+    (RIOT_PRIORITY_RESERVES): zapytania w tle nie zejdą poniżej swojej rezerwy, więc
+    użytkownik czekający na stronę nie stoi w kolejce za backfillem. Liczba czekających
+    i czasy oczekiwania per klasa zapisywane są w tym samym pliku (`priority_stats()`).
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS buckets (
+            key TEXT NOT NULL,
+            window INTEGER NOT NULL,
+            capacity INTEGER NOT NULL,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (key, window)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS blocks (
+            key TEXT PRIMARY KEY,
+            until REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS waiters (
+            id INTEGER PRIMARY KEY,
+            priority TEXT NOT NULL,
+            since REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS priority_stats (
+            priority TEXT PRIMARY KEY,
+            acquired INTEGER NOT NULL,
+            delayed INTEGER NOT NULL,
+            rejected INTEGER NOT NULL,
+            total_wait REAL NOT NULL,
+            max_wait REAL NOT NULL
+        )
+        """,
+    )
+
+    def __init__(self, path=None, default_app_limits: str | None = None, reserves: dict | None = None):
+        self._path = path
+        self._default_app_limits = default_app_limits
+        self.reserves = settings.RIOT_PRIORITY_RESERVES if reserves is None else reserves
+        self._local = threading.local()
+
+    @staticmethod
+    def app_key(host: str) -> str:
+        return f"app:{host}"
+
+    @staticmethod
+    def method_key(host: str, method: str) -> str:
+        return f"method:{host}:{method}"
+
+    @property
+    def path(self) -> str:
+        # Bez jawnej ścieżki plik wskazuje RIOT_RATE_LIMIT_DB w chwili połączenia (globalny klient respektuje override_settings)
+        return str(self._path or settings.RIOT_RATE_LIMIT_DB)
+
+    @property
+    def default_app_limits(self) -> list[tuple[int, int]]:
+        return parse_rate_limits(self._default_app_limits if self._default_app_limits is not None
+                                 else settings.RIOT_RATE_LIMIT_DEFAULT)
+
+    def _connection(self) -> sqlite3.Connection:
+        path = self.path
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != path:
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.path = path
+        return conn
+
+    def _keys(self, host: str, method: str | None) -> list[str]:
+        keys = [self.app_key(host)]
+        if method:
+            keys.append(self.method_key(host, method))
+        return keys
+
+    @staticmethod
+    def _refilled(tokens: float, capacity: int, window: int, updated: float, now: float) -> float:
+        return min(capacity, tokens + (now - updated) * capacity / window)
+
+    def app_rate(self, host: str | None = None) -> float:
+        """
+        Najciaśniejszy limit aplikacji dla hosta w zapytaniach na sekundę – według pojemności kubełków
+        (limitów z nagłówków Riot API), a zanim Riot je poda, według RIOT_RATE_LIMIT_DEFAULT.
+        """
+        limits = []
+        if host:
+            limits = self._connection().execute(
+                "SELECT capacity, window FROM buckets WHERE key = ?", (self.app_key(host),)
+            ).fetchall()
+        limits = limits or self.default_app_limits
+        return min(capacity / window for capacity, window in limits) if limits else 1.0
+
+    def try_acquire(self, host: str, method: str | None = None, priority: str = INTERACTIVE) -> float:
+        """
+        Próbuje pobrać po jednym tokenie z kubełków aplikacji i metody.
+        Zwraca 0, gdy się udało, a w przeciwnym razie liczbę sekund,
+        po których warto spróbować ponownie (nic nie jest wtedy pobierane).
+        Klasa `priority` może zużyć tylko tokeny ponad swoją rezerwę.
+        """
+        reserve = self.reserves.get(priority, 0)
+        keys = self._keys(host, method)
+        placeholders = ','.join('?' * len(keys))
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                f"SELECT key, window, capacity, tokens, updated FROM buckets WHERE key IN ({placeholders})",
+                keys,
+            ).fetchall()
+            if not any(row[0] == keys[0] for row in rows):
+                # Zanim Riot poda limity w nagłówkach, używamy domyślnych limitów klucza.
+                for capacity, window in self.default_app_limits:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, ?, ?)",
+                        (keys[0], window, capacity, capacity, now),
+                    )
+                    rows.append((keys[0], window, capacity, capacity, now))
+
+            blocked_until = conn.execute(
+                f"SELECT MAX(until) FROM blocks WHERE key IN ({placeholders})", keys
+            ).fetchone()[0] or 0
+            wait = blocked_until - now
+
+            refilled = []
+            for key, window, capacity, tokens, updated in rows:
+                tokens = self._refilled(tokens, capacity, window, updated, now)
+                refilled.append((key, window, tokens))
+                needed = 1 + reserve * capacity
+                if tokens < needed:
+                    wait = max(wait, (needed - tokens) * window / capacity)
+
+            if wait <= 0:
+                conn.executemany(
+                    "UPDATE buckets SET tokens = ?, updated = ? WHERE key = ? AND window = ?",
+                    [(tokens - 1, now, key, window) for key, window, tokens in refilled],
+                )
+                wait = 0
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def acquire(self, host: str, method: str | None = None, max_wait: float | None = None,
+                priority: str | None = None) -> bool:
+        """
+        Czeka, aż budżet pozwoli na kolejne zapytanie. Zwraca False, jeżeli
+        trzeba by czekać dłużej niż `max_wait` sekund. Bez `priority` używana jest
+        klasa z bieżącego kontekstu (`riot_priority`).
+        """
+        max_wait = settings.RIOT_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        priority = priority or current_priority()
+        wait = self.try_acquire(host, method, priority)
+        if wait <= 0:
+            self._record(priority, acquired=True, waited=None)
+            return True
+
+        started = time.monotonic()
+        waited = 0.0
+        waiter = self._add_waiter(priority)
+        try:
+            while waited + wait <= max_wait:
+                time.sleep(wait)
+                waited += wait
+                wait = self.try_acquire(host, method, priority)
+                if wait <= 0:
+                    break
+        finally:
+            self._remove_waiter(waiter)
+        acquired = wait <= 0
+        self._record(priority, acquired=acquired, waited=time.monotonic() - started)
+        return acquired
+
+    async def aacquire(self, host: str, method: str | None = None, max_wait: float | None = None,
+                       priority: str | None = None) -> bool:
+        """
+        Wersja `acquire` dla asyncio: operacje na pliku SQLite idą do wątku, a oczekiwanie
+        na budżet to `asyncio.sleep`, więc pętla zdarzeń obsługuje w tym czasie inne zapytania.
+        """
+        max_wait = settings.RIOT_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        priority = priority or current_priority()
+        wait = await asyncio.to_thread(self.try_acquire, host, method, priority)
+        if wait <= 0:
+            await asyncio.to_thread(self._record, priority, True, None)
+            return True
+
+        started = time.monotonic()
+        waited = 0.0
+        waiter = await asyncio.to_thread(self._add_waiter, priority)
+        try:
+            while waited + wait <= max_wait:
+                await asyncio.sleep(wait)
+                waited += wait
+                wait = await asyncio.to_thread(self.try_acquire, host, method, priority)
+                if wait <= 0:
+                    break
+        finally:
+            await asyncio.to_thread(self._remove_waiter, waiter)
+        acquired = wait <= 0
+        await asyncio.to_thread(self._record, priority, acquired, time.monotonic() - started)
+        return acquired
+
+    def _add_waiter(self, priority: str) -> int:
+        return self._connection().execute(
+            "INSERT INTO waiters (priority, since) VALUES (?, ?)", (priority, time.time())
+        ).lastrowid
+
+    def _remove_waiter(self, waiter: int) -> None:
+        self._connection().execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+
+    def _record(self, priority: str, acquired: bool, waited: float | None) -> None:
+        self._connection().execute(
+            """
+            INSERT INTO priority_stats VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(priority) DO UPDATE SET
+                acquired = acquired + excluded.acquired,
+                delayed = delayed + excluded.delayed,
+                rejected = rejected + excluded.rejected,
+                total_wait = total_wait + excluded.total_wait,
+                max_wait = MAX(max_wait, excluded.max_wait)
+            """,
+            (priority, int(acquired), int(waited is not None), int(not acquired), waited or 0, waited or 0),
+        )
+
+    def priority_stats(self) -> dict[str, dict]:
+        """
+        Stan klas priorytetu: ile zapytań czeka teraz na budżet (`waiting`), ile przeszło,
+        ile musiało czekać i ile odrzucono oraz średni i najdłuższy czas oczekiwania w sekundach.
+        Czekający starsi niż dwukrotność RIOT_RATE_LIMIT_MAX_WAIT (np. po zabitym procesie) są pomijani.
+        """
+        conn = self._connection()
+        stats = {priority: self._empty_stats() for priority in PRIORITIES}
+        since = time.time() - 2 * max(settings.RIOT_RATE_LIMIT_MAX_WAIT, 1)
+        for priority, waiting in conn.execute(
+                "SELECT priority, COUNT(*) FROM waiters WHERE since >= ? GROUP BY priority", (since,)):
+            stats.setdefault(priority, self._empty_stats())['waiting'] = waiting
+        for priority, acquired, delayed, rejected, total_wait, max_wait in conn.execute(
+                "SELECT priority, acquired, delayed, rejected, total_wait, max_wait FROM priority_stats"):
+            stats.setdefault(priority, self._empty_stats()).update(
+                acquired=acquired, delayed=delayed, rejected=rejected,
+                avg_wait=total_wait / delayed if delayed else 0.0, max_wait=max_wait,
+            )
+        return stats
+
+    @staticmethod
+    def _empty_stats() -> dict:
+        return {'waiting': 0, 'acquired': 0, 'delayed': 0, 'rejected': 0, 'avg_wait': 0.0, 'max_wait': 0.0}
+
+    def _sync_scope(self, conn, key: str, limits_header: str | None, counts_header: str | None, now: float):
+        limits = parse_rate_limits(limits_header)
+        if not limits:
+            return
+        counts = dict((window, count) for count, window in parse_rate_limits(counts_header))
+        conn.execute(
+            f"DELETE FROM buckets WHERE key = ? AND window NOT IN ({','.join('?' * len(limits))})",
+            [key] + [window for _, window in limits],
+        )
+        for capacity, window in limits:
+            row = conn.execute(
+                "SELECT capacity, tokens, updated FROM buckets WHERE key = ? AND window = ?", (key, window)
+            ).fetchone()
+            tokens = capacity if row is None else self._refilled(row[1], row[0], window, row[2], now)
+            # Licznik z nagłówka uwzględnia też zapytania spoza tego limitera – ufamy wartości mniejszej.
+            tokens = min(tokens, capacity - counts.get(window, 0))
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)",
+                (key, window, capacity, tokens, now),
+            )
+
+    def update_from_headers(self, host: str, method: str | None, headers) -> None:
+        """
+        Aktualizuje pojemności kubełków i stan tokenów na podstawie nagłówków odpowiedzi.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._sync_scope(conn, self.app_key(host),
+                             headers.get('X-App-Rate-Limit'), headers.get('X-App-Rate-Limit-Count'), now)
+            if method:
+                self._sync_scope(conn, self.method_key(host, method),
+                                 headers.get('X-Method-Rate-Limit'), headers.get('X-Method-Rate-Limit-Count'), now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def block(self, host: str, method: str | None, retry_after: float, limit_type: str | None = None) -> None:
+        """
+        Po odpowiedzi 429 wstrzymuje zapytania w zakresie wskazanym przez X-Rate-Limit-Type
+        (limit metody/usługi blokuje tylko metodę, pozostałe – całą aplikację).
+        """
+        if method and limit_type in ('method', 'service'):
+            key = self.method_key(host, method)
+        else:
+            key = self.app_key(host)
+        until = time.time() + retry_after
+        self._connection().execute(
+            "INSERT INTO blocks VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET until = MAX(until, excluded.until)",
+            (key, until),
+        )
@@ -0,0 +1,144 @@
+# stats/registry.py
+
+import threading
+import time
+from types import MappingProxyType
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from django.conf import settings
+
+from .models import Champion, Queue, StaticDataVersion
+
+
+DDRAGON = 'ddragon'
+QUEUES = 'queues'
+
+
+class ChampionInfo:
+    __slots__ = ('pk', 'key', 'name', 'icon')
+
+    def __init__(self, pk: int, key: int, name: str, icon: str):
+        object.__setattr__(self, 'pk', pk)
+        object.__setattr__(self, 'key', key)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'icon', icon)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} jest tylko do odczytu")
+
+    def __repr__(self):
+        return f"ChampionInfo(key={self.key}, name={self.name!r})"
+
+
+class QueueInfo:
+    __slots__ = ('pk', 'queue_id', 'description')
+
+    def __init__(self, pk: int, queue_id: int, description: str | None):
+        object.__setattr__(self, 'pk', pk)
+        object.__setattr__(self, 'queue_id', queue_id)
+        object.__setattr__(self, 'description', description)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} jest tylko do odczytu")
+
+    def __repr__(self):
+        return f"QueueInfo(queue_id={self.queue_id}, description={self.description!r})"
+
+
+class StaticRegistry:
+    """
+    Niezmienna migawka danych statycznych (championy, kolejki i wersja Data Dragon)
+    z wyszukiwaniem O(1) po kluczu Riot. Nie jest nigdy modyfikowana – odświeżenie buduje nową migawkę
+    i podmienia ją jednym przypisaniem, więc czytające wątki nie potrzebują blokad.
+    """
+    __slots__ = ('champions', 'queues', 'versions')
+
+    def __init__(self, champions: dict[int, ChampionInfo], queues: dict[int, QueueInfo],
+                 versions: dict[str, str] | None = None):
+        object.__setattr__(self, 'champions', MappingProxyType(champions))
+        object.__setattr__(self, 'queues', MappingProxyType(queues))
+        object.__setattr__(self, 'versions', MappingProxyType(versions or {}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StaticRegistry jest tylko do odczytu")
+
+    @classmethod
+    def load(cls) -> 'StaticRegistry':
+        champions = {
+            key: ChampionInfo(pk, key, name, icon)
+            for pk, key, name, icon in Champion.objects.values_list('pk', 'key', 'name', 'icon')
+        }
+        queues = {
+            queue_id: QueueInfo(pk, queue_id, description)
+            for pk, queue_id, description in Queue.objects.values_list('pk', 'queue_id', 'description')
+        }
+        versions = dict(StaticDataVersion.objects.values_list('name', 'version'))
+        return cls(champions, queues, versions)
+
+    @property
+    def ddragon_version(self) -> str:
+        return self.versions.get(DDRAGON, settings.DDRAGON_DEFAULT_VERSION)
+
+    def champion_pk(self, key) -> int | None:
+        try:
+            champion = self.champions.get(int(key))
+        except (TypeError, ValueError):
+            return None
+        return champion.pk if champion else None
+
+    def queue_pk(self, queue_id) -> int | None:
+        queue = self.queues.get(queue_id)
+        return queue.pk if queue else None
+
+
+_registry: StaticRegistry | None = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_registry() -> StaticRegistry:
+    """
+    Zwraca bieżącą migawkę, wczytując ją z bazy przy pierwszym użyciu w procesie.
+    Co STATIC_DATA_CHECK_INTERVAL sekund porównuje wersje z tabelą StaticDataVersion (jedno małe
+    zapytanie) – synchronizacja wykonana w innym procesie (np. cron `sync_static_data`)
+    trafia wtedy także do workerów serwera WWW, bez ich restartu.
+    """
+    global _checked_at
+    registry = _registry
+    if registry is None:
+        return refresh_registry()
+    if time.monotonic() - _checked_at >= settings.STATIC_DATA_CHECK_INTERVAL:
+        _checked_at = time.monotonic()
+        if dict(StaticDataVersion.objects.values_list('name', 'version')) != registry.versions:
+            registry = refresh_registry()
+    return registry
+
+
+def refresh_registry() -> StaticRegistry:
+    """
+    Wczytuje championy, kolejki i wersje z bazy (trzy zapytania) i podmienia migawkę.
+    Wołane po zapisie danych statycznych oraz gdy w meczu pojawi się nieznany klucz
+    (np. nowy champion dodany przez inny proces).
+    """
+    global _registry, _checked_at
+    with _lock:
+        _registry = StaticRegistry.load()
+        _checked_at = time.monotonic()
+        return _registry
+
+
+def clear_registry() -> None:
+    global _registry
+    with _lock:
+        _registry = None
+
+
+@receiver(post_save, sender=Champion)
+@receiver(post_save, sender=Queue)
+@receiver(post_delete, sender=Champion)
+@receiver(post_delete, sender=Queue)
+def _static_data_changed(sender, **kwargs):
+    # Pojedyncze zapisy przez ORM (np. w panelu admina) – następne użycie wczyta migawkę od nowa
+    clear_registry()
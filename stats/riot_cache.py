@@ -0,0 +1,126 @@
+# stats/riot_cache.py
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+
+
+class CachedResponse:
+    """
+    Odpowiedź odczytana z cache – udostępnia to, czego używają funkcje w `stats/utils.py`.
+    """
+
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    Cache odpowiedzi Riot API w pliku SQLite, wspólny dla wszystkich procesów.
+
+    Czas życia wpisu zależy od metody Riot API (RIOT_CACHE_TTLS) – mecze są niezmienne,
+    konta zmieniają się rzadko, a wpisy ligowe po każdej grze. Odpowiedzi 404 też są
+    zapamiętywane (RIOT_CACHE_NEGATIVE_TTL), żeby literówki w Riot ID nie zużywały limitu.
+    Liczba wpisów jest ograniczona – nadmiarowe usuwane są od najdawniej używanych (LRU).
+    """
+
+    CACHEABLE_STATUSES = (200, 404)
+    EVICT_EVERY = 100
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            status INTEGER NOT NULL,
+            body BLOB NOT NULL,
+            expires REAL NOT NULL,
+            accessed REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)",
+    )
+
+    def __init__(self, path=None, ttls: dict | None = None, negative_ttl: float | None = None,
+                 max_entries: int | None = None):
+        self._path = path
+        self.ttls = settings.RIOT_CACHE_TTLS if ttls is None else ttls
+        self.negative_ttl = settings.RIOT_CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries or settings.RIOT_CACHE_MAX_ENTRIES
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def path(self) -> str:
+        # Bez jawnej ścieżki plik wskazuje RIOT_CACHE_DB w chwili połączenia (globalny klient respektuje override_settings)
+        return str(self._path or settings.RIOT_CACHE_DB)
+
+    def _connection(self) -> sqlite3.Connection:
+        path = self.path
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != path:
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.path = path
+        return conn
+
+    @staticmethod
+    def key(url: str, params: dict | None = None) -> str:
+        return f"{url}?{urlencode(sorted(params.items()))}" if params else url
+
+    def ttl(self, method: str | None, status_code: int) -> float:
+        if status_code == 404:
+            return self.negative_ttl
+        return self.ttls.get(method, 0)
+
+    def get(self, url: str, params: dict | None = None) -> CachedResponse | None:
+        conn = self._connection()
+        key = self.key(url, params)
+        now = time.time()
+        row = conn.execute("SELECT status, body FROM responses WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return CachedResponse(row[0], zlib.decompress(row[1]))
+
+    def set(self, url: str, params: dict | None, method: str | None, response) -> None:
+        if response.status_code not in self.CACHEABLE_STATUSES:
+            return
+        ttl = self.ttl(method, response.status_code)
+        if ttl <= 0:
+            return
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (self.key(url, params), response.status_code, zlib.compress(response.content), now + ttl, now),
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Usuwa wpisy przeterminowane oraz najdawniej używane ponad limit `max_entries`.
+        """
+        conn = self._connection()
+        conn.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM responses")
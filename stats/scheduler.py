@@ -0,0 +1,83 @@
+# stats/scheduler.py
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .jobs import RefreshCooldown, claim_job, enqueue_ingestion, run_ingestion_job
+from .models import IngestionJob, Summoner
+from .ratelimit import CallPacer
+from .utils import riot_client
+
+
+def decayed_score(score: float, last_viewed: datetime | None, now: datetime) -> float:
+    """
+    Popularność profilu na chwilę `now` – każde wejście waży o połowę mniej po VIEW_SCORE_HALF_LIFE sekundach.
+    """
+    if last_viewed is None:
+        return 0.0
+    age = max((now - last_viewed).total_seconds(), 0)
+    return score * 0.5 ** (age / settings.VIEW_SCORE_HALF_LIFE)
+
+
+def record_view(summ: Summoner) -> None:
+    """
+    Zapisuje wejście na profil. Wejścia tego samego Summonera liczone są najwyżej raz na
+    VIEW_TRACK_INTERVAL sekund (znacznik w cache), więc popularny profil nie zapisuje do bazy przy każdym wyświetleniu.
+    Ograniczenie działa między workerami tylko przy wspólnym cache (np. PAGE_CACHE_DIR) –
+    z domyślnym LocMemCache każdy proces zapisuje wejście raz na swój własny interwał.
+    """
+    if not cache.add(f"viewed:{summ.pk}", 1, timeout=settings.VIEW_TRACK_INTERVAL):
+        return
+    now = timezone.now()
+    score = decayed_score(summ.view_score, summ.last_viewed, now) + 1
+    Summoner.objects.filter(pk=summ.pk).update(view_score=score, last_viewed=now)
+
+
+def refresh_candidates(limit: int) -> list[Summoner]:
+    """
+    Summonerzy z nieaktualnymi danymi (starszymi niż PROFILE_FRESHNESS), uporządkowani od
+    najbardziej prawdopodobnego następnego wejścia. Pomijani są ci, dla których trwa już
+    zlecenie albo ostatnia próba nie powiodła się przed chwilą.
+    """
+    now = timezone.now()
+    jobs = IngestionJob.objects.filter(summoner=OuterRef('pk'))
+    recent_failure = now - timedelta(seconds=settings.INGESTION_REFRESH_COOLDOWN)
+    # Summonerzy bez last_refreshed (zapisani przed wprowadzeniem zleceń) też są nieaktualni
+    outdated = Q(last_refreshed__isnull=True) | Q(last_refreshed__lt=now - timedelta(seconds=settings.PROFILE_FRESHNESS))
+    summoners = (Summoner.objects
+                 .filter(outdated, last_viewed__gte=now - timedelta(seconds=4 * settings.VIEW_SCORE_HALF_LIFE))
+                 .exclude(Exists(jobs.filter(status__in=IngestionJob.ACTIVE_STATUSES)))
+                 .exclude(Exists(jobs.filter(status=IngestionJob.STATUS_FAILED, finished_at__gte=recent_failure))))
+    ranked = sorted(summoners, key=lambda s: (-decayed_score(s.view_score, s.last_viewed, now),
+                                              s.last_refreshed or datetime.min.replace(tzinfo=now.tzinfo)))
+    return ranked[:limit]
+
+
+def scheduler_pacer(share: float | None = None) -> CallPacer:
+    """
+    Dozownik zapytań harmonogramu: każde zapytanie do Riot API czeka na swój termin, tak by średnio
+    zużywać `share` (REFRESH_SCHEDULER_SHARE) najciaśniejszego limitu aplikacji – aktualnego,
+    poznanego przez limiter z nagłówków Riot API.
+    """
+    share = settings.REFRESH_SCHEDULER_SHARE if share is None else share
+    return CallPacer(riot_client.limiter, share)
+
+
+def refresh_summoner(summ: Summoner) -> IngestionJob | None:
+    """
+    Zleca odświeżenie i wykonuje je od razu w bieżącym procesie. Zwraca None, gdy dane
+    pobiera już inny proces albo Summoner jest w trakcie cooldownu.
+    """
+    try:
+        job = enqueue_ingestion(summ, IngestionJob.KIND_REFRESH)
+    except RefreshCooldown:
+        return None
+    if not claim_job(job):
+        return None
+    job.summoner = summ
+    run_ingestion_job(job)
+    return job
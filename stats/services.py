@@ -1,322 +1,601 @@
 # stats/services.py
 
-from .models import (Match, Participant, Summoner, Champion, Queue, SummonerChampion)
-from .utils import (get_match_ids_by_puuid, get_match_by_id, get_champions, get_queues, get_summoner_info_by_puuid, get_queues_info_by_summoner_id, RateLimitException)
+from .models import (Match, Participant, Summoner, Champion, Queue, SummonerChampion, SummonerChampionBreakdown,
+                     MatchArchive, SummonerQueueStats, StaticDataVersion, GAME_MODE_TO_NAME)
+from .registry import DDRAGON, QUEUES, QueueInfo, StaticRegistry, get_registry, refresh_registry
+from .utils import (get_match_ids_by_puuid, get_match_by_id, get_champions, get_queues, get_summoner_info_by_puuid, get_queues_info_by_summoner_id, RateLimitException,
+                    get_ddragon_versions, champion_icon_url, profile_icon_url, aget_match_ids_by_puuid, aget_match_by_id,
+                    aget_summoner_info_by_puuid, aget_queues_info_by_summoner_id)
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
 from django.utils import timezone
-from datetime import datetime
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from datetime import datetime, timezone as dt_timezone
+from collections import Counter, defaultdict
 from decimal import Decimal, ROUND_HALF_UP
+import asyncio
+import hashlib
+import json
+import logging
 
 
+logger = logging.getLogger(__name__)
+
 MATCHES_LIMIT = 60
-GAME_MODE_TO_NAME = {
-    "5v5 Ranked Solo games": "Solo/Duo",
-    "5v5 Ranked Flex games": "Flex",
-    "5v5 Blind Pick games": "Blind Pick",
-    "5v5 ARAM games": "ARAM",
-    "SWIFTPLAY": "Swiftplay",
-}
+INGEST_BATCH_SIZE = 30
 
 
-def save_champions():
-    try:
-        champions = get_champions()
-        if champions:
-            for champ, data in champions.get('data').items():
-                champ_obj, created = Champion.objects.get_or_create(
-                    key=data.get('key'),
-                    name=data.get('name'),
-                    icon=f"https://ddragon.leagueoflegends.com/cdn/15.11.1/img/champion/{data.get('image').get('full')}",
-                )
-    except Exception as e:
-        print(e)
-
-
-def save_queues():
-    try:
-        queues = get_queues()
-        if queues:
-            for data in queues:
-                que_obj, created = Queue.objects.get_or_create(
-                    queue_id = data.get('queueId'),
-                    description = data.get('description'),
-                )
-    except Exception as e:
-        print(e)
-
-
-def save_recent_matches_for_summoner(summ: Summoner, force_get_data: bool = False) -> None:
+def save_champions(version: str, registry: StaticRegistry) -> int:
+    """
+    Zapisuje championów z Data Dragon w danej wersji. Do bazy trafiają tylko nowi
+    lub zmienieni (nazwa, ikona) – jednym upsertem po kluczu championa.
+    Zwraca liczbę zapisanych wierszy.
+    """
+    champions = get_champions(version).get('data', {}).values()
+    changed = []
+    for data in champions:
+        key = int(data.get('key'))
+        name = data.get('name')
+        icon = champion_icon_url(version, data.get('image', {}).get('full'))
+        known = registry.champions.get(key)
+        if known is None or (known.name, known.icon) != (name, icon):
+            changed.append(Champion(key=key, name=name, icon=icon))
+    Champion.objects.bulk_create(changed, update_conflicts=True, unique_fields=['key'], update_fields=['name', 'icon'])
+    return len(changed)
+
+
+def save_queues(queues: list[dict], registry: StaticRegistry) -> int:
+    """
+    Zapisuje nowe kolejki i zmienione opisy jednym upsertem po queue_id.
+    Zwraca liczbę zapisanych wierszy.
+    """
+    changed = [
+        Queue(queue_id=data.get('queueId'), description=data.get('description'))
+        for data in queues
+        if data.get('queueId') not in registry.queues
+        or registry.queues[data.get('queueId')].description != data.get('description')
+    ]
+    Queue.objects.bulk_create(changed, update_conflicts=True, unique_fields=['queue_id'], update_fields=['description'])
+    return len(changed)
+
+
+def sync_static_data(force: bool = False) -> dict | None:
+    """
+    Synchronizuje championów i kolejki z aktualną wersją Data Dragon.
+    Jeżeli wersja nie zmieniła się od ostatniej synchronizacji, kończy się na jednym
+    (cache'owanym) zapytaniu o listę wersji. W przeciwnym razie zapisuje różnice
+    w jednej transakcji, zapamiętuje wersję i odświeża rejestr danych statycznych.
+    Zwraca podsumowanie zmian albo None, gdy nie było nic do zrobienia.
+    """
+    version = get_ddragon_versions()[0]
+    registry = get_registry()
+    if not force and registry.versions.get(DDRAGON) == version:
+        return None
+    # Inny proces mógł już zsynchronizować tę wersję – porównujemy ze stanem bazy
+    registry = refresh_registry()
+    if not force and registry.versions.get(DDRAGON) == version:
+        return None
+
+    queues = get_queues()
+    queues_checksum = hashlib.sha1(json.dumps(queues, sort_keys=True).encode()).hexdigest()
+
+    with transaction.atomic():
+        champions_changed = save_champions(version, registry)
+        queues_changed = 0
+        if force or registry.versions.get(QUEUES) != queues_checksum:
+            queues_changed = save_queues(queues, registry)
+        for name, value in ((DDRAGON, version), (QUEUES, queues_checksum)):
+            StaticDataVersion.objects.update_or_create(name=name, defaults={'version': value})
+
+    refresh_registry()
+    return {'version': version, 'champions': champions_changed, 'queues': queues_changed}
+
+
+def save_recent_matches_for_summoner(summ: Summoner, force_get_data: bool = False, incremental: bool = False) -> None:
     """
     Pobierz w pętlach kolejne porcje ID meczów od Riot API 
-    (parametry: start=0,100,200…; count=100) aż API przestanie zwracać nowe.
+    (parametry: start=0,30,60…; count=30) aż API przestanie zwracać nowe.
     W bazie wstawi tylko te match_id, których jeszcze nie ma.
+    Przy `incremental=True` lista zawężana jest do meczów od najnowszego zapisanego
+    (startTime), a stronicowanie kończy się na pierwszym meczu, który Summoner już ma w bazie.
+    Mecze zapisane wcześniej przy innych śledzonych graczach nie są pobierane ponownie –
+    wiersze tego Summonera są już w bazie i zostają tylko przypięte.
+    Szczegóły meczów pobierane są równolegle (RIOT_FETCH_WORKERS wątków, wspólny limiter
+    i klasa priorytetu wywołującego),
+    a zapis do bazy odbywa się tylko w bieżącym wątku, paczkami przez `ingest_match_payloads`.
+    Mecz, którego Riot API nie zwraca (Http404), jest pomijany – reszta zapisuje się normalnie.
+    """
+    region = summ.region
+    batch_size = 30
+    start = 0
+    start_time = None
+    link_summoner_participants(summ)
+    if incremental:
+        newest = Participant.objects.filter(summoner=summ).aggregate(newest=Max('timestamp'))['newest']
+        if newest:
+            start_time = int(newest.timestamp())
+
+    pool = ThreadPoolExecutor(max_workers=settings.RIOT_FETCH_WORKERS)
+    pending = []
+    try:
+        while start < MATCHES_LIMIT:
+            match_ids_chunk = get_match_ids_by_puuid(summ.puuid, region, count=batch_size, start=start,
+                                                     start_time=start_time)
+            if not match_ids_chunk:
+                break
+            if force_get_data:
+                to_fetch, reached_known = match_ids_chunk, False
+            else:
+                known = set(_known_match_ids(summ, match_ids_chunk))
+                to_fetch, reached_known = _select_new_matches(match_ids_chunk, known, incremental)
+            # Kopia kontekstu przenosi do wątków klasę priorytetu zapytań (riot_priority)
+            pending.extend(pool.submit(copy_context().run, get_match_by_id, match_id, region)
+                           for match_id in to_fetch)
+
+            if reached_known or len(match_ids_chunk) < batch_size:
+                break
+            # następna strona:
+            start += batch_size
+
+        payloads = []
+        for future in as_completed(pending):
+            try:
+                match_data = future.result()
+            except Http404:
+                # Mecz zniknął z Riot API – pomijamy go, pozostałe zapisujemy
+                continue
+            if match_data:
+                payloads.append(match_data)
+            if len(payloads) >= INGEST_BATCH_SIZE:
+                ingest_match_payloads(payloads)
+                payloads = []
+        ingest_match_payloads(payloads)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def asave_recent_matches_for_summoner(summ: Summoner, force_get_data: bool = False,
+                                            incremental: bool = False) -> None:
+    """
+    Wersja `save_recent_matches_for_summoner` dla asyncio: ID meczów i ich szczegóły pobierane są
+    przez klienta httpx (najwyżej RIOT_FETCH_WORKERS naraz, bez wątków), a zapis paczek przez
+    `ingest_match_payloads` idzie do wątku bazy (sync_to_async).
     """
     region = summ.region
     batch_size = 30
     start = 0
+    start_time = None
+    await sync_to_async(link_summoner_participants)(summ)
+    if incremental:
+        newest = (await Participant.objects.filter(summoner=summ).aaggregate(newest=Max('timestamp')))['newest']
+        if newest:
+            start_time = int(newest.timestamp())
 
-    while True:
-        match_ids_chunk = get_match_ids_by_puuid(summ.puuid, region, count=batch_size, start=start)
-        if not match_ids_chunk or start>=MATCHES_LIMIT:
-            break
-        for match_id in match_ids_chunk:
-            match_obj, created = Match.objects.get_or_create(match_id=match_id, defaults={'game_duration': 0, 'timestamp': timezone.now()})
-            if created or force_get_data:
-                # Tylko jeżeli created=True, będziemy pobierać szczegóły z API
-                match_data = get_match_by_id(match_id, region)
-                if not match_data:
-                    match_obj.delete()
-                    continue
+    semaphore = asyncio.Semaphore(settings.RIOT_FETCH_WORKERS)
+
+    async def fetch(match_id):
+        async with semaphore:
+            return await aget_match_by_id(match_id, region)
 
-                info = match_data.get('info', {})
-
-                # pobranie kolejki queue
-                queue_type = info.get('queueType')  # np. "RANKED_SOLO_5x5" lub "RANKED_FLEX_SR"
-                queue_obj, _ = Queue.objects.get_or_create(
-                    queue_id=info.get('queueId'),
-                    defaults={'description': queue_type}
-                )
-                match_obj.queue = queue_obj
-
-                # Match API data
-                game_mode = info.get('gameMode')
-                game_duration = info.get('gameDuration', 0)
-                game_start_timestamp = info.get('gameStartTimestamp', None)
-                game_name = GAME_MODE_TO_NAME[queue_obj.description] if queue_obj.description in GAME_MODE_TO_NAME else queue_obj.description if queue_obj.description else game_mode
-                if len(game_name)<=1 and queue_obj.queue_id == 480:
-                    game_name="Quickplay"
-                team_stats = dict()
-
-                match_obj.game_mode = game_mode
-                match_obj.game_name = game_name
-                match_obj.game_duration = game_duration
-                
-                # Timestamp w API to liczba ms od 1.1.1970
-                ts_ms = game_start_timestamp
-                if ts_ms:
-                    match_obj.timestamp = timezone.make_aware(datetime.fromtimestamp(ts_ms/1000.0))
-                else:
-                    match_obj.timestamp = timezone.now()
-                
-                # match_obj.save()
-
-                summ_participation_holder = None
-                participants = info.get('participants', [])
-                for p in participants:
-                    if p.get('puuid') == summ.puuid:
-                        summ_participation_holder = p
-                    else:
-                        k               = p.get('kills', 0)
-                        d               = p.get('deaths', 0)
-                        a               = p.get('assists', 0)
-                        team_id         = p.get('teamId')
-
-                        if team_id not in team_stats:
-                            team_stats[team_id] = {'kills': k, 'deaths': d, 'assists': a}
-                        else:
-                            team_stats[team_id]['kills'] += k
-                            team_stats[team_id]['deaths'] += d
-                            team_stats[team_id]['assists'] += a
-                    
-
-                # dodawanie rozpatrywanego participant
-                p = summ_participation_holder
-                champion_key = p.get('championId')
-                champ_obj = Champion.objects.get(key=champion_key)
-
-                puuid_p         = p.get('puuid')
-                champ           = champ_obj
-                k               = p.get('kills', 0)
-                d               = p.get('deaths', 0)
-                a               = p.get('assists', 0)
-                win             = p.get('win', False)
-                team_id         = p.get('teamId')
-
-                team_stats[team_id]['kills'] += k
-                team_stats[team_id]['deaths'] += d
-                team_stats[team_id]['assists'] += a
-
-                lane            = p.get('lane')
-                farm            = p.get('totalMinionsKilled', 0)
-                damage_dealt    = p.get('totalDamageDealt', 0)
-                wards           = p.get('wardsPlaced', 0)
-                gold_earned     = p.get('goldEarned', 0)
-                double_k        = p.get('doubleKills', 0)
-                triple_k        = p.get('tripleKills', 0)
-                quadra_k        = p.get('quadraKills', 0)
-                penta_k         = p.get('pentaKills', 0)
-                kp              = (k / team_stats[team_id]['kills']) if team_stats[team_id]['kills'] > 0 else 0
-
-                try:
-                    summ_part = Summoner.objects.get(puuid=puuid_p)
-                except Summoner.DoesNotExist:
-                    pass
-
-                Participant.objects.create(
-                    summoner=summ_part,
-                    match=match_obj,
-                    champion=champ,
-                    team_id=team_id,
-                    lane=lane,
-                    kills=k,
-                    deaths=d,
-                    assists=a,
-                    win=win,
-                    farm=farm,
-                    damage_dealt=damage_dealt,
-                    wards=wards,
-                    double_kills = double_k,
-                    triple_kills = triple_k,
-                    quadra_kills = quadra_k,
-                    penta_kills = penta_k,
-                    kill_participation = kp,
-                    gold_earned = gold_earned,
-                )
-
-                # uzupelnienie pozostalych statystyk meczu
-                match_obj.team0_kills = team_stats.get(100, 0).get('kills', 0)
-                match_obj.team0_deaths = team_stats.get(100, 0).get('deaths', 0)
-                match_obj.team0_assists = team_stats.get(100, 0).get('assists', 0)
-                match_obj.team1_kills = team_stats.get(200, 0).get('kills', 0)
-                match_obj.team1_deaths = team_stats.get(200, 0).get('deaths', 0)
-                match_obj.team1_assists = team_stats.get(200, 0).get('assists', 0)
-
-                match_obj.save()
-
-        # następna strona:
-        start += batch_size
-
-
-
-from django.db.models import Avg, Sum, Count, F, Q
-from .models import Summoner, Participant, Match
-
-def recalculate_summoner_advanced_stats(summ: Summoner):
+    pending = []
+    try:
+        while start < MATCHES_LIMIT:
+            match_ids_chunk = await aget_match_ids_by_puuid(summ.puuid, region, count=batch_size, start=start,
+                                                            start_time=start_time)
+            if not match_ids_chunk:
+                break
+            if force_get_data:
+                to_fetch, reached_known = match_ids_chunk, False
+            else:
+                known = {match_id async for match_id in _known_match_ids(summ, match_ids_chunk)}
+                to_fetch, reached_known = _select_new_matches(match_ids_chunk, known, incremental)
+            pending.extend(asyncio.create_task(fetch(match_id)) for match_id in to_fetch)
+
+            if reached_known or len(match_ids_chunk) < batch_size:
+                break
+            start += batch_size
+
+        payloads = []
+        for next_done in asyncio.as_completed(pending):
+            try:
+                match_data = await next_done
+            except Http404:
+                continue
+            if match_data:
+                payloads.append(match_data)
+            if len(payloads) >= INGEST_BATCH_SIZE:
+                await sync_to_async(ingest_match_payloads)(payloads)
+                payloads = []
+        await sync_to_async(ingest_match_payloads)(payloads)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _known_match_ids(summ: Summoner, match_ids: list[str]):
+    return (Participant.objects.filter(puuid=summ.puuid, match__match_id__in=match_ids)
+            .values_list('match__match_id', flat=True))
+
+
+def _select_new_matches(match_ids: list[str], known: set[str], incremental: bool) -> tuple[list[str], bool]:
+    """
+    Wybiera ze strony ID meczów te do pobrania. Zwraca je razem z informacją,
+    czy trafiliśmy na mecz już zapisany (wtedy przy `incremental` kolejne strony nie są potrzebne).
+    """
+    if not incremental:
+        # Mecze zapisane już przy innym śledzonym graczu mają wiersz tego Summonera – nie pobieramy ich
+        return [match_id for match_id in match_ids if match_id not in known], False
+    # Mecze przychodzą od najnowszego – wszystko za pierwszym znanym już mamy
+    to_fetch = []
+    for match_id in match_ids:
+        if match_id in known:
+            return to_fetch, True
+        to_fetch.append(match_id)
+    return to_fetch, False
+
+
+def _game_name(queue_id: int | None, description: str | None, game_mode: str | None) -> str | None:
+    game_name = GAME_MODE_TO_NAME.get(description, description) if description else game_mode
+    if (not game_name or len(game_name)<=1) and queue_id == 480:
+        game_name = "Quickplay"
+    return game_name
+
+
+def parse_match_payload(match_data: dict) -> dict:
     """
-    Pobiera wszystkie Participanty tego Summonera,
-    dzieli na SoloQ vs FlexQ (na podstawie match.queue)
-    i zapisuje wszystkie pole w Summoner (solo_*, flex_*).
+    Zamienia payload Match-V5 na słownik z polami `Match` oraz listą uczestników
+    (surowe dane Riot API, bez odwołań do bazy).
     """
+    info = match_data.get('info', {})
 
-    # Q do filtrowania:
-    from django.db.models import Q
+    team_stats = defaultdict(lambda: {'kills': 0, 'deaths': 0, 'assists': 0})
+    participants = info.get('participants', [])
+    for p in participants:
+        team = team_stats[p.get('teamId')]
+        team['kills'] += p.get('kills', 0)
+        team['deaths'] += p.get('deaths', 0)
+        team['assists'] += p.get('assists', 0)
+
+    # Timestamp w API to liczba ms od 1.1.1970
+    ts_ms = info.get('gameStartTimestamp')
+    timestamp = datetime.fromtimestamp(ts_ms/1000.0, tz=dt_timezone.utc) if ts_ms else timezone.now()
+
+    return {
+        'match_id': match_data.get('metadata', {}).get('matchId'),
+        'queue_id': info.get('queueId'),
+        'queue_type': info.get('queueType'),  # np. "RANKED_SOLO_5x5" lub "RANKED_FLEX_SR"
+        'game_mode': info.get('gameMode'),
+        'game_duration': info.get('gameDuration', 0),
+        'timestamp': timestamp,
+        'team0_kills': team_stats[100]['kills'],
+        'team0_deaths': team_stats[100]['deaths'],
+        'team0_assists': team_stats[100]['assists'],
+        'team1_kills': team_stats[200]['kills'],
+        'team1_deaths': team_stats[200]['deaths'],
+        'team1_assists': team_stats[200]['assists'],
+        'participants': participants,
+        'team_kills': {team_id: stats['kills'] for team_id, stats in team_stats.items()},
+    }
+
+
+def _participant_fields(p: dict, team_kills: dict) -> dict:
+    k = p.get('kills', 0)
+    team_id = p.get('teamId')
+    total_kills = team_kills.get(team_id, 0)
+    return {
+        'team_id': team_id,
+        'lane': p.get('lane'),
+        'kills': k,
+        'deaths': p.get('deaths', 0),
+        'assists': p.get('assists', 0),
+        'win': p.get('win', False),
+        'farm': p.get('totalMinionsKilled', 0),
+        'damage_dealt': p.get('totalDamageDealt', 0),
+        'wards': p.get('wardsPlaced', 0),
+        'gold_earned': p.get('goldEarned', 0),
+        'double_kills': p.get('doubleKills', 0),
+        'triple_kills': p.get('tripleKills', 0),
+        'quadra_kills': p.get('quadraKills', 0),
+        'penta_kills': p.get('pentaKills', 0),
+        'kill_participation': (k / total_kills) if total_kills > 0 else 0,
+    }
+
+
+def _queue_map(parsed: list[dict]) -> dict[int, QueueInfo]:
+    """
+    Zwraca kolejki użyte w paczce meczów (queue_id -> QueueInfo) z rejestru danych statycznych.
+    Brakujące tworzy jednym zapytaniem i odświeża rejestr – zwykle nie trzeba pytać bazy wcale.
+    """
+    queue_types = {m['queue_id']: m['queue_type'] for m in parsed if m['queue_id'] is not None}
+    registry = get_registry()
+    if any(qid not in registry.queues for qid in queue_types):
+        registry = refresh_registry()  # mogły zostać dodane przez inny proces
+        missing = [Queue(queue_id=qid, description=qtype)
+                   for qid, qtype in queue_types.items() if qid not in registry.queues]
+        if missing:
+            Queue.objects.bulk_create(missing, ignore_conflicts=True)
+            registry = refresh_registry()
+    return {qid: registry.queues[qid] for qid in queue_types}
 
-    solo_q_filter = Q(match__queue__queue_id=420)  # 420 = SoloQ 5x5 ranked
-    flex_q_filter = Q(match__queue__queue_id=440)  # 440 = FlexQ ranked
 
-    # --- 1) SoloQ: sumy kills, deaths, assists, count meczów, sumy wards, sumy gold, sumy minions
-    solo_queryset = Participant.objects.filter(summoner=summ).filter(solo_q_filter)
+MATCH_UPDATE_FIELDS = [
+    'queue', 'game_mode', 'game_name', 'game_duration', 'timestamp',
+    'team0_kills', 'team0_deaths', 'team0_assists', 'team1_kills', 'team1_deaths', 'team1_assists',
+]
 
-    solo_agg = solo_queryset.aggregate(
-        total_kills=Sum('kills'),
-        total_deaths=Sum('deaths'),
-        total_assists=Sum('assists'),
-        total_wards=Sum('wards'),
-        total_gold=Sum('gold_earned'),
-        total_farm=Sum('farm'),
-        matches_count=Count('id')  # ile wierszy (meczów) w SoloQ
-    )
 
-    # --- 2) FlexQ
-    flex_queryset = Participant.objects.filter(summoner=summ).filter(flex_q_filter)
-
-    flex_agg = flex_queryset.aggregate(
-        total_kills=Sum('kills'),
-        total_deaths=Sum('deaths'),
-        total_assists=Sum('assists'),
-        total_wards=Sum('wards'),
-        total_gold=Sum('gold_earned'),
-        total_farm=Sum('farm'),
-        matches_count=Count('id')
-    )
+PARTICIPANT_UPDATE_FIELDS = [
+    'summoner', 'champion', 'team_id', 'lane', 'kills', 'deaths', 'assists', 'win', 'farm',
+    'damage_dealt', 'wards', 'gold_earned', 'double_kills', 'triple_kills', 'quadra_kills',
+    'penta_kills', 'kill_participation', 'queue_id', 'timestamp',
+]
 
-    # --- 3) kda (podzielić przez zero → zabezpieczenie)
-    if solo_agg['matches_count'] and solo_agg['total_deaths']:
-        solo_kda = ((solo_agg['total_kills'] + solo_agg['total_assists']) / solo_agg['total_deaths']) if solo_agg['total_deaths'] > 0 else 0
-    else:
-        solo_kda = 0.0
-
-    if flex_agg['matches_count'] and flex_agg['total_deaths']:
-        flex_kda = ((flex_agg['total_kills'] + flex_agg['total_assists']) / flex_agg['total_deaths']) if flex_agg['total_deaths'] > 0 else 0 
-    else:
-        flex_kda = 0.0
-
-    # --- 4) średnie vision (wards), gold_per_min, minions_per_min
-    #    gold_per_min = total_gold / (suma czasu wszystkich matchów w minutach)
-    #    minions_per_min = total_farm / (suma czasu matchów w minutach)
-
-    solo_total_duration_secs = (
-        Match.objects
-        .filter(participant__summoner=summ)
-        .filter(queue__description="5v5 Ranked Solo games")
-        .aggregate(total=Sum('game_duration'))['total'] or 0
-    )
 
-    flex_total_duration_secs = (
-        Match.objects
-        .filter(participant__summoner=summ)
-        .filter(queue__description="5v5 Ranked Flex games")
-        .aggregate(total=Sum('game_duration'))['total'] or 0
-    )
+def ingest_match_payloads(payloads: list[dict], archive: bool = True) -> int:
+    """
+    Zapisuje paczkę payloadów Match-V5: mecze (upsert po match_id) oraz wszystkich
+    uczestników (upsert po meczu i puuid), powiązanych ze śledzonymi Summonerami.
+    Postacie, kolejki i Summonerzy rozwiązywani są z map wczytanych raz na paczkę,
+    a cały zapis odbywa się w jednej transakcji. Przy `archive=True` surowe payloady
+    trafiają też skompresowane do `MatchArchive`. Zwraca liczbę zapisanych meczów.
+    """
+    parsed = [parse_match_payload(data) for data in payloads if data]
+    parsed = [m for m in parsed if m['match_id']]
+    if not parsed:
+        return 0
+
+    registry = get_registry()
+    new_keys = {p.get('championId') for m in parsed for p in m['participants']} - set(registry.champions)
+    if new_keys - {None}:
+        registry = refresh_registry()  # nowy champion mógł zostać zapisany przez inny proces
+    puuids = {p.get('puuid') for m in parsed for p in m['participants']}
+    summoner_ids = dict(Summoner.objects.filter(puuid__in=puuids).values_list('puuid', 'id'))
+
+    with transaction.atomic():
+        # Wartości sprzed zapisu – potrzebne, żeby skorygować sumy w SummonerQueueStats
+        previous = list(
+            Participant.objects
+            .filter(match__match_id__in=[m['match_id'] for m in parsed], summoner__isnull=False)
+            .values('match_id', 'puuid', *ROLLUP_ROW_VALUES)
+        )
+        queues = _queue_map(parsed)
+        matches = []
+        for m in parsed:
+            queue_obj = queues.get(m['queue_id'])
+            matches.append(Match(
+                match_id=m['match_id'],
+                queue_id=queue_obj.pk if queue_obj else None,
+                game_mode=m['game_mode'],
+                game_name=_game_name(m['queue_id'], queue_obj.description if queue_obj else None, m['game_mode']),
+                game_duration=m['game_duration'],
+                timestamp=m['timestamp'],
+                team0_kills=m['team0_kills'],
+                team0_deaths=m['team0_deaths'],
+                team0_assists=m['team0_assists'],
+                team1_kills=m['team1_kills'],
+                team1_deaths=m['team1_deaths'],
+                team1_assists=m['team1_assists'],
+            ))
+        Match.objects.bulk_create(
+            matches, update_conflicts=True, unique_fields=['match_id'], update_fields=MATCH_UPDATE_FIELDS,
+        )
+        match_pks = dict(Match.objects.filter(match_id__in=[m['match_id'] for m in parsed])
+                         .values_list('match_id', 'id'))
+
+        participants = []
+        unknown_champions = set()
+        for m in parsed:
+            for p in m['participants']:
+                champion_id = registry.champion_pk(p.get('championId'))
+                if not p.get('puuid'):
+                    continue
+                if champion_id is None:
+                    unknown_champions.add(p.get('championId'))
+                    continue
+                participants.append(Participant(
+                    summoner_id=summoner_ids.get(p['puuid']),
+                    puuid=p['puuid'],
+                    match_id=match_pks[m['match_id']],
+                    queue_id=m['queue_id'],
+                    timestamp=m['timestamp'],
+                    champion_id=champion_id,
+                    **_participant_fields(p, m['team_kills']),
+                ))
+
+        Participant.objects.bulk_create(
+            participants, update_conflicts=True, unique_fields=['match', 'puuid'],
+            update_fields=PARTICIPANT_UPDATE_FIELDS,
+        )
 
-    # gold_per_min i minions_per_min:
-    if solo_total_duration_secs:
-        solo_gpm = (solo_agg['total_gold'] / (solo_total_duration_secs / 60)) if solo_total_duration_secs > 0 else 0
-        solo_mpm = (solo_agg['total_farm'] / (solo_total_duration_secs / 60)) if solo_total_duration_secs > 0 else 0
-    else:
-        solo_gpm = 0
-        solo_mpm = 0
-
-    if flex_total_duration_secs:
-        flex_gpm = (flex_agg['total_gold'] / (flex_total_duration_secs / 60)) if flex_total_duration_secs > 0 else 0
-        flex_mpm = (flex_agg['total_farm'] / (flex_total_duration_secs / 60)) if flex_total_duration_secs > 0 else 0
-    else:
-        flex_gpm = 0
-        flex_mpm = 0
-
-    # --- 5) Wyznaczanie main_role: 
-
-    solo_lane_counts = (
-        solo_queryset
-        .values('lane')
-        .annotate(count=Count('lane'))
-        .order_by('-count')
-    )
-    flex_lane_counts = (
-        flex_queryset
-        .values('lane')
-        .annotate(count=Count('lane'))
-        .order_by('-count')
+        written = {(p.match_id, p.puuid) for p in participants}
+        deltas = defaultdict(Counter)
+        for row in previous:
+            if (row['match_id'], row['puuid']) in written and row['match__queue_id']:
+                deltas[row['summoner_id'], row['match__queue_id']].subtract(_rollup_contribution(row))
+        durations = {match_pks[m['match_id']]: m['game_duration'] for m in parsed}
+        match_queues = {match_pks[m['match_id']]: queues[m['queue_id']].pk for m in parsed if m['queue_id'] in queues}
+        for p in participants:
+            if p.summoner_id and p.match_id in match_queues:
+                deltas[p.summoner_id, match_queues[p.match_id]].update(SummonerQueueStats.contribution(
+                    p.win, p.kills, p.deaths, p.assists, p.wards, p.gold_earned, p.farm,
+                    durations[p.match_id], p.lane,
+                ))
+        apply_queue_stats_deltas(deltas)
+        bump_data_version({p.summoner_id for p in participants} | {row['summoner_id'] for row in previous})
+
+        if archive:
+            MatchArchive.objects.bulk_create(
+                [MatchArchive(match_id=data['metadata']['matchId'], payload=MatchArchive.compress(data))
+                 for data in payloads if data and data.get('metadata', {}).get('matchId')],
+                update_conflicts=True, unique_fields=['match_id'], update_fields=['payload', 'archived_at'],
+            )
+
+    if unknown_champions:
+        logger.warning("Pominięto uczestników z nieznanymi postaciami: %s.", sorted(unknown_champions))
+
+    return len(parsed)
+
+
+def bump_data_version(summoner_ids) -> None:
+    """
+    Oznacza dane Summonerów jako zmienione, co unieważnia ich strony w cache
+    (jedno UPDATE, atomowe przez F()).
+    """
+    summoner_ids = {pk for pk in summoner_ids if pk}
+    if summoner_ids:
+        Summoner.objects.filter(pk__in=summoner_ids).update(data_version=F('data_version') + 1,
+                                                            data_updated=timezone.now())
+
+
+def link_summoner_participants(summ: Summoner) -> int:
+    """
+    Przypina do Summonera jego wiersze Participant zapisane wcześniej przy meczach
+    innych śledzonych graczy – bez żadnego zapytania do Riot API.
+    """
+    with transaction.atomic():
+        unlinked = Participant.objects.filter(puuid=summ.puuid, summoner__isnull=True)
+        rows = list(unlinked.filter(match__queue__isnull=False).values(*ROLLUP_ROW_VALUES))
+        linked = unlinked.update(summoner=summ)
+        deltas = defaultdict(Counter)
+        for row in rows:
+            deltas[summ.pk, row['match__queue_id']].update(_rollup_contribution(row))
+        apply_queue_stats_deltas(deltas)
+        if linked:
+            bump_data_version([summ.pk])
+    return linked
+
+
+ROLLUP_ROW_VALUES = (
+    'summoner_id', 'match__queue_id', 'match__game_duration', 'win', 'kills', 'deaths', 'assists',
+    'wards', 'gold_earned', 'farm', 'lane',
+)
+
+
+def _rollup_contribution(row: dict) -> dict:
+    return SummonerQueueStats.contribution(
+        row['win'], row['kills'], row['deaths'], row['assists'], row['wards'], row['gold_earned'],
+        row['farm'], row['match__game_duration'], row['lane'],
     )
 
-    solo_main_role = solo_lane_counts[0]['lane'] if solo_lane_counts else None
-    flex_main_role = flex_lane_counts[0]['lane'] if flex_lane_counts else None
 
-    # --- 6) pole w Summoner:
-    summ.solo_kda = round(solo_kda, 2)
-    summ.flex_kda = round(flex_kda, 2)
+def apply_queue_stats_deltas(deltas: dict[tuple[int, int], Counter]) -> None:
+    """
+    Dodaje różnice do sum w SummonerQueueStats (klucz: (summoner_id, queue_id)).
+    Aktualizacja przez F() jest atomowa, więc równoległe zapisy nie gubią się nawzajem.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+    SummonerQueueStats.objects.bulk_create(
+        [SummonerQueueStats(summoner_id=summoner_id, queue_id=queue_id) for summoner_id, queue_id in deltas],
+        ignore_conflicts=True,
+    )
+    for (summoner_id, queue_id), delta in deltas.items():
+        SummonerQueueStats.objects.filter(summoner_id=summoner_id, queue_id=queue_id).update(
+            **{field: F(field) + value for field, value in delta.items() if value}
+        )
+
 
-    summ.solo_main_role = solo_main_role
-    summ.flex_main_role = flex_main_role
 
-    summ.solo_vision_avg = (solo_agg['total_wards'] / solo_agg['matches_count']) if solo_agg['matches_count'] else 0.0
-    summ.flex_vision_avg = (flex_agg['total_wards'] / flex_agg['matches_count']) if flex_agg['matches_count'] else 0.0
+def recalculate_summoner_advanced_stats(summ: Summoner) -> None:
+    """
+    Przebudowuje od zera sumy w SummonerQueueStats dla wszystkich kolejek Summonera
+    jednym zapytaniem (GROUP BY kolejka z agregacją warunkową dla ról).
+    Na co dzień sumy aktualizuje ingestia – ta funkcja służy do naprawy i przeliczeń.
+    """
+    lane_filters = {
+        field: Q(lane__in=[lane for lane, f in SummonerQueueStats.LANE_FIELDS.items() if f == field])
+        for field in dict.fromkeys(SummonerQueueStats.LANE_FIELDS.values())
+    }
+    # Grupowanie po zdenormalizowanym queue_id czyta wiersze z indeksu (summoner, queue_id, …);
+    # z Match potrzebny jest już tylko czas gry, dociągany po kluczu głównym
+    rows = (
+        Participant.objects
+        .filter(summoner=summ, queue_id__isnull=False)
+        .values('queue_id')
+        .annotate(
+            games=Count('id'),
+            wins=Count('id', filter=Q(win=True)),
+            kills=Coalesce(Sum('kills'), 0),
+            deaths=Coalesce(Sum('deaths'), 0),
+            assists=Coalesce(Sum('assists'), 0),
+            wards=Coalesce(Sum('wards'), 0),
+            gold=Coalesce(Sum('gold_earned'), 0),
+            farm=Coalesce(Sum('farm'), 0),
+            duration=Coalesce(Sum('match__game_duration'), 0),
+            **{field: Count('id', filter=condition) for field, condition in lane_filters.items()},
+        )
+        .order_by()
+    )
 
-    summ.solo_gold_per_min = int(solo_gpm)
-    summ.flex_gold_per_min = int(flex_gpm)
+    registry = get_registry()
+    stats = []
+    for row in rows:
+        queue_pk = registry.queue_pk(row.pop('queue_id'))
+        if queue_pk is None:
+            continue
+        row['lane_none'] = row['games'] - sum(row[field] for field in lane_filters)
+        stats.append(SummonerQueueStats(summoner=summ, queue_id=queue_pk, **row))
+
+    # Sumy zgodne z zapisanymi – bez zapisu i bez podbijania wersji danych (jak przy championach)
+    existing = set(SummonerQueueStats.objects.filter(summoner=summ)
+                   .values_list('queue_id', *SummonerQueueStats.SUM_FIELDS))
+    if existing == {(qs.queue_id, *(getattr(qs, field) for field in SummonerQueueStats.SUM_FIELDS)) for qs in stats}:
+        return
+
+    with transaction.atomic():
+        SummonerQueueStats.objects.filter(summoner=summ) \
+                                  .exclude(queue_id__in=[qs.queue_id for qs in stats]) \
+                                  .delete()
+        SummonerQueueStats.objects.bulk_create(
+            stats, update_conflicts=True, unique_fields=['summoner', 'queue'],
+            update_fields=SummonerQueueStats.SUM_FIELDS,
+        )
+        bump_data_version([summ.pk])
 
-    summ.solo_minions_per_min = solo_mpm
-    summ.flex_minions_per_min = flex_mpm
 
-    summ.save()
+RANK_UPDATE_FIELDS = [
+    'summoner_id', 'icon', 'summoner_level', 'rank_solo', 'solo_wins', 'solo_loses',
+    'rank_flex', 'flex_wins', 'flex_loses',
+]
 
 
 def save_summoner_rank_info(summ: Summoner) -> None:
     summoner_info = get_summoner_info_by_puuid(summ.puuid, summ.server)
-    summoner_id = summoner_info.get('id')
-    icon_id = summoner_info.get('profileIconId')
-    summoner_level = summoner_info.get('summonerLevel')
+    leagues = get_queues_info_by_summoner_id(summoner_info.get('id'), summ.server)
+    before = _rank_values(summ)
+    _apply_rank_info(summ, summoner_info, leagues)
+    if _rank_values(summ) == before:
+        return  # ranga bez zmian – wersja danych (i strony w cache) zostaje
+    # Bez data_version – zapis całego obiektu mógłby cofnąć wersję podbitą w międzyczasie przez ingestię
+    summ.save(update_fields=RANK_UPDATE_FIELDS)
+    bump_data_version([summ.pk])
+
 
+async def asave_summoner_rank_info(summ: Summoner) -> None:
+    """
+    Wersja `save_summoner_rank_info` dla asyncio (ścieżka ASGI i worker z --concurrency).
+    """
+    summoner_info = await aget_summoner_info_by_puuid(summ.puuid, summ.server)
+    leagues = await aget_queues_info_by_summoner_id(summoner_info.get('id'), summ.server)
+    before = _rank_values(summ)
+    await sync_to_async(_apply_rank_info)(summ, summoner_info, leagues)
+    if _rank_values(summ) == before:
+        return
+    await summ.asave(update_fields=RANK_UPDATE_FIELDS)
+    await sync_to_async(bump_data_version)([summ.pk])
+
+
+def _rank_values(summ: Summoner) -> list:
+    return [getattr(summ, field) for field in RANK_UPDATE_FIELDS]
+
+
+def _apply_rank_info(summ: Summoner, summoner_info: dict, leagues: list[dict]) -> None:
     solo_rank = None
     solo_wins = None
     solo_loses = None
@@ -324,8 +603,7 @@ def save_summoner_rank_info(summ: Summoner) -> None:
     flex_wins = None
     flex_loses = None
 
-    data = get_queues_info_by_summoner_id(summoner_id, summ.server)
-    for league in data:
+    for league in leagues:
         match league.get('queueType'):
             case "RANKED_SOLO_5x5":
                 solo_rank = f"{league.get('tier', 'Unknown')} {league.get('rank', '')}"
@@ -336,9 +614,9 @@ def save_summoner_rank_info(summ: Summoner) -> None:
                 flex_wins = league.get('wins', 0)
                 flex_loses = league.get('losses', 0)
     
-    summ.summoner_id = summoner_id
-    summ.icon = f"https://ddragon.leagueoflegends.com/cdn/15.11.1/img/profileicon/{icon_id}.png"
-    summ.summoner_level = summoner_level
+    summ.summoner_id = summoner_info.get('id')
+    summ.icon = profile_icon_url(get_registry().ddragon_version, summoner_info.get('profileIconId'))
+    summ.summoner_level = summoner_info.get('summonerLevel')
 
     summ.rank_solo = solo_rank
     summ.solo_wins = solo_wins
@@ -348,64 +626,90 @@ def save_summoner_rank_info(summ: Summoner) -> None:
     summ.flex_wins = flex_wins
     summ.flex_loses = flex_loses
 
-    summ.save()
 
+CHAMPION_TOTALS = {
+    'matches_num': Count('id'),
+    'wins': Count('id', filter=Q(win=True)),
+    'kills': Coalesce(Sum('kills'), 0),
+    'deaths': Coalesce(Sum('deaths'), 0),
+    'assists': Coalesce(Sum('assists'), 0),
+}
 
-def recalculate_summoner_champions(summoner):
-    # 1) Pobranie wszystkich Participant danego Summonera
-    participants = Participant.objects.filter(summoner=summoner).select_related('champion')
-
-    # 2) Grupowanie po champion_id
-    stats = defaultdict(lambda: {
-        'matches': 0,
-        'wins': 0,
-        'kills': 0,
-        'deaths': 0,
-        'assists': 0
-    })
 
-    for p in participants:
-        cid = p.champion_id
-        stats[cid]['matches'] += 1
-        stats[cid]['wins'] += 1 if p.win else 0
-        stats[cid]['kills'] += p.kills
-        stats[cid]['deaths'] += p.deaths
-        stats[cid]['assists'] += p.assists
-
-    # 3) Usuń stare rekordy SummonerChampion dla tego summoner
-    SummonerChampion.objects.filter(summoner=summoner).delete()
-
-    # 4) Dla każdej grupy policz winratio i kda i wstaw nowe rekordy
-    objects_to_create = []
-    for champ_id, vals in stats.items():
-        matches = vals['matches']
-        wins = vals['wins']
-        total_kills = vals['kills']
-        total_deaths = vals['deaths'] if vals['deaths'] > 0 else 0  # liczymy 0 zgonów
-
-        # Winratio w procentach (Decimal)
-        winratio_val = (Decimal(wins) / Decimal(matches) * Decimal(100)).quantize(
-            Decimal('0.01'),
-            rounding=ROUND_HALF_UP
-        ) if matches else Decimal('0.00')
-
-        # KDA = (kills + assists) / deaths (jeśli deaths == 0, dzielimy przez 1, by nie dzielić przez zero)
-        denom = Decimal(total_deaths) if total_deaths else Decimal(1)
-        kda_val = (Decimal(total_kills + vals['assists']) / denom).quantize(
-            Decimal('0.01'),
-            rounding=ROUND_HALF_UP
-        )
+def _percent(part, whole) -> Decimal:
+    return (Decimal(part) / Decimal(whole) * Decimal(100)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) \
+        if whole else Decimal('0.00')
 
-        objects_to_create.append(
-            SummonerChampion(
-                summoner=summoner,
-                champion_id=champ_id,
-                matches_num=matches,
-                winratio=winratio_val,
-                kda=kda_val
-            )
-        )
 
-    # 5) Masowe wstawienie
-    if objects_to_create:
-        SummonerChampion.objects.bulk_create(objects_to_create)
\ No newline at end of file
+def _kda(kills, deaths, assists) -> Decimal:
+    # KDA = (kills + assists) / deaths (jeśli deaths == 0, dzielimy przez 1, by nie dzielić przez zero)
+    return (Decimal(kills + assists) / Decimal(deaths or 1)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def recalculate_summoner_champions(summoner):
+    """
+    Przelicza statystyki Summonera per champion oraz ich rozbicie na kolejkę i rolę.
+    Grupowanie wykonuje baza (GROUP BY), a wyniki zapisywane są upsertem –
+    usuwane są tylko wiersze championów/ról, których Summoner już nie ma.
+    """
+    participants = Participant.objects.filter(summoner=summoner)
+
+    # 1) Sumy per champion – jeden wiersz na championa zamiast wszystkich meczów
+    champions = []
+    for row in participants.values('champion').annotate(**CHAMPION_TOTALS).order_by():
+        champions.append(SummonerChampion(
+            summoner=summoner,
+            champion_id=row['champion'],
+            matches_num=row['matches_num'],
+            winratio=_percent(row['wins'], row['matches_num']),
+            kda=_kda(row['kills'], row['deaths'], row['assists']),
+        ))
+
+    # 2) Rozbicie per champion, kolejka i rola
+    breakdown = []
+    rows = (participants
+            .filter(match__queue__isnull=False)
+            .values('champion', 'match__queue', role=Coalesce('lane', Value('NONE')))
+            .annotate(**CHAMPION_TOTALS)
+            .order_by())
+    for row in rows:
+        breakdown.append(SummonerChampionBreakdown(
+            summoner=summoner,
+            champion_id=row['champion'],
+            queue_id=row['match__queue'],
+            lane=row['role'],
+            **{field: row[field] for field in CHAMPION_TOTALS},
+        ))
+
+    # Bez zmian w wierszach nie zapisujemy nic i nie podbijamy wersji danych – odświeżenie
+    # bez nowych meczów nie unieważnia stron w cache ani ETag-ów API
+    existing_champions = set(SummonerChampion.objects.filter(summoner=summoner)
+                             .values_list('champion_id', 'matches_num', 'winratio', 'kda'))
+    existing_breakdown = {tuple(row): pk for pk, *row in (SummonerChampionBreakdown.objects
+                                                          .filter(summoner=summoner)
+                                                          .values_list('pk', 'champion_id', 'queue_id', 'lane',
+                                                                       *CHAMPION_TOTALS))}
+    if existing_champions == {(c.champion_id, c.matches_num, c.winratio, c.kda) for c in champions} \
+            and set(existing_breakdown) == {(b.champion_id, b.queue_id, b.lane,
+                                             *(getattr(b, field) for field in CHAMPION_TOTALS))
+                                            for b in breakdown}:
+        return
+
+    current = {(b.champion_id, b.queue_id, b.lane) for b in breakdown}
+    stale = [pk for key, pk in existing_breakdown.items() if key[:3] not in current]
+
+    with transaction.atomic():
+        SummonerChampion.objects.filter(summoner=summoner) \
+                                .exclude(champion_id__in=[c.champion_id for c in champions]) \
+                                .delete()
+        SummonerChampion.objects.bulk_create(
+            champions, update_conflicts=True, unique_fields=['summoner', 'champion'],
+            update_fields=['matches_num', 'winratio', 'kda'],
+        )
+        if stale:
+            SummonerChampionBreakdown.objects.filter(pk__in=stale).delete()
+        SummonerChampionBreakdown.objects.bulk_create(
+            breakdown, update_conflicts=True, unique_fields=['summoner', 'champion', 'queue', 'lane'],
+            update_fields=list(CHAMPION_TOTALS),
+        )
+        bump_data_version([summoner.pk])
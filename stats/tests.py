@@ -1,6 +1,90 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404, QueryDict
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from stats.models import Summoner, Queue, Champion, Match, Participant
+from django.utils import timezone
+from stats.jobs import (RefreshCooldown, active_job_for, claim_job, claim_next_job, enqueue_ingestion,
+                        refresh_cooldown_remaining)
+from stats.models import (Summoner, Queue, Champion, Match, Participant, IngestionJob, BackfillCheckpoint,
+                          MatchArchive, StaticDataVersion, SummonerChampion, SummonerQueueStats)
+from stats.services import (ingest_match_payloads, link_summoner_participants, recalculate_summoner_advanced_stats,
+                            recalculate_summoner_champions, save_recent_matches_for_summoner, save_summoner_rank_info,
+                            sync_static_data,
+                            asave_recent_matches_for_summoner)
+from stats.ratelimit import (BACKGROUND, INTERACTIVE, USER, RateLimiter, current_pacer, parse_rate_limits,
+                             riot_priority)
+from stats.registry import clear_registry, get_registry
+from stats.riot_cache import ResponseCache
+from stats.scheduler import decayed_score, record_view, refresh_candidates, scheduler_pacer
+from stats.utils import (AsyncRiotClient, RateLimitException, RiotClient, aget_match_by_id, async_riot_client,
+                         get_match_by_id, riot_client)
+from stats.views import HISTORY_PAGE_SIZE, history_filters
+
+
+class TestCase(DjangoTestCase):
+    """
+    Baza jest cofana po każdym teście, więc rejestr danych statycznych i cache stron
+    (klucze z id Summonera) też muszą startować od zera. Limiter i cache Riot API
+    trzymają pliki SQLite w osobnym katalogu tymczasowym dla każdego testu, a nie w plikach dewelopera.
+    """
+
+    def run(self, result=None):
+        clear_registry()
+        cache.clear()
+        riot_dir = Path(tempfile.mkdtemp())
+        try:
+            with override_settings(RIOT_RATE_LIMIT_DB=riot_dir / 'ratelimit.sqlite3',
+                                   RIOT_CACHE_DB=riot_dir / 'cache.sqlite3'):
+                return super().run(result)
+        finally:
+            shutil.rmtree(riot_dir, ignore_errors=True)
+
+
+def make_match_payload(match_id, puuid, champion_key=1, queue_id=420, win=True, timestamp_ms=1748606400000):
+    """
+    Buduje minimalny payload Match-V5 z dziesięcioma uczestnikami;
+    `puuid` gra w drużynie 100 na pozycji MIDDLE.
+    """
+    participants = []
+    for i in range(10):
+        team_id = 100 if i < 5 else 200
+        participants.append({
+            'puuid': puuid if i == 0 else f"{match_id}-player-{i}",
+            'championId': champion_key,
+            'teamId': team_id,
+            'lane': 'MIDDLE' if i in (0, 5) else 'TOP',
+            'kills': 2, 'deaths': 1, 'assists': 3,
+            'win': win if team_id == 100 else not win,
+            'totalMinionsKilled': 150, 'totalDamageDealt': 10000, 'wardsPlaced': 8,
+            'goldEarned': 11000, 'doubleKills': 0, 'tripleKills': 0, 'quadraKills': 0, 'pentaKills': 0,
+        })
+    return {
+        'metadata': {'matchId': match_id},
+        'info': {
+            'queueId': queue_id,
+            'queueType': None,
+            'gameMode': 'CLASSIC',
+            'gameDuration': 1800,
+            'gameStartTimestamp': timestamp_ms,
+            'participants': participants,
+        },
+    }
 
 
 class HomeViewTest(TestCase):
@@ -15,6 +99,14 @@ class HomeViewTest(TestCase):
         # sprawdzamy, czy użyty został właściwy template
         self.assertTemplateUsed(response, 'stats/home.html')
 
+    def test_failed_static_sync_is_logged_and_not_retried_on_every_request(self):
+        with mock.patch('stats.views.sync_static_data', side_effect=Exception("brak sieci")) as sync, \
+             self.assertLogs('stats.views', 'ERROR') as logs:
+            self.client.get(reverse('home'))
+            self.client.get(reverse('home'))
+        sync.assert_called_once()
+        self.assertIn("brak sieci", logs.output[0])
+
 
 class SummonerModelTest(TestCase):
     def test_solo_matches_num_and_winratio_zero(self):
@@ -72,7 +164,10 @@ class SummonerDetailViewTest(TestCase):
         )
         Participant.objects.create(
             summoner=self.summ,
+            puuid=self.summ.puuid,
             match=m,
+            queue_id=m.queue.queue_id,
+            timestamp=m.timestamp,
             champion=champ,
             team_id=100,
             lane="MID",
@@ -103,7 +198,7 @@ class SummonerDetailViewTest(TestCase):
         self.assertEqual(response.context['summoner'], self.summ)
         # Sprawdźmy, że w kontekście są Participanty
         participants = response.context['page_obj'].object_list
-        self.assertEqual(participants.count(), 1)
+        self.assertEqual(len(participants), 1)
         self.assertEqual(participants[0].match.match_id, "match123")
 
 
@@ -122,6 +217,29 @@ class SummonerDetailNotFoundTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class AsyncSummonerLookupTest(TestCase):
+    def test_cold_lookup_creates_summoner_and_enqueues_job(self):
+        """
+        Pierwsze wyszukanie pobiera konto asynchronicznym klientem, zapisuje Summonera i zleca pobranie danych.
+        """
+        account = {'puuid': 'puuid-async', 'gameName': 'Async', 'tagLine': 'EUW'}
+        with mock.patch('stats.views.aget_summoner_by_name_and_tag', new=mock.AsyncMock(return_value=account)), \
+             mock.patch('stats.views.aget_summoner_server', new=mock.AsyncMock(return_value='euw1')):
+            response = self.client.get(reverse('summoner_detail', args=['async', 'euw']) + "?region=europe")
+
+        self.assertEqual(response.status_code, 200)
+        summ = Summoner.objects.get(puuid='puuid-async')
+        self.assertEqual((summ.server, summ.region), ('euw1', 'europe'))
+        self.assertEqual(active_job_for(summ).kind, IngestionJob.KIND_INITIAL)
+
+    def test_rate_limit_redirects_home(self):
+        with mock.patch('stats.views.aget_summoner_by_name_and_tag',
+                        new=mock.AsyncMock(side_effect=RateLimitException("limit"))):
+            response = self.client.get(reverse('summoner_detail', args=['Nobody', 'EUW']))
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertFalse(Summoner.objects.exists())
+
+
 class SummonerUpdateTest(TestCase):
     def setUp(self):
         # podobnie jak poprzednio – przygotuj model, match, participant
@@ -143,54 +261,1258 @@ class SummonerUpdateTest(TestCase):
             timestamp="2025-05-20T10:00:00Z"
         )
         Participant.objects.create(
-            summoner=self.summ, match=self.m1, champion=self.champ,
+            summoner=self.summ, puuid=self.summ.puuid, match=self.m1, champion=self.champ,
+            queue_id=self.q.queue_id, timestamp=self.m1.timestamp,
             team_id=100, lane="MID", kills=3, deaths=1, assists=5,
             win=True, farm=100, damage_dealt=5000, wards=5,
             double_kills=0, triple_kills=0, quadra_kills=0, penta_kills=0,
             kill_participation=0.5, gold_earned=9000
         )
 
-    def test_update_removes_and_repopulates(self):
+    def test_update_fetches_only_new_matches(self):
         """
-        Gdy POSTujemy update=1, widok powinien:
-        1) usunąć obecny match i participant,
-        2) w powtórce 'save_recent_matches_for_summoner' dodać nowe (simulowane przez nas, więc sami tworzymy ręcznie),
-        3) zwrócić redirect na GET, a po przekierowaniu pokazać co najmniej 1 Participant.
+        Gdy POSTujemy update=1, widok zleca aktualizację w tle i od razu robi redirect na GET.
+        Worker, wykonując zlecenie, powinien:
+        1) zachować dotychczasową historię (zakończone mecze się nie zmieniają),
+        2) pobrać ID meczów od najnowszego zapisanego (startTime) i zatrzymać się na pierwszym znanym,
+        3) pobrać z API szczegóły tylko nowych meczów.
         """
         url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
+        self.assertEqual(Participant.objects.filter(summoner=self.summ).count(), 1)
+
+        response = self.client.post(f"{url}?region={self.summ.region}", data={'update': '1'}, follow=True)
+        job = IngestionJob.objects.get(summoner=self.summ)
+        self.assertEqual(job.kind, IngestionJob.KIND_UPDATE)
+        self.assertEqual(response.context['job'], job)
+
+        with mock.patch('stats.services.get_match_ids_by_puuid', return_value=["m2", "m1", "m0"]) as get_ids, \
+             mock.patch('stats.services.get_match_by_id',
+                        return_value=make_match_payload("m2", self.summ.puuid)) as get_match:
+            call_command('run_ingestion_worker', '--once', stdout=StringIO())
+
+        get_match.assert_called_once_with("m2", self.summ.region)
+        self.assertEqual(get_ids.call_count, 1)
+        self.assertEqual(get_ids.call_args.kwargs['start_time'], int(Match.objects.get(match_id="m1").timestamp.timestamp()))
+        self.assertEqual(
+            set(Participant.objects.filter(summoner=self.summ).values_list('match__match_id', flat=True)),
+            {"m1", "m2"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summoner'], self.summ)
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_DONE)
+
+
+class RiotClientTest(TestCase):
+    def test_session_is_reused_per_host(self):
+        """
+        Zapytania do tego samego hosta regionalnego idą przez jedną sesję (pulę połączeń),
+        a inny host dostaje osobną sesję.
+        """
+        client = RiotClient(pool_size=4, timeout=1, retries=0)
+        europe = client.session_for('europe.api.riotgames.com')
+        self.assertIs(client.session_for('europe.api.riotgames.com'), europe)
+        self.assertIsNot(client.session_for('americas.api.riotgames.com'), europe)
+        self.assertEqual(europe.get_adapter('https://europe.api.riotgames.com')._pool_maxsize, 4)
+
+    def test_get_uses_pooled_session_and_timeout(self):
+        client = RiotClient(pool_size=2, timeout=5, retries=0, headers={'X-Riot-Token': 'key'})
+        session = client.session_for('europe.api.riotgames.com')
+        with mock.patch.object(session, 'get') as session_get:
+            client.get('https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1')
+        session_get.assert_called_once_with(
+            'https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1',
+            params=None, headers={'X-Riot-Token': 'key'}, timeout=5,
+        )
+
+    def test_helpers_route_through_client(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'metadata': {'matchId': 'EUW1_1'}}
+        with mock.patch.object(riot_client, 'get', return_value=response) as client_get:
+            data = get_match_by_id('EUW1_1', 'europe')
+        self.assertEqual(data['metadata']['matchId'], 'EUW1_1')
+        client_get.assert_called_once_with('https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1',
+                                           method='match-v5.match')
+
+
+class AsyncRiotClientTest(TestCase):
+    def make_client(self, handler, **kwargs):
+        client = AsyncRiotClient(timeout=1, headers={'X-Riot-Token': 'key'}, **kwargs)
+        client._create_client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return client
+
+    async def test_get_sends_authenticated_request(self):
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json={'puuid': 'p1'})
+
+        client = self.make_client(handler, retries=0)
+        response = await client.get('https://europe.api.riotgames.com/riot/account/v1/accounts/by-puuid/p1',
+                                    params={'a': 1})
+        await client.aclose()
+        self.assertEqual(response.json(), {'puuid': 'p1'})
+        self.assertEqual(requests_seen[0].headers['X-Riot-Token'], 'key')
+        self.assertEqual(requests_seen[0].url.params['a'], '1')
+        self.assertEqual(client.request_count, 1)
+
+    async def test_server_errors_are_retried(self):
+        statuses = iter([503, 200])
+        client = self.make_client(lambda request: httpx.Response(next(statuses), json={}), retries=1)
+        with mock.patch('stats.utils.asyncio.sleep', new=mock.AsyncMock()):
+            response = await client.get('https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1')
+        await client.aclose()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.request_count, 2)
+
+    async def test_helpers_route_through_async_client(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'metadata': {'matchId': 'EUW1_1'}}
+        with mock.patch.object(async_riot_client, 'get', new=mock.AsyncMock(return_value=response)) as client_get:
+            data = await aget_match_by_id('EUW1_1', 'europe')
+        self.assertEqual(data['metadata']['matchId'], 'EUW1_1')
+        client_get.assert_awaited_once_with('https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1',
+                                            method='match-v5.match')
+
+
+class RateLimiterTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'ratelimit.sqlite3'
+        self.limiter = RateLimiter(self.path, default_app_limits='2:10')
+
+    def test_parse_rate_limits(self):
+        self.assertEqual(parse_rate_limits("20:1,100:120"), [(20, 1), (100, 120)])
+        self.assertEqual(parse_rate_limits(None), [])
+
+    def test_default_bucket_paces_requests(self):
+        host = 'europe.api.riotgames.com'
+        self.assertEqual(self.limiter.try_acquire(host), 0)
+        self.assertEqual(self.limiter.try_acquire(host), 0)
+        # trzecie zapytanie musi poczekać na uzupełnienie tokena (10s / 2 tokeny)
+        self.assertGreater(self.limiter.try_acquire(host), 4)
+        self.assertFalse(self.limiter.acquire(host, max_wait=0))
+
+    async def test_async_acquire_respects_budget(self):
+        host = 'europe.api.riotgames.com'
+        self.assertTrue(await self.limiter.aacquire(host, max_wait=0))
+        self.assertTrue(await self.limiter.aacquire(host, max_wait=0))
+        self.assertFalse(await self.limiter.aacquire(host, max_wait=0))
+
+    def test_buckets_are_shared_between_instances(self):
+        host = 'europe.api.riotgames.com'
+        other_process = RateLimiter(self.path, default_app_limits='2:10')
+        self.limiter.try_acquire(host)
+        other_process.try_acquire(host)
+        self.assertGreater(self.limiter.try_acquire(host), 0)
+
+    def test_headers_set_method_limits_and_counts(self):
+        host = 'europe.api.riotgames.com'
+        self.limiter.update_from_headers(host, 'match-v5.match', {
+            'X-App-Rate-Limit': '100:1', 'X-App-Rate-Limit-Count': '1:1',
+            'X-Method-Rate-Limit': '1:10', 'X-Method-Rate-Limit-Count': '1:10',
+        })
+        self.assertGreater(self.limiter.try_acquire(host, 'match-v5.match'), 0)
+        self.assertEqual(self.limiter.try_acquire(host, 'match-v5.match-ids'), 0)
+
+    def test_retry_after_blocks_scope(self):
+        host = 'europe.api.riotgames.com'
+        self.limiter.block(host, 'match-v5.match', 5, 'method')
+        self.assertGreater(self.limiter.try_acquire(host, 'match-v5.match'), 4)
+        self.assertEqual(self.limiter.try_acquire(host, 'league-v4.by-summoner'), 0)
+
+    def test_client_raises_when_budget_exhausted(self):
+        client = RiotClient(timeout=1, retries=0, limiter=self.limiter)
+        session = client.session_for('europe.api.riotgames.com')
+        self.limiter.block('europe.api.riotgames.com', None, 3600)
+        with mock.patch.object(session, 'get') as session_get:
+            with self.assertRaises(RateLimitException):
+                client.get('https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1', method='match-v5.match')
+        session_get.assert_not_called()
+
+
+class RiotPriorityTest(TestCase):
+    host = 'europe.api.riotgames.com'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.limiter = RateLimiter(Path(tmp.name) / 'ratelimit.sqlite3', default_app_limits='10:100',
+                                   reserves={INTERACTIVE: 0, USER: 0.1, BACKGROUND: 0.5})
+
+    def test_background_leaves_reserve_for_interactive(self):
+        # Tło zużywa tylko połowę kubełka...
+        acquired = 0
+        while self.limiter.try_acquire(self.host, priority=BACKGROUND) == 0:
+            acquired += 1
+        self.assertEqual(acquired, 5)
+        # ...zlecenia użytkowników kolejne cztery, a strona wciąż dostaje ostatni token od razu
+        for _ in range(4):
+            self.assertEqual(self.limiter.try_acquire(self.host, priority=USER), 0)
+        self.assertGreater(self.limiter.try_acquire(self.host, priority=USER), 0)
+        self.assertEqual(self.limiter.try_acquire(self.host, priority=INTERACTIVE), 0)
+
+    def test_client_uses_priority_from_context(self):
+        client = RiotClient(timeout=1, retries=0, limiter=self.limiter)
+        session = client.session_for(self.host)
+        response = mock.Mock(status_code=200, headers={})
+        with mock.patch.object(session, 'get', return_value=response), \
+             mock.patch.object(self.limiter, 'acquire', wraps=self.limiter.acquire) as acquire:
+            client.get(f'https://{self.host}/lol/match/v5/matches/EUW1_1', method='match-v5.match')
+            with riot_priority(BACKGROUND):
+                client.get(f'https://{self.host}/lol/match/v5/matches/EUW1_2', method='match-v5.match')
+        self.assertEqual([call.kwargs['priority'] for call in acquire.call_args_list], [INTERACTIVE, BACKGROUND])
+
+    def test_stats_report_waiting_and_wait_times(self):
+        for _ in range(5):
+            self.limiter.acquire(self.host, priority=BACKGROUND)
+        seen_waiting = []
+
+        def sleep(seconds):
+            seen_waiting.append(self.limiter.priority_stats()[BACKGROUND]['waiting'])
+
+        with mock.patch('stats.ratelimit.time.sleep', side_effect=sleep):
+            self.assertFalse(self.limiter.acquire(self.host, max_wait=20, priority=BACKGROUND))
+
+        self.assertEqual(seen_waiting[0], 1)
+        stats = self.limiter.priority_stats()
+        self.assertEqual(stats[BACKGROUND]['waiting'], 0)
+        self.assertEqual(stats[BACKGROUND]['acquired'], 5)
+        self.assertEqual((stats[BACKGROUND]['delayed'], stats[BACKGROUND]['rejected']), (1, 1))
+        self.assertEqual(stats[INTERACTIVE]['acquired'], 0)
+
+        out = StringIO()
+        with mock.patch('stats.management.commands.riot_queue_status.RateLimiter', return_value=self.limiter):
+            call_command('riot_queue_status', stdout=out)
+        self.assertIn('background', out.getvalue())
+
+    def test_user_jobs_are_claimed_before_background_refreshes(self):
+        first = Summoner.objects.create(puuid="p1", gameName="A", tagLine="1", region="europe", server="euw1")
+        second = Summoner.objects.create(puuid="p2", gameName="B", tagLine="1", region="europe", server="euw1")
+        IngestionJob.objects.create(summoner=first, kind=IngestionJob.KIND_REFRESH)
+        update = IngestionJob.objects.create(summoner=second, kind=IngestionJob.KIND_UPDATE)
+        self.assertEqual(claim_next_job(), update)
+
+    def test_user_request_upgrades_pending_background_refresh(self):
+        summ = Summoner.objects.create(puuid="p1", gameName="A", tagLine="1", region="europe", server="euw1")
+        refresh = enqueue_ingestion(summ, IngestionJob.KIND_REFRESH)
+        job = enqueue_ingestion(summ, IngestionJob.KIND_UPDATE)
+        self.assertEqual(job, refresh)
+        self.assertEqual(IngestionJob.objects.get(pk=refresh.pk).kind, IngestionJob.KIND_UPDATE)
+
+        # Zlecenie już wykonywane nie zmienia rodzaju
+        other = Summoner.objects.create(puuid="p2", gameName="B", tagLine="1", region="europe", server="euw1")
+        running = enqueue_ingestion(other, IngestionJob.KIND_REFRESH)
+        claim_job(running)
+        self.assertEqual(enqueue_ingestion(other, IngestionJob.KIND_UPDATE).kind, IngestionJob.KIND_REFRESH)
+        self.assertEqual(IngestionJob.objects.get(pk=running.pk).kind, IngestionJob.KIND_REFRESH)
+
+
+class ConcurrentMatchFetchTest(TestCase):
+    def setUp(self):
+        Queue.objects.create(queue_id=420, description="5v5 Ranked Solo games")
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-concurrent", gameName="Fast", tagLine="0001", region="europe", server="euw1"
+        )
+
+    @override_settings(RIOT_FETCH_WORKERS=3)
+    def test_match_details_are_fetched_concurrently(self):
+        """
+        Trzy pobrania spotykają się na barierze – przy pobieraniu po kolei bariera by nie puściła.
+        """
+        match_ids = ["EUW1_1", "EUW1_2", "EUW1_3"]
+        barrier = threading.Barrier(len(match_ids), timeout=5)
+
+        def fetch(match_id, region):
+            barrier.wait()
+            return make_match_payload(match_id, self.summ.puuid)
+
+        with mock.patch('stats.services.get_match_ids_by_puuid', side_effect=[match_ids, []]), \
+             mock.patch('stats.services.get_match_by_id', side_effect=fetch):
+            save_recent_matches_for_summoner(self.summ)
+
+        self.assertEqual(Participant.objects.filter(summoner=self.summ).count(), 3)
+        self.assertEqual(set(Match.objects.values_list('match_id', flat=True)), set(match_ids))
 
-        # 1) Sprawdźmy, że w bazie jest 1 Participant i 1 Match
+    def test_missing_match_does_not_drop_the_others(self):
+        def fetch(match_id, region):
+            if match_id == "EUW1_2":
+                raise Http404("Nie ma takiego meczu na serwerze Riot API.")
+            return make_match_payload(match_id, self.summ.puuid)
+
+        with mock.patch('stats.services.get_match_ids_by_puuid', side_effect=[["EUW1_1", "EUW1_2", "EUW1_3"], []]), \
+             mock.patch('stats.services.get_match_by_id', side_effect=fetch):
+            save_recent_matches_for_summoner(self.summ)
+
+        self.assertEqual(set(Match.objects.values_list('match_id', flat=True)), {"EUW1_1", "EUW1_3"})
+
+    async def test_async_missing_match_does_not_drop_the_others(self):
+        async def fetch(match_id, region):
+            if match_id == "EUW1_2":
+                raise Http404("Nie ma takiego meczu na serwerze Riot API.")
+            return make_match_payload(match_id, self.summ.puuid)
+
+        with mock.patch('stats.services.aget_match_ids_by_puuid',
+                        new=mock.AsyncMock(side_effect=[["EUW1_1", "EUW1_2", "EUW1_3"], []])), \
+             mock.patch('stats.services.aget_match_by_id', new=fetch):
+            await asave_recent_matches_for_summoner(self.summ)
+
+        self.assertEqual(await Participant.objects.filter(summoner=self.summ).acount(), 2)
+
+    @override_settings(RIOT_FETCH_WORKERS=2)
+    async def test_async_fetch_is_bounded_by_workers(self):
+        """
+        Wersja asynchroniczna pobiera mecze naraz, ale najwyżej RIOT_FETCH_WORKERS jednocześnie.
+        """
+        match_ids = ["EUW1_1", "EUW1_2", "EUW1_3", "EUW1_4"]
+        in_flight = []
+        peak = []
+
+        async def fetch(match_id, region):
+            in_flight.append(match_id)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(match_id)
+            return make_match_payload(match_id, self.summ.puuid)
+
+        with mock.patch('stats.services.aget_match_ids_by_puuid', new=mock.AsyncMock(side_effect=[match_ids, []])), \
+             mock.patch('stats.services.aget_match_by_id', new=fetch):
+            await asave_recent_matches_for_summoner(self.summ)
+
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(await Participant.objects.filter(summoner=self.summ).acount(), 4)
+
+
+class IngestMatchPayloadsTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-ingest", gameName="Bulk", tagLine="0001", region="europe", server="euw1"
+        )
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small = [make_match_payload(f"EUW1_{i}", self.summ.puuid) for i in range(2)]
+        large = [make_match_payload(f"EUW1_{i}", self.summ.puuid) for i in range(10, 14)]
+        ingest_match_payloads([make_match_payload("EUW1_0", self.summ.puuid, queue_id=420)])
+
+        with CaptureQueriesContext(connection) as small_queries:
+            ingest_match_payloads(small)
+        with CaptureQueriesContext(connection) as large_queries:
+            ingest_match_payloads(large)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertEqual(Participant.objects.filter(summoner=self.summ).count(), 6)
+
+    def test_reingest_updates_match_without_duplicates(self):
+        payload = make_match_payload("EUW1_1", self.summ.puuid, queue_id=450)
+        ingest_match_payloads([payload])
+        payload['info']['gameDuration'] = 1234
+        ingest_match_payloads([payload])
+
+        match = Match.objects.get(match_id="EUW1_1")
+        self.assertEqual(match.game_duration, 1234)
+        self.assertEqual(match.queue.queue_id, 450)
+        self.assertEqual(match.team0_kills, 10)
         self.assertEqual(Participant.objects.filter(summoner=self.summ).count(), 1)
+        self.assertEqual(Participant.objects.filter(match=match).count(), 10)
+        self.assertEqual(Participant.objects.get(summoner=self.summ).kill_participation, 0.2)
+
+    def test_shared_match_is_reused_for_second_summoner(self):
+        """
+        Mecz zapisany przy jednym Summonerze zawiera wiersze wszystkich graczy –
+        drugi śledzony gracz z tego meczu dostaje swój wiersz bez zapytania o szczegóły meczu.
+        """
+        ingest_match_payloads([make_match_payload("EUW1_1", self.summ.puuid)])
+        friend = Summoner.objects.create(
+            puuid="EUW1_1-player-1", gameName="Friend", tagLine="0002", region="europe", server="euw1"
+        )
+        with mock.patch('stats.services.get_match_ids_by_puuid', return_value=["EUW1_1"]), \
+             mock.patch('stats.services.get_match_by_id') as get_match:
+            save_recent_matches_for_summoner(friend)
+
+        get_match.assert_not_called()
+        self.assertEqual(Participant.objects.get(summoner=friend).match.match_id, "EUW1_1")
         self.assertEqual(Match.objects.count(), 1)
 
-        # 2) Zróbmy POST: to „usunie” je w widoku
+    def test_unknown_champion_is_skipped(self):
+        with self.assertLogs('stats.services', 'WARNING') as logs:
+            ingest_match_payloads([make_match_payload("EUW1_1", self.summ.puuid, champion_key=999)])
+        self.assertIn("[999]", logs.output[0])
+        self.assertTrue(Match.objects.filter(match_id="EUW1_1").exists())
+        self.assertFalse(Participant.objects.filter(summoner=self.summ).exists())
+
+
+class IngestionJobTest(TestCase):
+    def setUp(self):
+        self.summ = Summoner.objects.create(
+            puuid="puuid-job", gameName="Queued", tagLine="0001", region="europe", server="euw1"
+        )
+
+    def test_enqueue_joins_active_job(self):
+        job = enqueue_ingestion(self.summ, IngestionJob.KIND_INITIAL)
+        self.assertEqual(enqueue_ingestion(self.summ), job)
+        self.assertEqual(IngestionJob.objects.count(), 1)
+
+    def test_racing_enqueue_joins_job_created_by_other_process(self):
+        other = IngestionJob.objects.create(summoner=self.summ, kind=IngestionJob.KIND_UPDATE)
+        real_active_job_for = active_job_for
+        # Pierwsze sprawdzenie "nie widzi" zlecenia innego procesu – ratuje nas unikalny indeks
+        with mock.patch('stats.jobs.active_job_for', side_effect=[None, real_active_job_for(self.summ)]):
+            self.assertEqual(enqueue_ingestion(self.summ), other)
+        self.assertEqual(IngestionJob.objects.count(), 1)
+
+    @override_settings(INGESTION_REFRESH_COOLDOWN=120)
+    def test_update_within_cooldown_is_throttled(self):
+        self.summ.last_refreshed = timezone.now() - timedelta(seconds=30)
+        self.summ.save()
+        with self.assertRaises(RefreshCooldown) as cm:
+            enqueue_ingestion(self.summ)
+        self.assertEqual(cm.exception.retry_after, 90)
+        self.assertFalse(IngestionJob.objects.exists())
+
+        url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
         response = self.client.post(f"{url}?region={self.summ.region}", data={'update': '1'}, follow=True)
+        self.assertContains(response, "odświeżone przed chwilą")
+        # Strona profilu bez żadnej historii sama zleca pierwsze pobranie – nie ono jest tu sprawdzane
+        IngestionJob.objects.filter(kind=IngestionJob.KIND_INITIAL).delete()
 
-        # Po POST wywołany jest kod widoku:
-        # - usunięte zostaną wszystkie Participant i pośrednio Match
-        self.assertEqual(Participant.objects.filter(summoner=self.summ).count(), 0)
-        self.assertEqual(Match.objects.count(), 1)
+        self.summ.last_refreshed = timezone.now() - timedelta(seconds=121)
+        self.summ.save()
+        self.assertEqual(enqueue_ingestion(self.summ).kind, IngestionJob.KIND_UPDATE)
 
-        # 3) Teraz symulujemy ponowne wczytanie historii:
-        #    Tworzymy nowy Match i Participant ręcznie (jakby to zrobił 'save_recent_matches_for_summoner').
-        new_match = Match.objects.create(
-            match_id="m2",
-            queue=self.q,
-            game_mode="CLASSIC",
-            game_name="5v5 Ranked Solo games",
-            game_duration=1300,
-            timestamp="2025-05-21T11:00:00Z"
+    def test_finished_job_starts_cooldown(self):
+        enqueue_ingestion(self.summ)
+        with mock.patch('stats.jobs.save_recent_matches_for_summoner'), \
+             mock.patch('stats.jobs.recalculate_summoner_champions'):
+            call_command('run_ingestion_worker', '--once', stdout=StringIO())
+        self.summ.refresh_from_db()
+        self.assertIsNotNone(self.summ.last_refreshed)
+        self.assertGreater(refresh_cooldown_remaining(self.summ), 0)
+
+    def test_worker_requeues_jobs_abandoned_while_running(self):
+        """
+        Zlecenie porzucone przez inny worker już po starcie tego wraca do kolejki i zostaje wykonane.
+        """
+        other = Summoner.objects.create(puuid="puuid-other", gameName="Other", tagLine="0002",
+                                        region="europe", server="euw1")
+        enqueue_ingestion(self.summ)
+        abandoned = []
+
+        def save_matches(summ, **kwargs):
+            if not abandoned:
+                abandoned.append(IngestionJob.objects.create(
+                    summoner=other, kind=IngestionJob.KIND_UPDATE, status=IngestionJob.STATUS_RUNNING,
+                    started_at=timezone.now() - timedelta(seconds=601),
+                ))
+
+        with mock.patch('stats.jobs.save_recent_matches_for_summoner', side_effect=save_matches), \
+             mock.patch('stats.jobs.recalculate_summoner_champions'):
+            call_command('run_ingestion_worker', '--once', stdout=StringIO())
+
+        abandoned[0].refresh_from_db()
+        self.assertEqual(abandoned[0].status, IngestionJob.STATUS_DONE)
+        self.assertIsNone(active_job_for(other))
+
+    def test_worker_runs_jobs_concurrently(self):
+        other = Summoner.objects.create(puuid="puuid-other", gameName="Other", tagLine="0002",
+                                        region="europe", server="euw1")
+        enqueue_ingestion(self.summ)
+        enqueue_ingestion(other)
+        with mock.patch('stats.jobs.asave_recent_matches_for_summoner', new=mock.AsyncMock()) as save_matches, \
+             mock.patch('stats.jobs.recalculate_summoner_champions'):
+            call_command('run_ingestion_worker', '--once', '--concurrency', '2', stdout=StringIO())
+        self.assertEqual(save_matches.await_count, 2)
+        self.assertEqual(IngestionJob.objects.filter(status=IngestionJob.STATUS_DONE).count(), 2)
+
+    def test_claim_marks_job_running_once(self):
+        job = enqueue_ingestion(self.summ)
+        claimed = claim_next_job()
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.status, IngestionJob.STATUS_RUNNING)
+        self.assertIsNone(claim_next_job())
+
+    def test_new_summoner_view_renders_without_waiting_for_riot(self):
+        """
+        Profil Summonera bez historii renderuje się od razu i zleca pobranie danych w tle.
+        """
+        url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
+        with mock.patch('stats.services.get_match_ids_by_puuid') as get_ids:
+            response = self.client.get(f"{url}?region={self.summ.region}")
+        get_ids.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['job'].kind, IngestionJob.KIND_INITIAL)
+
+    def test_failed_job_is_reported_by_status_endpoint(self):
+        job = enqueue_ingestion(self.summ)
+        with mock.patch('stats.jobs.save_recent_matches_for_summoner',
+                        side_effect=RateLimitException("Przekroczono limit")):
+            call_command('run_ingestion_worker', '--once', stdout=StringIO(), stderr=StringIO())
+
+        response = self.client.get(reverse('job_status', args=[self.summ.gameName, self.summ.tagLine, job.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], IngestionJob.STATUS_FAILED)
+        self.assertEqual(response.json()['error'], "Przekroczono limit")
+
+    def test_status_endpoint_does_not_expose_other_summoners_jobs(self):
+        other = Summoner.objects.create(
+            puuid="puuid-other", gameName="Other", tagLine="0002", region="europe", server="euw1"
         )
-        Participant.objects.create(
-            summoner=self.summ, match=new_match, champion=self.champ,
-            team_id=200, lane="MID", kills=2, deaths=2, assists=6,
-            win=False, farm=110, damage_dealt=6000, wards=7,
-            double_kills=0, triple_kills=0, quadra_kills=0, penta_kills=0,
-            kill_participation=0.4, gold_earned=9500
+        job = enqueue_ingestion(other)
+
+        response = self.client.get(reverse('job_status', args=[self.summ.gameName, self.summ.tagLine, job.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('job_status', args=[other.gameName.lower(), other.tagLine, job.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PROFILE_FRESHNESS=600, INGESTION_REFRESH_COOLDOWN=120)
+class StaleWhileRevalidateTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-swr", gameName="Stale", tagLine="0001", region="europe", server="euw1",
+            last_refreshed=timezone.now() - timedelta(hours=2),
         )
+        ingest_match_payloads([make_match_payload("EUW1_1", self.summ.puuid)])
+        self.url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
+
+    def get(self):
+        # Strona z zapisanymi danymi nie może czekać na Riot API
+        with mock.patch.object(riot_client, 'get', side_effect=AssertionError("zapytanie do Riot API")):
+            return self.client.get(self.url, {'region': self.summ.region})
+
+    def test_stale_profile_is_rendered_and_refreshed_in_background(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "EUW1_1")
+        self.assertContains(response, "Dane sprzed 2")
+        self.assertContains(response, "Odświeżam dane w tle")
+        self.assertEqual(response.context['job'].kind, IngestionJob.KIND_REFRESH)
+
+        # Kolejne wejście dołącza do tego samego zlecenia
+        self.get()
+        self.assertEqual(IngestionJob.objects.count(), 1)
+
+    def test_fresh_profile_is_not_refreshed(self):
+        Summoner.objects.filter(pk=self.summ.pk).update(last_refreshed=timezone.now() - timedelta(minutes=5))
+        self.get()
+        self.assertFalse(IngestionJob.objects.exists())
+
+    def test_profile_without_refresh_time_is_refreshed(self):
+        # Summonerzy zapisani przed wprowadzeniem zleceń nie mają last_refreshed, ale mają już mecze
+        Summoner.objects.filter(pk=self.summ.pk).update(last_refreshed=None)
+        response = self.get()
+        self.assertContains(response, "EUW1_1")
+        self.assertEqual(response.context['job'].kind, IngestionJob.KIND_REFRESH)
+
+    def test_recent_failure_is_not_retried_on_every_view(self):
+        IngestionJob.objects.create(summoner=self.summ, kind=IngestionJob.KIND_REFRESH,
+                                    status=IngestionJob.STATUS_FAILED, finished_at=timezone.now())
+        self.get()
+        self.assertFalse(IngestionJob.objects.filter(status__in=IngestionJob.ACTIVE_STATUSES).exists())
 
-        # 4) Po ręcznym „odtworzeniu” historii sprawdźmy, że przeglądarka w GET zwraca ponownie 1 rekord
+    def test_refresh_job_updates_rank_and_new_matches(self):
+        enqueue_ingestion(self.summ, IngestionJob.KIND_REFRESH)
+        with mock.patch('stats.jobs.save_summoner_rank_info') as rank, \
+             mock.patch('stats.jobs.save_recent_matches_for_summoner') as matches:
+            call_command('run_ingestion_worker', '--once', stdout=StringIO())
+        rank.assert_called_once()
+        matches.assert_called_once_with(mock.ANY, incremental=True)
+        self.assertEqual(IngestionJob.objects.get().status, IngestionJob.STATUS_DONE)
+
+
+@override_settings(PROFILE_FRESHNESS=600, VIEW_SCORE_HALF_LIFE=3600, VIEW_TRACK_INTERVAL=60,
+                   RIOT_RATE_LIMIT_DEFAULT='20:1,100:100', REFRESH_SCHEDULER_SHARE=0.5)
+class RefreshSchedulerTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.stale = self.now - timedelta(hours=1)
+
+    def make_summoner(self, name, score, last_viewed=None, last_refreshed=None):
+        return Summoner.objects.create(
+            puuid=f"puuid-{name}", gameName=name, tagLine="0001", region="europe", server="euw1",
+            view_score=score, last_viewed=last_viewed or self.now, last_refreshed=last_refreshed or self.stale,
+        )
+
+    def test_views_are_throttled_and_decay(self):
+        summ = self.make_summoner("Viewed", 0, last_refreshed=self.now)
+        summ.last_viewed = None
+        record_view(summ)
+        record_view(summ)  # w ciągu VIEW_TRACK_INTERVAL – nie liczy się drugi raz
+        summ.refresh_from_db()
+        self.assertEqual(summ.view_score, 1)
+
+        self.assertAlmostEqual(decayed_score(4, self.now - timedelta(hours=2), self.now), 1)
+
+    def test_candidates_are_stale_popular_and_idle(self):
+        popular = self.make_summoner("Popular", 10)
+        faded = self.make_summoner("Faded", 40, last_viewed=self.now - timedelta(hours=3))  # ~5 na dziś
+        self.make_summoner("Fresh", 100, last_refreshed=self.now)
+        busy = self.make_summoner("Busy", 100)
+        IngestionJob.objects.create(summoner=busy, kind=IngestionJob.KIND_UPDATE)
+
+        self.assertEqual(refresh_candidates(10), [popular, faded])
+        self.assertEqual(refresh_candidates(1), [popular])
+
+    def test_viewed_summoner_without_refresh_time_is_candidate(self):
+        popular = self.make_summoner("Popular", 10)
+        legacy = self.make_summoner("Legacy", 10)
+        Summoner.objects.filter(pk=legacy.pk).update(last_refreshed=None)
+        self.assertEqual(refresh_candidates(10), [legacy, popular])
+
+    def test_budget_follows_limits_learned_from_headers(self):
+        host = 'europe.api.riotgames.com'
+        self.assertAlmostEqual(scheduler_pacer().rate(host), 0.5)
+        self.assertAlmostEqual(scheduler_pacer(0.1).rate(host), 0.1)
+        riot_client.limiter.update_from_headers(host, None, {'X-App-Rate-Limit': '50:1,1000:100'})
+        self.assertAlmostEqual(scheduler_pacer().rate(host), 5)
+
+    def test_pacer_spaces_individual_calls(self):
+        pacer = scheduler_pacer()
+        with mock.patch('stats.ratelimit.time.monotonic', return_value=100.0):
+            waits = [pacer.reserve('europe.api.riotgames.com') for _ in range(3)]
+        self.assertEqual(waits, [0, 2, 4])
+
+    def test_command_refreshes_most_popular_first_and_paces_requests(self):
+        first = self.make_summoner("First", 10)
+        second = self.make_summoner("Second", 5)
+        refreshed = []
+
+        def fake_refresh(summ, incremental):
+            refreshed.append(summ.gameName)
+            # Każde zapytanie (także z wątków puli, które kopiują kontekst) czeka na swój termin
+            for _ in range(3):
+                current_pacer().pace('europe.api.riotgames.com')
+
+        with mock.patch('stats.jobs.save_summoner_rank_info'), \
+             mock.patch('stats.jobs.save_recent_matches_for_summoner', side_effect=fake_refresh), \
+             mock.patch('stats.ratelimit.time.sleep') as sleep:
+            call_command('refresh_scheduler', '--once', stdout=StringIO())
+
+        self.assertEqual(refreshed, ["First", "Second"])
+        waits = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(waits), 5)
+        for expected, wait in zip(range(2, 12, 2), waits):
+            self.assertAlmostEqual(wait, expected, delta=0.5)
+        for summ in (first, second):
+            summ.refresh_from_db()
+            self.assertGreater(summ.last_refreshed, self.now)
+        self.assertEqual(refresh_candidates(10), [])
+
+
+class BackfillSummonersCommandTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-backfill", gameName="Seed", tagLine="0001", region="europe", server="euw1"
+        )
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.input = Path(tmp.name) / 'summoners.txt'
+        self.input.write_text("Seed#0001\n")
+        self.history = [f"EUW1_{i}" for i in range(5)]
+
+    def run_backfill(self, *args):
+        def match_ids(puuid, region, count, start):
+            return self.history[start:start + count]
+
+        with mock.patch('stats.management.commands.backfill_summoners.get_match_ids_by_puuid',
+                        side_effect=match_ids) as get_ids, \
+             mock.patch('stats.management.commands.backfill_summoners.get_match_by_id',
+                        side_effect=lambda match_id, region: make_match_payload(match_id, self.summ.puuid)):
+            out = StringIO()
+            call_command('backfill_summoners', str(self.input), '--page-size', '2', '--workers', '2',
+                         *args, stdout=out, stderr=StringIO())
+        return get_ids, out.getvalue()
+
+    def test_backfill_ingests_history_and_reports_throughput(self):
+        _, output = self.run_backfill()
+        self.assertEqual(Participant.objects.filter(summoner=self.summ).count(), 5)
+        checkpoint = BackfillCheckpoint.objects.get(summoner=self.summ)
+        self.assertTrue(checkpoint.finished)
+        self.assertEqual(checkpoint.matches_ingested, 5)
+        self.assertIn("meczów/s", output)
+
+    def test_backfill_resumes_from_checkpoint(self):
+        BackfillCheckpoint.objects.create(summoner=self.summ, next_start=4)
+        get_ids, _ = self.run_backfill()
+        self.assertEqual(get_ids.call_args_list[0].kwargs['start'], 4)
         self.assertEqual(Participant.objects.filter(summoner=self.summ).count(), 1)
 
-        # 5) W odpowiedzi response (follow=True) powinniśmy dostać status 200 i kontekst z summonerem
+        get_ids, output = self.run_backfill()
+        get_ids.assert_not_called()
+        self.assertIn("Brak Summonerów", output)
+
+
+class MatchArchiveTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-archive", gameName="Archivist", tagLine="0001", region="europe", server="euw1"
+        )
+
+    def test_ingest_archives_compressed_payload(self):
+        payload = make_match_payload("EUW1_1", self.summ.puuid)
+        ingest_match_payloads([payload])
+        archived = MatchArchive.objects.get(match_id="EUW1_1")
+        self.assertEqual(archived.data, payload)
+        self.assertLess(len(archived.payload), len(json.dumps(payload)))
+
+    def test_rederive_fills_columns_without_network(self):
+        ingest_match_payloads([make_match_payload(f"EUW1_{i}", self.summ.puuid) for i in range(3)])
+        # symulacja nowej, pustej kolumny
+        Participant.objects.update(gold_earned=None)
+        Match.objects.update(game_duration=None)
+
+        with mock.patch('stats.utils.riot_client.get', side_effect=AssertionError("brak sieci")):
+            call_command('rederive', '--batch-size', '2', stdout=StringIO())
+
+        self.assertFalse(Participant.objects.filter(gold_earned__isnull=True).exists())
+        self.assertEqual(Participant.objects.count(), 30)
+        self.assertEqual(set(Match.objects.values_list('game_duration', flat=True)), {1800})
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = ResponseCache(Path(tmp.name) / 'cache.sqlite3',
+                                   ttls={'match-v5.match': 3600}, negative_ttl=60, max_entries=2)
+        self.client = RiotClient(timeout=1, retries=0, cache=self.cache)
+        self.session = self.client.session_for('europe.api.riotgames.com')
+
+    def response(self, status_code, body=b'{}'):
+        return mock.Mock(status_code=status_code, content=body, headers={})
+
+    def test_repeated_call_is_served_from_cache(self):
+        url = 'https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1'
+        with mock.patch.object(self.session, 'get', return_value=self.response(200, b'{"id": 1}')) as session_get:
+            self.client.get(url, method='match-v5.match')
+            cached = self.client.get(url, method='match-v5.match')
+        self.assertEqual(session_get.call_count, 1)
+        self.assertEqual(cached.json(), {'id': 1})
+
+    def test_not_found_is_cached_and_uncached_methods_are_not(self):
+        url = 'https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id/Typo/0000'
+        with mock.patch.object(self.session, 'get', return_value=self.response(404)) as session_get:
+            self.client.get(url, method='account-v1.by-riot-id')
+            self.assertEqual(self.client.get(url, method='account-v1.by-riot-id').status_code, 404)
+        self.assertEqual(session_get.call_count, 1)
+
+        league_url = 'https://euw1.api.riotgames.com/lol/league/v4/entries/by-summoner/abc'
+        self.cache.set(league_url, None, 'league-v4.by-summoner', self.response(200))
+        self.assertIsNone(self.cache.get(league_url))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for i in range(3):
+            self.cache.set(f'https://host/{i}', None, 'match-v5.match', self.response(200))
+            self.cache.get('https://host/0')
+        self.cache.evict()
+        self.assertIsNotNone(self.cache.get('https://host/0'))
+        self.assertIsNone(self.cache.get('https://host/1'))
+        self.assertIsNotNone(self.cache.get('https://host/2'))
+
+
+class SummonerQueueStatsTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-rollup", gameName="Rollup", tagLine="0001", region="europe", server="euw1"
+        )
+
+    def stats(self, summ=None, queue_id=420):
+        return SummonerQueueStats.objects.get(summoner=summ or self.summ, queue__queue_id=queue_id)
+
+    def test_ingest_updates_running_sums(self):
+        ingest_match_payloads([
+            make_match_payload("EUW1_1", self.summ.puuid, win=True),
+            make_match_payload("EUW1_2", self.summ.puuid, win=False),
+            make_match_payload("EUW1_3", self.summ.puuid, queue_id=440),
+        ])
+        solo = self.stats()
+        self.assertEqual((solo.games, solo.wins, solo.kills, solo.deaths, solo.assists), (2, 1, 4, 2, 6))
+        self.assertEqual(solo.kda, 5.0)
+        self.assertEqual(solo.gold_per_min, 366)
+        self.assertEqual(solo.main_role, 'MIDDLE')
+        self.assertEqual(self.stats(queue_id=440).games, 1)
+
+    def test_reingest_replaces_contribution_instead_of_adding(self):
+        payload = make_match_payload("EUW1_1", self.summ.puuid)
+        ingest_match_payloads([payload])
+        payload['info']['participants'][0]['kills'] = 10
+        ingest_match_payloads([payload])
+        solo = self.stats()
+        self.assertEqual((solo.games, solo.kills), (1, 10))
+
+    def test_linking_new_summoner_adds_stored_rows(self):
+        ingest_match_payloads([make_match_payload("EUW1_1", self.summ.puuid)])
+        friend = Summoner.objects.create(
+            puuid="EUW1_1-player-1", gameName="Friend", tagLine="0002", region="europe", server="euw1"
+        )
+        link_summoner_participants(friend)
+        self.assertEqual(self.stats(friend).lane_top, 1)
+
+    def test_rebuild_matches_running_sums_for_every_queue(self):
+        ingest_match_payloads([
+            make_match_payload("EUW1_1", self.summ.puuid, queue_id=420),
+            make_match_payload("EUW1_2", self.summ.puuid, queue_id=450, win=False),
+            make_match_payload("EUW1_3", self.summ.puuid, queue_id=480),
+            make_match_payload("EUW1_4", self.summ.puuid, queue_id=480),
+        ])
+        incremental = {qs.queue.queue_id: [getattr(qs, f) for f in SummonerQueueStats.SUM_FIELDS]
+                       for qs in SummonerQueueStats.objects.filter(summoner=self.summ).select_related('queue')}
+        SummonerQueueStats.objects.filter(summoner=self.summ).update(games=0, kills=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            recalculate_summoner_advanced_stats(self.summ)
+        self.assertEqual(len(queries), 7)
+        # Grupowanie po zdenormalizowanej kolumnie Participant, nie po kolejce z Match
+        self.assertIn('SELECT "stats_participant"."queue_id" AS "queue_id"', queries[0]['sql'])
+        self.assertNotIn('"stats_match"."queue_id"', queries[0]['sql'])
+        rebuilt = {qs.queue.queue_id: [getattr(qs, f) for f in SummonerQueueStats.SUM_FIELDS]
+                   for qs in SummonerQueueStats.objects.filter(summoner=self.summ).select_related('queue')}
+        self.assertEqual(set(rebuilt), {420, 450, 480})
+        self.assertEqual(rebuilt, incremental)
+
+        # Sumy już zgodne – przebudowa tylko czyta i nie unieważnia cache stron
+        version = Summoner.objects.get(pk=self.summ.pk).data_version
+        with self.assertNumQueries(2):
+            recalculate_summoner_advanced_stats(self.summ)
+        self.assertEqual(Summoner.objects.get(pk=self.summ.pk).data_version, version)
+
+    def test_profile_view_does_not_write(self):
+        ingest_match_payloads([make_match_payload("EUW1_1", self.summ.puuid)])
+        Summoner.objects.filter(pk=self.summ.pk).update(last_refreshed=timezone.now())
+        url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"{url}?region={self.summ.region}")
+        self.assertEqual(response.context['queue_stats'][0].games, 1)
+        writes = [q['sql'] for q in queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        # Jedyny zapis to licznik wejść dla harmonogramu odświeżania – statystyki nie są przeliczane
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"view_score"', writes[0])
+
+
+class SummonerChampionStatsTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        Champion.objects.create(key=2, name="OtherChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-champs", gameName="Champs", tagLine="0001", region="europe", server="euw1"
+        )
+        ingest_match_payloads([
+            make_match_payload("EUW1_1", self.summ.puuid, champion_key=1, win=True),
+            make_match_payload("EUW1_2", self.summ.puuid, champion_key=1, win=False),
+            make_match_payload("EUW1_3", self.summ.puuid, champion_key=1, queue_id=440),
+            make_match_payload("EUW1_4", self.summ.puuid, champion_key=2),
+        ])
+
+    def test_grouped_totals_and_breakdown(self):
+        recalculate_summoner_champions(self.summ)
+        champ = SummonerChampion.objects.get(summoner=self.summ, champion__key=1)
+        self.assertEqual((champ.matches_num, champ.winratio, champ.kda),
+                         (3, Decimal('66.67'), Decimal('5.00')))
+        breakdown = {(b.queue.queue_id, b.lane): b.matches_num
+                     for b in self.summ.champion_breakdown.filter(champion__key=1).select_related('queue')}
+        self.assertEqual(breakdown, {(420, 'MIDDLE'): 2, (440, 'MIDDLE'): 1})
+
+    def test_recalculation_upserts_and_drops_stale_rows(self):
+        recalculate_summoner_champions(self.summ)
+        first = SummonerChampion.objects.get(summoner=self.summ, champion__key=1).pk
+        Participant.objects.filter(summoner=self.summ, champion__key=2).delete()
+        recalculate_summoner_champions(self.summ)
+
+        self.assertEqual(SummonerChampion.objects.get(summoner=self.summ, champion__key=1).pk, first)
+        self.assertFalse(SummonerChampion.objects.filter(summoner=self.summ, champion__key=2).exists())
+        self.assertFalse(self.summ.champion_breakdown.filter(champion__key=2).exists())
+
+
+class MatchHistoryPaginationTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-history", gameName="History", tagLine="0001", region="europe", server="euw1"
+        )
+        # 45 meczów, część z identycznym czasem – kursor musi rozstrzygać remisy po id
+        ingest_match_payloads([
+            make_match_payload(f"EUW1_{i}", self.summ.puuid, timestamp_ms=1748600000000 + (i // 3) * 60000)
+            for i in range(45)
+        ])
+        self.url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
+
+    def get_page(self, **params):
+        return self.client.get(self.url, {'region': self.summ.region, **params}).context
+
+    def test_cursor_walks_whole_history_once(self):
+        seen = []
+        context = self.get_page()
+        self.assertEqual(context['estimated_total'], 45)
+        while True:
+            page = context['page_obj']
+            seen.extend(p.match.match_id for p in page.object_list)
+            if not page.has_next:
+                break
+            context = self.get_page(after=page.next_cursor)
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+
+        back = self.get_page(before=page.previous_cursor)['page_obj']
+        self.assertEqual([p.match.match_id for p in back.object_list], seen[20:40])
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        second = self.get_page(after=self.get_page()['page_obj'].next_cursor)['page_obj']
+        cache.clear()  # porównujemy koszt renderowania, nie trafienia w cache stron
+        with CaptureQueriesContext(connection) as first_queries:
+            self.get_page()
+        cache.clear()
+        with CaptureQueriesContext(connection) as deep_queries:
+            self.get_page(after=second.next_cursor)
+        self.assertEqual(len(deep_queries), len(first_queries))
+        history = [q['sql'] for q in deep_queries if 'FROM "stats_participant"' in q['sql'] and 'LIMIT 21' in q['sql']]
+        self.assertEqual(len(history), 1)
+        self.assertIn('stats_champion', history[0])
+        self.assertNotIn('OFFSET', history[0])
+        self.assertFalse([q for q in deep_queries if 'COUNT(*)' in q['sql']])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = self.get_page(after='not-a-cursor')['page_obj']
+        self.assertFalse(page.has_previous)
+        self.assertEqual(len(page.object_list), 20)
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-cache", gameName="Cached", tagLine="0001", region="europe", server="euw1",
+            last_refreshed=timezone.now(),
+        )
+        ingest_match_payloads([make_match_payload("EUW1_1", self.summ.puuid)])
+        self.url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
+
+    def get(self, **params):
+        return self.client.get(self.url, {'region': self.summ.region, **params})
+
+    def test_repeated_view_is_served_from_cache(self):
+        first = self.get()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.get()
+        # Tylko Summoner i aktywne zlecenie – profil i historia pochodzą z cache
+        self.assertEqual(len(queries), 2)
+        self.assertContains(second, "EUW1_1")
+        # Formularz aktualizacji (z tokenem CSRF) renderowany jest przy każdym wejściu, poza cache
+        self.assertContains(second, 'name="csrfmiddlewaretoken"')
+        self.assertNotEqual(second.content, first.content)
+
+    def test_ingest_bumps_version_and_invalidates_page(self):
+        self.get()
+        version = Summoner.objects.get(pk=self.summ.pk).data_version
+        ingest_match_payloads([make_match_payload("EUW1_2", self.summ.puuid, timestamp_ms=1748700000000)])
+        self.assertEqual(Summoner.objects.get(pk=self.summ.pk).data_version, version + 1)
+        self.assertContains(self.get(), "EUW1_2")
+
+    def test_filters_and_cursor_are_part_of_key(self):
+        self.get()
+        response = self.get(result='loss')
+        self.assertNotContains(response, "EUW1_1")
+        self.assertContains(response, "Brak meczów spełniających wybrane filtry.")
+
+    def test_rank_update_bumps_version(self):
+        with mock.patch('stats.services.get_summoner_info_by_puuid',
+                        return_value={'id': 'summ-id', 'profileIconId': 1, 'summonerLevel': 30}), \
+             mock.patch('stats.services.get_queues_info_by_summoner_id', return_value=[
+                 {'queueType': 'RANKED_SOLO_5x5', 'tier': 'GOLD', 'rank': 'II', 'wins': 10, 'losses': 5},
+             ]):
+            self.get()
+            save_summoner_rank_info(self.summ)
+        self.assertContains(self.get(), "(10W/5L)")
+
+    def test_unchanged_refresh_keeps_version(self):
+        """
+        Odświeżenie bez nowych meczów i bez zmiany rangi nie unieważnia strony w cache.
+        """
+        info = {'id': 'summ-id', 'profileIconId': 1, 'summonerLevel': 30}
+        leagues = [{'queueType': 'RANKED_SOLO_5x5', 'tier': 'GOLD', 'rank': 'II', 'wins': 10, 'losses': 5}]
+        with mock.patch('stats.services.get_summoner_info_by_puuid', return_value=info), \
+             mock.patch('stats.services.get_queues_info_by_summoner_id', return_value=leagues):
+            save_summoner_rank_info(self.summ)
+            recalculate_summoner_champions(self.summ)
+            version = Summoner.objects.get(pk=self.summ.pk).data_version
+
+            save_summoner_rank_info(self.summ)
+            recalculate_summoner_champions(self.summ)
+        self.assertEqual(Summoner.objects.get(pk=self.summ.pk).data_version, version)
+
+
+class SummonerApiTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-api", gameName="Api", tagLine="0001", region="europe", server="euw1",
+            rank_solo="GOLD II", solo_wins=10, solo_loses=5,
+        )
+        ingest_match_payloads([
+            make_match_payload(f"EUW1_{i}", self.summ.puuid, win=i % 2 == 0, timestamp_ms=1748600000000 + i * 60000)
+            for i in range(25)
+        ])
+        recalculate_summoner_champions(self.summ)
+        self.summ.refresh_from_db()
+
+    def url(self, name='api_summoner'):
+        return reverse(name, args=[self.summ.gameName, self.summ.tagLine])
+
+    def test_profile_and_stats(self):
+        profile = self.client.get(self.url()).json()
+        self.assertEqual(profile['rank_solo'], {'rank': "GOLD II", 'wins': 10, 'losses': 5})
+        self.assertIsNone(profile['rank_flex'])
+        self.assertNotIn('last_refreshed', profile)
+
+        queues = self.client.get(self.url('api_summoner_queues')).json()['results']
+        self.assertEqual([(q['queue_id'], q['games'], q['wins']) for q in queues], [(420, 25, 13)])
+
+        champions = self.client.get(self.url('api_summoner_champions')).json()['results']
+        self.assertEqual(champions[0]['champion']['key'], 1)
+        self.assertEqual(champions[0]['games'], 25)
+        self.assertEqual(champions[0]['breakdown'][0]['lane'], 'MIDDLE')
+
+    def test_matches_are_cursor_paginated_and_filtered(self):
+        page = self.client.get(self.url('api_summoner_matches')).json()
+        self.assertEqual(len(page['results']), HISTORY_PAGE_SIZE)
+        self.assertEqual(page['results'][0]['match_id'], "EUW1_24")
+        rest = self.client.get(self.url('api_summoner_matches'), {'after': page['next']}).json()
+        self.assertEqual([m['match_id'] for m in rest['results']], [f"EUW1_{i}" for i in range(4, -1, -1)])
+        self.assertIsNone(rest['next'])
+
+        losses = self.client.get(self.url('api_summoner_matches'), {'result': 'loss'}).json()
+        self.assertEqual(losses['filters'], {'result': 'loss'})
+        self.assertEqual(len(losses['results']), 12)
+
+    def test_etag_gives_304_until_data_changes(self):
+        first = self.client.get(self.url())
+        self.assertTrue(first['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url(), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(self.client.get(self.url(), HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        ingest_match_payloads([make_match_payload("EUW1_NEW", self.summ.puuid, timestamp_ms=1748700000000)])
+        changed = self.client.get(self.url(), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_etag_depends_on_page_and_filters(self):
+        first = self.client.get(self.url('api_summoner_matches'))
+        filtered = self.client.get(self.url('api_summoner_matches'), {'result': 'win'},
+                                   HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(filtered.status_code, 200)
+
+    def test_unknown_summoner_is_404_without_riot_calls(self):
+        with mock.patch.object(riot_client, 'get') as riot_get:
+            response = self.client.get(reverse('api_summoner', args=["Nobody", "0000"]))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+        riot_get.assert_not_called()
+
+
+class MatchHistoryFilterTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        Champion.objects.create(key=2, name="OtherChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-filters", gameName="Filters", tagLine="0001", region="europe", server="euw1",
+            last_refreshed=timezone.now(),
+        )
+        day = 86400000
+        ingest_match_payloads([
+            make_match_payload("EUW1_1", self.summ.puuid, queue_id=420, win=True, timestamp_ms=1748600000000),
+            make_match_payload("EUW1_2", self.summ.puuid, queue_id=420, win=False, timestamp_ms=1748600000000 + day),
+            make_match_payload("EUW1_3", self.summ.puuid, queue_id=440, champion_key=2,
+                               timestamp_ms=1748600000000 + 2 * day),
+        ])
+        recalculate_summoner_champions(self.summ)
+        self.url = reverse('summoner_detail', args=[self.summ.gameName, self.summ.tagLine])
+
+    def history(self, **params):
+        response = self.client.get(self.url, {'region': self.summ.region, **params})
+        return sorted(p.match.match_id for p in response.context['page_obj'].object_list)
+
+    def test_each_filter_narrows_history(self):
+        self.assertEqual(self.history(queue=440), ["EUW1_3"])
+        self.assertEqual(self.history(champion=1), ["EUW1_1", "EUW1_2"])
+        self.assertEqual(self.history(result='loss'), ["EUW1_2"])
+        self.assertEqual(self.history(lane='middle'), ["EUW1_1", "EUW1_2", "EUW1_3"])
+        self.assertEqual(self.history(lane='TOP'), [])
+        self.assertEqual(self.history(date_from='2025-05-31', date_to='2025-05-31'), ["EUW1_2"])
+        self.assertEqual(self.history(queue=420, result='win'), ["EUW1_1"])
+
+    def test_invalid_filters_are_ignored(self):
+        response = self.client.get(self.url, {'region': self.summ.region, 'queue': 'abc', 'date_from': 'x'})
+        self.assertEqual(response.context['filters'], {})
+        self.assertEqual(len(response.context['page_obj'].object_list), 3)
+
+    def test_pagination_links_keep_filters(self):
+        ingest_match_payloads([make_match_payload(f"EUW1_x{i}", self.summ.puuid, queue_id=450) for i in range(25)])
+        response = self.client.get(self.url, {'region': self.summ.region, 'queue': 450})
+        self.assertContains(response, "&queue=450")
+        self.assertTrue(response.context['page_obj'].has_next)
+
+    def test_profile_is_revalidated_with_etag(self):
+        params = {'region': self.summ.region, 'queue': 420}
+        response = self.client.get(self.url, params)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('max-age', response['Cache-Control'])
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Odświeżenie bez nowych danych nie zmienia wersji, ale zmienia wyświetlany wiek danych
+        Summoner.objects.filter(pk=self.summ.pk).update(last_refreshed=timezone.now())
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # Nowe zlecenie zmienia stan strony (postęp pobierania), więc kopia w przeglądarce jest nieaktualna
+        enqueue_ingestion(self.summ, IngestionJob.KIND_INITIAL)
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
         self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_page_with_message_is_not_revalidated(self):
+        params = {'region': self.summ.region}
+        etag = self.client.get(self.url, params)['ETag']
+        self.summ.last_refreshed = timezone.now()
+        self.summ.save()
+        response = self.client.post(f"{self.url}?region={self.summ.region}", {'update': '1'})
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "odświeżone przed chwilą")
+        self.assertFalse(response.has_header('ETag'))
+
+
+class HistoryQueryPlanTest(TestCase):
+    """
+    Zapytania historii meczów mają działać z jednej tabeli po indeksach złożonych
+    (summoner, [filtr], timestamp, match) – bez JOIN-a z Match i bez sortowania w pamięci.
+    """
+
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        self.summ = Summoner.objects.create(
+            puuid="puuid-plan", gameName="Plan", tagLine="0001", region="europe", server="euw1"
+        )
+        ingest_match_payloads([make_match_payload(f"EUW1_{i}", self.summ.puuid) for i in range(5)])
+
+    def plan(self, params=''):
+        condition, _ = history_filters(QueryDict(params))
+        queryset = (Participant.objects.filter(condition, summoner=self.summ, timestamp__isnull=False)
+                    .order_by('-timestamp', '-match_id')[:HISTORY_PAGE_SIZE + 1])
+        return queryset.explain()
+
+    def test_denormalized_fields_are_filled_by_ingestion(self):
+        p = Participant.objects.select_related('match__queue').filter(summoner=self.summ).first()
+        self.assertEqual((p.queue_id, p.timestamp), (p.match.queue.queue_id, p.match.timestamp))
+
+    def test_history_and_filters_use_composite_indexes(self):
+        expected = {
+            '': 'participant_summ_ts_idx',
+            'queue=420': 'participant_summ_queue_ts_idx',
+            'champion=1': 'participant_summ_champ_ts_idx',
+            'lane=TOP': 'participant_summ_lane_ts_idx',
+            'result=win': 'participant_summ_win_ts_idx',
+        }
+        for params, index in expected.items():
+            with self.subTest(params=params):
+                plan = self.plan(params)
+                self.assertIn(f'USING INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertNotIn('stats_match', plan)
+
+
+class StaticRegistryTest(TestCase):
+    def setUp(self):
+        Champion.objects.create(key=1, name="TestChamp", icon="url")
+        Queue.objects.create(queue_id=420, description="5v5 Ranked Solo games")
+
+    def test_lookups_are_cached_and_read_only(self):
+        registry = get_registry()
+        with self.assertNumQueries(0):
+            self.assertIs(get_registry(), registry)
+            self.assertEqual(registry.champions[1].name, "TestChamp")
+            self.assertEqual(registry.queues[420].description, "5v5 Ranked Solo games")
+        with self.assertRaises(AttributeError):
+            registry.champions[1].name = "Other"
+        with self.assertRaises(TypeError):
+            registry.champions[2] = registry.champions[1]
+
+    def test_ingestion_uses_registry_instead_of_static_queries(self):
+        get_registry()
+        with CaptureQueriesContext(connection) as queries:
+            ingest_match_payloads([make_match_payload("EUW1_1", "puuid-registry")])
+        static = [q['sql'] for q in queries
+                  if 'FROM "stats_champion"' in q['sql'] or 'FROM "stats_queue"' in q['sql']]
+        self.assertEqual(static, [])
+
+    def test_unknown_champion_reloads_registry_once(self):
+        get_registry()
+        # Champion dodany z pominięciem ORM-owych sygnałów (np. przez inny proces)
+        Champion.objects.bulk_create([Champion(key=2, name="NewChamp", icon="url")])
+        ingest_match_payloads([make_match_payload("EUW1_1", "puuid-registry", champion_key=2)])
+        self.assertEqual(Participant.objects.filter(champion__key=2).count(), 10)
+        self.assertIn(2, get_registry().champions)
+
+
+    def test_version_synced_by_other_process_is_picked_up(self):
+        StaticDataVersion.objects.create(name='ddragon', version="15.11.1")
+        registry = get_registry()
+        # Synchronizacja w innym procesie (cron) – bez sygnałów w tym procesie
+        StaticDataVersion.objects.filter(name='ddragon').update(version="15.12.1")
+        with self.assertNumQueries(0):
+            self.assertIs(get_registry(), registry)
+        with override_settings(STATIC_DATA_CHECK_INTERVAL=0):
+            self.assertEqual(get_registry().ddragon_version, "15.12.1")
+
+
+def make_champions_payload(*champions):
+    return {'data': {name: {'key': str(key), 'name': name, 'image': {'full': f"{name}.png"}}
+                     for key, name in champions}}
+
+
+class StaticDataSyncTest(TestCase):
+    QUEUES = [{'queueId': 420, 'description': "5v5 Ranked Solo games"}]
+
+    def sync(self, version, champions, queues=None, **kwargs):
+        with mock.patch('stats.services.get_ddragon_versions', return_value=[version, "15.10.1"]), \
+             mock.patch('stats.services.get_champions', return_value=make_champions_payload(*champions)) as get_champions, \
+             mock.patch('stats.services.get_queues', return_value=queues or self.QUEUES) as get_queues:
+            result = sync_static_data(**kwargs)
+        return result, get_champions, get_queues
+
+    def test_new_version_is_applied_and_recorded(self):
+        result, get_champions, _ = self.sync("15.12.1", [(1, "Annie"), (2, "Olaf")])
+        get_champions.assert_called_once_with("15.12.1")
+        self.assertEqual(result, {'version': "15.12.1", 'champions': 2, 'queues': 1})
+        self.assertEqual(Champion.objects.get(key=1).icon,
+                         "https://ddragon.leagueoflegends.com/cdn/15.12.1/img/champion/Annie.png")
+        self.assertEqual(get_registry().ddragon_version, "15.12.1")
+
+    def test_unchanged_version_costs_only_the_version_check(self):
+        self.sync("15.12.1", [(1, "Annie")])
+        with self.assertNumQueries(0):
+            result, get_champions, get_queues = self.sync("15.12.1", [(1, "Annie")])
+        self.assertIsNone(result)
+        get_champions.assert_not_called()
+        get_queues.assert_not_called()
+
+    def test_patch_updates_existing_rows_instead_of_duplicating(self):
+        self.sync("15.12.1", [(1, "Annie"), (2, "Olaf")])
+        annie = Champion.objects.get(key=1).pk
+        result, _, _ = self.sync("15.13.1", [(1, "Annie"), (2, "Olaf"), (3, "Galio")])
+        self.assertEqual(result['champions'], 3)  # nowe ikony dwóch championów + nowy champion
+        self.assertEqual(result['queues'], 0)
+        self.assertEqual(Champion.objects.count(), 3)
+        self.assertEqual(Champion.objects.get(key=1).pk, annie)
+        self.assertIn("/15.13.1/", Champion.objects.get(key=1).icon)
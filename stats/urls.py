@@ -1,10 +1,18 @@
 # stats/urls.py
 
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('summoners/', views.summoner_list, name='summoner_list'), 
     path('summoner/<str:gameName>/<str:tagLine>/', views.summoner_detail, name='summoner_detail'),
+    path('summoner/<str:gameName>/<str:tagLine>/jobs/<int:job_id>/', views.job_status, name='job_status'),
+
+    # JSON API (tylko odczyt) – ETag/Last-Modified z wersji danych Summonera
+    path('api/summoners/<str:gameName>/<str:tagLine>/', api.summoner_profile, name='api_summoner'),
+    path('api/summoners/<str:gameName>/<str:tagLine>/queues/', api.summoner_queues, name='api_summoner_queues'),
+    path('api/summoners/<str:gameName>/<str:tagLine>/champions/', api.summoner_champions,
+         name='api_summoner_champions'),
+    path('api/summoners/<str:gameName>/<str:tagLine>/matches/', api.summoner_matches, name='api_summoner_matches'),
 ]
@@ -1,9 +1,24 @@
 # stats/utils.py
 
+import asyncio
+import logging
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
 from django.http import Http404
 
+from .ratelimit import RateLimiter, current_pacer, current_priority
+from .riot_cache import ResponseCache
+
+
+logger = logging.getLogger(__name__)
+
 
 class RateLimitException(Exception):
     """Wyjątek sygnalizujący przekroczony limit zapytań do Riot API."""
@@ -15,9 +30,209 @@ HEADERS = {
     "X-Riot-Token": settings.RIOT_API_KEY,
 }
 
-def get_summoner_by_name_and_tag(gameName: str, tagLine: str, region: str = 'europe') -> dict | None:
-    base_url = f'https://{region.lower()}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}'
-    response = requests.get(base_url, headers=HEADERS)
+DDRAGON_URL = "https://ddragon.leagueoflegends.com"
+
+
+class RiotClient:
+    """
+    Klient HTTP do Riot API. Dla każdego hosta regionalnego (np. europe.api.riotgames.com)
+    trzyma osobną sesję z pulą połączeń keep-alive, dzięki czemu kolejne zapytania
+    nie płacą za nowy handshake TCP+TLS.
+    Jeżeli podano `limiter`, zapytania są dozowane tak, by mieścić się w limitach Riot API,
+    a odpowiedź 429 jest ponawiana po czasie z Retry-After.
+    Z `cache` odpowiedzi są najpierw szukane w cache (TTL zależny od metody Riot API).
+    Klasę priorytetu zapytania (strona, zlecenie użytkownika, praca w tle) ustawia `riot_priority`,
+    a równe odstępy między zapytaniami (harmonogram odświeżania) – `riot_pacing`.
+    """
+
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, pool_size: int | None = None, timeout: float | tuple | None = None,
+                 retries: int | None = None, headers: dict | None = None,
+                 limiter: RateLimiter | None = None, rate_limit_retries: int | None = None,
+                 cache: ResponseCache | None = None):
+        self.pool_size = pool_size or settings.RIOT_HTTP_POOL_SIZE
+        self.timeout = timeout or settings.RIOT_HTTP_TIMEOUT
+        self.retries = settings.RIOT_HTTP_RETRIES if retries is None else retries
+        self.headers = HEADERS if headers is None else headers
+        self.limiter = limiter
+        self.cache = cache
+        self.rate_limit_retries = (settings.RIOT_RATE_LIMIT_RETRIES
+                                   if rate_limit_retries is None else rate_limit_retries)
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+        self.request_count = 0
+
+    def _create_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=0.5,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        return session
+
+    def session_for(self, host: str) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._sessions[host] = self._create_session()
+            return session
+
+    def get(self, url: str, params: dict | None = None, method: str | None = None,
+            authenticated: bool = True) -> requests.Response:
+        """
+        Wysyła GET przez sesję przypisaną do hosta z `url`.
+        `method` to nazwa metody Riot API, dla której liczony jest osobny limit i czas życia w cache.
+        Klucz API i limiter dotyczą tylko zapytań `authenticated` (statyczne pliki
+        Data Dragon ich nie potrzebują).
+        """
+        if self.cache and method:
+            cached = self.cache.get(url, params)
+            if cached is not None:
+                return cached
+        response = self._send(url, params, method, authenticated)
+        if self.cache and method:
+            self.cache.set(url, params, method, response)
+        return response
+
+    def _send(self, url: str, params: dict | None, method: str | None, authenticated: bool) -> requests.Response:
+        host = urlsplit(url).netloc
+        session = self.session_for(host)
+        if not authenticated:
+            return session.get(url, params=params, headers=None, timeout=self.timeout)
+
+        pacer = current_pacer()
+        for _ in range(self.rate_limit_retries + 1):
+            if pacer:
+                pacer.pace(host)
+            if self.limiter and not self.limiter.acquire(host, method, priority=current_priority()):
+                raise RateLimitException("Przekroczono limit zapytań do Riot API.")
+            response = session.get(url, params=params, headers=self.headers, timeout=self.timeout)
+            with self._lock:
+                self.request_count += 1
+            if self.limiter is None:
+                break
+            self.limiter.update_from_headers(host, method, response.headers)
+            if response.status_code != 429:
+                break
+            self.limiter.block(host, method,
+                               float(response.headers.get('Retry-After', 1)),
+                               response.headers.get('X-Rate-Limit-Type'))
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class AsyncRiotClient:
+    """
+    Asynchroniczny odpowiednik RiotClient (httpx) dla ścieżki ASGI – oczekiwanie na Riot API
+    i na budżet limitera nie blokuje wątku, więc jeden proces obsługuje wiele zapytań naraz.
+    Limiter i cache są te same co w RiotClient (pliki SQLite), więc budżet klucza jest wspólny.
+    Pula połączeń httpx jest osobna dla każdej pętli zdarzeń (klienta nie można przenosić między pętlami).
+    """
+
+    RETRY_STATUSES = RiotClient.RETRY_STATUSES
+
+    def __init__(self, pool_size: int | None = None, timeout: float | tuple | None = None,
+                 retries: int | None = None, headers: dict | None = None,
+                 limiter: RateLimiter | None = None, rate_limit_retries: int | None = None,
+                 cache: ResponseCache | None = None):
+        self.pool_size = pool_size or settings.RIOT_HTTP_POOL_SIZE
+        self.timeout = timeout or settings.RIOT_HTTP_TIMEOUT
+        self.retries = settings.RIOT_HTTP_RETRIES if retries is None else retries
+        self.headers = HEADERS if headers is None else headers
+        self.limiter = limiter
+        self.cache = cache
+        self.rate_limit_retries = (settings.RIOT_RATE_LIMIT_RETRIES
+                                   if rate_limit_retries is None else rate_limit_retries)
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.request_count = 0
+
+    def _create_client(self) -> httpx.AsyncClient:
+        connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+        transport = httpx.AsyncHTTPTransport(
+            retries=self.retries,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+        return httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(read, connect=connect))
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._create_client()
+        return client
+
+    async def get(self, url: str, params: dict | None = None, method: str | None = None,
+                  authenticated: bool = True):
+        """
+        Jak RiotClient.get: `method` wybiera limit i czas życia w cache, a klasa priorytetu
+        pochodzi z kontekstu (`riot_priority`; zadania asyncio dziedziczą go przy tworzeniu).
+        """
+        if self.cache and method:
+            cached = await asyncio.to_thread(self.cache.get, url, params)
+            if cached is not None:
+                return cached
+        response = await self._send(url, params, method, authenticated)
+        if self.cache and method:
+            await asyncio.to_thread(self.cache.set, url, params, method, response)
+        return response
+
+    async def _send(self, url: str, params: dict | None, method: str | None, authenticated: bool) -> httpx.Response:
+        if not authenticated:
+            return await self._get(url, params, None)
+
+        host = urlsplit(url).netloc
+        pacer = current_pacer()
+        for _ in range(self.rate_limit_retries + 1):
+            if pacer:
+                await pacer.apace(host)
+            if self.limiter and not await self.limiter.aacquire(host, method, priority=current_priority()):
+                raise RateLimitException("Przekroczono limit zapytań do Riot API.")
+            response = await self._get(url, params, self.headers)
+            if self.limiter is None:
+                break
+            await asyncio.to_thread(self.limiter.update_from_headers, host, method, response.headers)
+            if response.status_code != 429:
+                break
+            await asyncio.to_thread(self.limiter.block, host, method,
+                                    float(response.headers.get('Retry-After', 1)),
+                                    response.headers.get('X-Rate-Limit-Type'))
+        return response
+
+    async def _get(self, url: str, params: dict | None, headers: dict | None) -> httpx.Response:
+        # Błędy połączenia ponawia transport httpx, a odpowiedzi 5xx – ta pętla (jak Retry w RiotClient)
+        for attempt in range(self.retries + 1):
+            response = await self.client().get(url, params=params, headers=headers)
+            self.request_count += 1
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                return response
+            await asyncio.sleep(0.5 * 2 ** attempt)
+        return response
+
+    async def aclose(self) -> None:
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+riot_client = RiotClient(limiter=RateLimiter(), cache=ResponseCache())
+async_riot_client = AsyncRiotClient(limiter=riot_client.limiter, cache=riot_client.cache)
+
+def _riot_id_url(gameName: str, tagLine: str, region: str) -> str:
+    return f'https://{region.lower()}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{gameName}/{tagLine}'
+
+
+def _riot_id_result(response, gameName: str, tagLine: str) -> dict | None:
     match response.status_code:
         case 200:
             return response.json()
@@ -27,10 +242,35 @@ def get_summoner_by_name_and_tag(gameName: str, tagLine: str, region: str = 'eur
             raise RateLimitException("Przekroczono limit zapytań do Riot API.")
         case _:
             raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
-    
-def get_summoner_server(puuid: str) -> str | None:
-    base_url = f'https://europe.api.riotgames.com/riot/account/v1/region/by-game/lol/by-puuid/{puuid}'
-    response = requests.get(base_url, headers=HEADERS)
+
+
+def get_summoner_by_name_and_tag(gameName: str, tagLine: str, region: str = 'europe') -> dict | None:
+    response = riot_client.get(_riot_id_url(gameName, tagLine, region), method='account-v1.by-riot-id')
+    return _riot_id_result(response, gameName, tagLine)
+
+
+async def aget_summoner_by_name_and_tag(gameName: str, tagLine: str, region: str = 'europe') -> dict | None:
+    response = await async_riot_client.get(_riot_id_url(gameName, tagLine, region), method='account-v1.by-riot-id')
+    return _riot_id_result(response, gameName, tagLine)
+
+def get_account_by_puuid(puuid: str, region: str = 'europe') -> dict | None:
+    base_url = f'https://{region.lower()}.api.riotgames.com/riot/account/v1/accounts/by-puuid/{puuid}'
+    response = riot_client.get(base_url, method='account-v1.by-puuid')
+    match response.status_code:
+        case 200:
+            return response.json()
+        case 404:
+            raise Http404(f"Nie znaleziono konta w bazie Riot API o puuid {puuid}.")
+        case 429:
+            raise RateLimitException("Przekroczono limit zapytań do Riot API.")
+        case _:
+            raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
+
+def _summoner_server_url(puuid: str) -> str:
+    return f'https://europe.api.riotgames.com/riot/account/v1/region/by-game/lol/by-puuid/{puuid}'
+
+
+def _summoner_server_result(response, puuid: str) -> str | None:
     match response.status_code:
         case 200:
             return response.json().get('region')
@@ -41,17 +281,27 @@ def get_summoner_server(puuid: str) -> str | None:
         case _:
             raise Http404(f"Nieoczekiwany błąd Riot API: {response.status_code}")
 
-def get_match_ids_by_puuid(puuid: str, region: str, count: int = 100, start: int = 0) -> list[str]:
-    """
-    Pobiera ostatnie `count` ID meczów dla danego puuid (Summoner).
-    Używa endpointu Match-V5: 
-      GET https://<kontynent>.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?count={count}
-    Zwraca listę stringów (match ID).
-    """
+
+def get_summoner_server(puuid: str) -> str | None:
+    response = riot_client.get(_summoner_server_url(puuid), method='account-v1.region-by-puuid')
+    return _summoner_server_result(response, puuid)
+
+
+async def aget_summoner_server(puuid: str) -> str | None:
+    response = await async_riot_client.get(_summoner_server_url(puuid), method='account-v1.region-by-puuid')
+    return _summoner_server_result(response, puuid)
+
+
+def _match_ids_request(puuid: str, region: str, count: int, start: int, start_time: int | None) -> tuple[str, dict]:
     continent = region
     url = f"https://{continent}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
     params = {'start': start, 'count': count}
-    response = requests.get(url, params=params, headers=HEADERS)
+    if start_time is not None:
+        params['startTime'] = start_time
+    return url, params
+
+
+def _match_ids_result(response, puuid: str) -> list[str]:
     match response.status_code:
         case 200:
             return response.json()
@@ -63,16 +313,33 @@ def get_match_ids_by_puuid(puuid: str, region: str, count: int = 100, start: int
             raise Http404(f"Nieoczekiwany błąd Riot API: {response.status_code}")
 
 
-def get_match_by_id(match_id: str, region: str) -> dict | None:
+def get_match_ids_by_puuid(puuid: str, region: str, count: int = 100, start: int = 0,
+                           start_time: int | None = None) -> list[str]:
     """
-    Pobiera szczegóły meczu po jego match_id (string typu “EUW1_1234567890”).
-    Używa endpointu Match-V5:
-      GET https://<kontynent>.api.riotgames.com/lol/match/v5/matches/{match_id}
-    Zwraca JSON z wszystkimi danymi meczu (participants, gameDuration, queueId, gameStartTimestamp itd.)
+    Pobiera ostatnie `count` ID meczów dla danego puuid (Summoner).
+    Używa endpointu Match-V5: 
+      GET https://<kontynent>.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?count={count}
+    `start_time` (epoch w sekundach) zawęża listę do meczów rozpoczętych od tego momentu.
+    Zwraca listę stringów (match ID).
     """
+    url, params = _match_ids_request(puuid, region, count, start, start_time)
+    response = riot_client.get(url, params=params, method='match-v5.match-ids')
+    return _match_ids_result(response, puuid)
+
+
+async def aget_match_ids_by_puuid(puuid: str, region: str, count: int = 100, start: int = 0,
+                                  start_time: int | None = None) -> list[str]:
+    url, params = _match_ids_request(puuid, region, count, start, start_time)
+    response = await async_riot_client.get(url, params=params, method='match-v5.match-ids')
+    return _match_ids_result(response, puuid)
+
+
+def _match_url(match_id: str, region: str) -> str:
     continent = region
-    url = f"https://{continent}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    response = requests.get(url, headers=HEADERS)
+    return f"https://{continent}.api.riotgames.com/lol/match/v5/matches/{match_id}"
+
+
+def _match_result(response) -> dict | None:
     match response.status_code:
         case 200:
             return response.json()
@@ -84,9 +351,21 @@ def get_match_by_id(match_id: str, region: str) -> dict | None:
             raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
 
 
-def get_summoner_info_by_puuid(puuid: str, server: str) -> dict | None:
-    url = f"https://{server}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
-    response = requests.get(url, headers=HEADERS)
+def get_match_by_id(match_id: str, region: str) -> dict | None:
+    """
+    Pobiera szczegóły meczu po jego match_id (string typu “EUW1_1234567890”).
+    Używa endpointu Match-V5:
+      GET https://<kontynent>.api.riotgames.com/lol/match/v5/matches/{match_id}
+    Zwraca JSON z wszystkimi danymi meczu (participants, gameDuration, queueId, gameStartTimestamp itd.)
+    """
+    return _match_result(riot_client.get(_match_url(match_id, region), method='match-v5.match'))
+
+
+async def aget_match_by_id(match_id: str, region: str) -> dict | None:
+    return _match_result(await async_riot_client.get(_match_url(match_id, region), method='match-v5.match'))
+
+
+def _summoner_info_result(response, puuid: str) -> dict | None:
     match response.status_code:
         case 200:
             return response.json()
@@ -98,9 +377,17 @@ def get_summoner_info_by_puuid(puuid: str, server: str) -> dict | None:
             raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
 
 
-def get_queues_info_by_summoner_id(summoner_id: str, server: str) -> dict | None:
-    url = f"https://{server}.api.riotgames.com/lol/league/v4/entries/by-summoner/{summoner_id}"
-    response = requests.get(url, headers=HEADERS)
+def get_summoner_info_by_puuid(puuid: str, server: str) -> dict | None:
+    url = f"https://{server}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
+    return _summoner_info_result(riot_client.get(url, method='summoner-v4.by-puuid'), puuid)
+
+
+async def aget_summoner_info_by_puuid(puuid: str, server: str) -> dict | None:
+    url = f"https://{server}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
+    return _summoner_info_result(await async_riot_client.get(url, method='summoner-v4.by-puuid'), puuid)
+
+
+def _queues_info_result(response, summoner_id: str) -> dict | None:
     match response.status_code:
         case 200:
             return response.json()
@@ -112,15 +399,25 @@ def get_queues_info_by_summoner_id(summoner_id: str, server: str) -> dict | None
             raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
 
 
+def get_queues_info_by_summoner_id(summoner_id: str, server: str) -> dict | None:
+    url = f"https://{server}.api.riotgames.com/lol/league/v4/entries/by-summoner/{summoner_id}"
+    return _queues_info_result(riot_client.get(url, method='league-v4.by-summoner'), summoner_id)
+
+
+async def aget_queues_info_by_summoner_id(summoner_id: str, server: str) -> dict | None:
+    url = f"https://{server}.api.riotgames.com/lol/league/v4/entries/by-summoner/{summoner_id}"
+    return _queues_info_result(await async_riot_client.get(url, method='league-v4.by-summoner'), summoner_id)
+
+
 def get_queues():
     """
     Pobiera wszystkie istniejące kolejki gier
     """
     url = "https://static.developer.riotgames.com/docs/lol/queues.json"
-    response = requests.get(url)
+    response = riot_client.get(url, method='static.queues', authenticated=False)
     match response.status_code:
         case 200:
-            print("Uzyskano kolejki z API.")
+            logger.info("Uzyskano kolejki z API.")
             return response.json()
         case 404:
             raise Exception("Pusty wynik żądania do Riot API Queues")
@@ -128,17 +425,38 @@ def get_queues():
             raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
 
 
-def get_champions():
+def get_ddragon_versions():
     """
-    Pobiera wszystkie istniejące postacie
+    Pobiera listę wersji Data Dragon (od najnowszej)
     """
-    url = "https://ddragon.leagueoflegends.com/cdn/15.11.1/data/en_US/champion.json"
-    response = requests.get(url)
+    url = f"{DDRAGON_URL}/api/versions.json"
+    response = riot_client.get(url, method='ddragon.versions', authenticated=False)
     match response.status_code:
         case 200:
-            print("Uzyskano bohaterów z API.")
+            return response.json()
+        case _:
+            raise Exception(f"Nieoczekiwany błąd Data Dragon: {response.status_code}")
+
+
+def get_champions(version: str):
+    """
+    Pobiera wszystkie istniejące postacie dla danej wersji Data Dragon
+    """
+    url = f"{DDRAGON_URL}/cdn/{version}/data/en_US/champion.json"
+    response = riot_client.get(url, method='ddragon.champions', authenticated=False)
+    match response.status_code:
+        case 200:
+            logger.info("Uzyskano bohaterów z API.")
             return response.json()
         case 404:
             raise Exception("Pusty wynik żądania do Riot API Champions")
         case _:
-            raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
\ No newline at end of file
+            raise Exception(f"Nieoczekiwany błąd Riot API: {response.status_code}")
+
+
+def champion_icon_url(version: str, image: str) -> str:
+    return f"{DDRAGON_URL}/cdn/{version}/img/champion/{image}"
+
+
+def profile_icon_url(version: str, icon_id) -> str:
+    return f"{DDRAGON_URL}/cdn/{version}/img/profileicon/{icon_id}.png"
\ No newline at end of file
@@ -1,12 +1,87 @@
-from django.shortcuts import render, redirect
+import logging
+from datetime import date, datetime, time, timedelta
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib import messages
-from django.http import Http404, HttpResponseRedirect
+from django.middleware.csrf import get_token
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
 from django.urls import reverse
-from .models import (Summoner, Participant, Champion, Queue, Match, SummonerChampion)
-from .utils import (RateLimitException, get_summoner_by_name_and_tag, get_summoner_server)
-from .services import (save_recent_matches_for_summoner, save_champions, save_queues, save_summoner_rank_info, recalculate_summoner_advanced_stats, recalculate_summoner_champions)
+from django.utils.safestring import mark_safe
+from .models import (Summoner, Participant, Champion, Queue, Match, SummonerChampion, SummonerChampionBreakdown,
+                     SummonerQueueStats, IngestionJob)
+from .utils import (RateLimitException, aget_summoner_by_name_and_tag, aget_summoner_server)
+from .services import (sync_static_data, link_summoner_participants)
+from .jobs import (RefreshCooldown, active_job_for, enqueue_ingestion, is_stale)
+from .pagination import KeysetPage
+from .page_cache import cached_render, page_cache_key
+from .scheduler import record_view
+from .registry import get_registry
+
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = 20
+
+HISTORY_LANES = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'NONE']
+HISTORY_RESULTS = {'win': True, 'loss': False}
+
+
+def history_filters(params) -> tuple[Q, dict]:
+    """
+    Buduje filtr historii meczów z parametrów GET (queue, champion, lane, result, date_from, date_to).
+    Zwraca warunek dla querysetu Participant oraz poprawne wartości filtrów
+    (do formularza i linków stronicowania); niepoprawne parametry są pomijane.
+    """
+    condition = Q()
+    active = {}
+
+    for name in ('queue', 'champion'):
+        try:
+            active[name] = int(params.get(name, ''))
+        except ValueError:
+            continue
+    if 'queue' in active:
+        condition &= Q(queue_id=active['queue'])
+    if 'champion' in active:
+        # Porównanie z kluczem obcym zamiast JOIN-a po Champion.key – filtr trafia w indeks (summoner, champion, ...)
+        condition &= Q(champion=get_registry().champion_pk(active['champion']))
+
+    lane = params.get('lane', '').upper()
+    if lane in HISTORY_LANES:
+        aliases = [alias for alias, field in SummonerQueueStats.LANE_FIELDS.items()
+                   if field == SummonerQueueStats.LANE_FIELDS.get(lane)]
+        if aliases:
+            condition &= Q(lane__in=aliases)
+        else:
+            condition &= Q(lane__isnull=True) | ~Q(lane__in=list(SummonerQueueStats.LANE_FIELDS))
+        active['lane'] = lane
+
+    result = params.get('result', '')
+    if result in HISTORY_RESULTS:
+        # `win IN (x)` zamiast `win = x`: Django zapisuje to drugie jako samą kolumnę ("WHERE win"),
+        # czego SQLite nie dopasowuje do indeksu (summoner, win, ...)
+        condition &= Q(win__in=[HISTORY_RESULTS[result]])
+        active['result'] = result
+
+    for name, lookup, shift in (('date_from', 'timestamp__gte', 0), ('date_to', 'timestamp__lt', 1)):
+        try:
+            day = date.fromisoformat(params.get(name, ''))
+        except ValueError:
+            continue
+        start = timezone.make_aware(datetime.combine(day + timedelta(days=shift), time.min))
+        condition &= Q(**{lookup: start})
+        active[name] = day.isoformat()
+
+    return condition, active
 
 
 def home(request):
@@ -15,13 +90,18 @@ def home(request):
     Po wciśnięciu Submit przenosi Cię do /summoner/<name>/?region=<region>
     """
 
-    if not Champion.objects.exists():
-        save_champions()
-    
-    if not Queue.objects.exists():
-        save_queues()
-        
-    
+    # Rejestr danych statycznych wczytywany jest raz na proces – bez zapytań przy każdym wejściu.
+    # Pusta baza (świeża instalacja) jest uzupełniana od razu; później dba o to `sync_static_data`.
+    # Po nieudanej próbie (np. brak sieci) kolejna najwcześniej po STATIC_DATA_SYNC_RETRY sekundach,
+    # a nie przy każdym wejściu na stronę główną
+    registry = get_registry()
+    if (not registry.champions or not registry.queues) \
+            and cache.add('static-data-sync', 1, timeout=settings.STATIC_DATA_SYNC_RETRY):
+        try:
+            sync_static_data()
+        except Exception:
+            logger.exception("Nie udało się zsynchronizować danych statycznych.")
+
     if request.method == 'POST':
         gameName = request.POST.get('gameName').strip()
         tagLine = request.POST.get('tagLine').strip()
@@ -32,37 +112,43 @@ def home(request):
     return render(request, 'stats/home.html')
 
 
-def summoner_detail(request, gameName, tagLine):
+async def summoner_detail(request, gameName, tagLine):
     """
     1) Próba znalezienia w bazie Summonera (po 'name' i 'region').
-    2) Jeśli nie ma – pobieramy z Riot API i zapisujemy do bazy.
-    3) Jeśli API zwróci błąd (404), to rzucamy Http404.
-    4) Wyświetlamy szablon z danymi Summonera.
+    2) Jeśli nie ma – pobieramy konto z Riot API, zapisujemy do bazy
+       i zlecamy pobranie rangi oraz historii w tle (IngestionJob).
+    3) Jeśli API zwróci błąd (404), to przekierowujemy na stronę główną.
+    4) Wyświetlamy szablon z danymi, które są już w bazie; strona odpytuje
+       `job_status` i odświeża się po zakończeniu zlecenia.
+
+    Widok jest asynchroniczny: pod ASGI czekanie na Riot API przy pierwszym wyszukaniu
+    nie blokuje wątku, więc jeden proces obsługuje naraz wiele takich wyszukiwań.
     """
     region = request.GET.get('region', 'europe')
 
     try:
-        summ = Summoner.objects.get(gameName__iexact=gameName,
-                                    tagLine__iexact=tagLine,
-                                    region=region)
+        summ = await Summoner.objects.aget(gameName__iexact=gameName,
+                                           tagLine__iexact=tagLine,
+                                           region=region)
     except Summoner.DoesNotExist:
         try:
-            summ = Summoner.objects.get(gameName__iexact=gameName, tagLine__iexact=tagLine)
+            summ = await Summoner.objects.aget(gameName__iexact=gameName, tagLine__iexact=tagLine)
             region = summ.region
         except Summoner.DoesNotExist:
             try:
-                data = get_summoner_by_name_and_tag(gameName, tagLine, region)
+                data = await aget_summoner_by_name_and_tag(gameName, tagLine, region)
                 if data:
-                    server = get_summoner_server(data['puuid'])
-                    summ = Summoner.objects.create(
+                    server = await aget_summoner_server(data['puuid'])
+                    summ = await Summoner.objects.acreate(
                         puuid=data['puuid'],
                         gameName=data['gameName'],
                         tagLine=data['tagLine'],
                         region=region,
                         server=server,
                     )
-                    save_summoner_rank_info(summ)
-                    
+                    await sync_to_async(link_summoner_participants)(summ)
+                    await sync_to_async(enqueue_ingestion)(summ, IngestionJob.KIND_INITIAL)
+
             except Http404 as e:
                 messages.error(request, "Nie ma takiego gracza na serwerze Riot API.")
                 return redirect('home')
@@ -72,64 +158,159 @@ def summoner_detail(request, gameName, tagLine):
             except Exception as e:
                 messages.error(request, f"Błąd: {e}")
                 return redirect('home')
-    
-    try:
-        if request.method == 'POST' and request.POST.get('update') == '1':
-            Participant.objects.filter(summoner=summ).delete()
 
-            save_recent_matches_for_summoner(summ, force_get_data=True)
-            recalculate_summoner_advanced_stats(summ)
-            recalculate_summoner_champions(summ)
+    return await sync_to_async(_summoner_page)(request, summ, region)
 
-            url = reverse('summoner_detail', args=[summ.gameName, summ.tagLine])
-            return HttpResponseRedirect(f"{url}?region={region}")
 
-        if not Participant.objects.filter(summoner=summ).exists():
-            save_recent_matches_for_summoner(summ)
-            recalculate_summoner_advanced_stats(summ)
-            recalculate_summoner_champions(summ)
-        else:
-            recalculate_summoner_advanced_stats(summ)
-            recalculate_summoner_champions(summ)
-    except Http404 as e:
-        messages.error(request, "Nie ma takiego gracza na serwerze Riot API.")
-        return redirect('home')
-    
-    except RateLimitException as e:
-        messages.error(request, "Przekroczono limit zapytań do Riot API.")
-        return redirect('home')
-    
-    except Exception as e:
-        messages.error(request, f"Błąd: {e}")
-        return redirect('home')
-    
-    top_champs = SummonerChampion.objects.filter(summoner=summ) \
-                                         .select_related('champion') \
-                                         .order_by('-matches_num')[:5]
-
-    participants = Participant.objects.filter(summoner=summ).select_related('match').order_by('-match__timestamp')
-
-    # Paginator – po 20 pozycji na stronę
-    paginator = Paginator(participants, 20)
-
-    # Numer aktualnej strony z GET:
-    page_number = request.GET.get('page', 1)
-    try:
-        page_obj = paginator.get_page(page_number)
-    except:
-        # Jeśli podano niepoprawny numer lub spoza zakresu, pokaż pierwszą stronę:
-        page_obj = paginator.get_page(1)
+def _summoner_page(request, summ: Summoner, region: str):
+    """
+    Synchroniczna część `summoner_detail` (zlecenia, render fragmentów z cache) – wykonywana w wątku bazy.
+    """
+    if request.method == 'POST' and request.POST.get('update') == '1':
+        try:
+            enqueue_ingestion(summ, IngestionJob.KIND_UPDATE)
+            messages.info(request, "Zlecono aktualizację historii meczów i statystyk.")
+        except RefreshCooldown as e:
+            messages.info(request, f"Dane zostały odświeżone przed chwilą. {e}")
+        url = reverse('summoner_detail', args=[summ.gameName, summ.tagLine])
+        return HttpResponseRedirect(f"{url}?region={region}")
+
+    job = active_job_for(summ)
+    if job is None and summ.last_refreshed is None and not Participant.objects.filter(summoner=summ).exists() \
+            and not summ.jobs.filter(status=IngestionJob.STATUS_DONE).exists():
+        job = enqueue_ingestion(summ, IngestionJob.KIND_INITIAL)
+    elif job is None and is_stale(summ):
+        # Stale-while-revalidate: zapisane dane pokazujemy od razu, a odświeżenie rangi i nowych meczów
+        # idzie w tle – nowa wersja danych pojawi się przy następnym wejściu
+        try:
+            job = enqueue_ingestion(summ, IngestionJob.KIND_REFRESH)
+        except RefreshCooldown:
+            pass
+    record_view(summ)
+
+    # Profil i strona historii renderowane są raz na wersję danych Summonera – przy trafieniu
+    # w cache widok wykonuje tylko zapytania o Summonera i aktywne zlecenie
+    condition, filters = history_filters(request.GET)
+    after, before = request.GET.get('after'), request.GET.get('before')
+
+    # Strona niesie komunikaty, formularz z tokenem CSRF i stan zlecenia, więc przeglądarka musi ją zawsze
+    # walidować (no-cache). ETag z wersji danych, parametrów, zlecenia, wieku danych i sekretu CSRF daje przy
+    # powtórnym wejściu 304 bez renderowania; strony z komunikatem nie dostają ETag-a
+    etag = None
+    if not len(messages.get_messages(request)):
+        etag = quote_etag(page_cache_key(
+            'page', summ, region, after, before, sorted(filters.items()),
+            job and (job.pk, job.status), summ.last_refreshed, _csrf_secret(request),
+        ).replace(':', '-'))
+        conditional = get_conditional_response(request, etag=etag)
+        if conditional is not None:
+            return _profile_cache_headers(conditional, etag)
+
+    summary_html = cached_render(
+        'summary', summ, (),
+        lambda: render_to_string('stats/summoner_summary.html', summary_context(summ)),
+    )
+    history_html = cached_render(
+        'history', summ, (region, after, before, sorted(filters.items())),
+        lambda: render_to_string('stats/summoner_history.html',
+                                 history_context(summ, condition, filters, region, after, before)),
+    )
 
     context = {
         'summoner': summ,
+        'summary_html': mark_safe(summary_html),
+        'history_html': mark_safe(history_html),
+        'region': region,
+        'job': job,
+    }
+
+    response = render(request, 'stats/summoner_detail.html', context)
+    return _profile_cache_headers(response, etag)
+
+
+def _csrf_secret(request) -> str:
+    get_token(request)  # przy pierwszym wejściu sekret powstaje dopiero teraz
+    return request.META['CSRF_COOKIE']
+
+
+def _profile_cache_headers(response, etag: str | None):
+    if etag:
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def summary_context(summ: Summoner) -> dict:
+    # Statystyki wszystkich kolejek czytane wprost z sum utrzymywanych przy zapisie meczów
+    queue_stats = SummonerQueueStats.objects.filter(summoner=summ, games__gt=0) \
+                                            .select_related('queue') \
+                                            .order_by('-games')
+
+    top_champs = list(SummonerChampion.objects.filter(summoner=summ)
+                                              .select_related('champion')
+                                              .order_by('-matches_num')[:5])
+
+    # Najczęściej grana rola na każdym z top championów (z rozbicia champion/kolejka/rola)
+    champ_roles = {}
+    role_rows = SummonerChampionBreakdown.objects.filter(summoner=summ, champion__in=[sc.champion_id for sc in top_champs]) \
+                                                 .values('champion', 'lane') \
+                                                 .annotate(games=Sum('matches_num')) \
+                                                 .order_by('-games')
+    for row in role_rows:
+        champ_roles.setdefault(row['champion'], row['lane'])
+    for sc in top_champs:
+        sc.main_role = champ_roles.get(sc.champion_id)
+
+    return {
+        'summoner': summ,
+        'queue_stats': queue_stats,
         'top_champs': top_champs,
-        'participants': participants,
-        'paginator': paginator,
+    }
+
+
+def history_context(summ: Summoner, condition: Q, filters: dict, region: str,
+                    after: str | None, before: str | None) -> dict:
+    # Historia stronicowana kursorem (timestamp, match) – stały koszt strony niezależnie od długości historii
+    participants = Participant.objects.filter(condition, summoner=summ) \
+                                      .select_related('match', 'match__queue', 'champion')
+    page_obj = KeysetPage(participants, HISTORY_PAGE_SIZE, after=after, before=before)
+
+    # Przybliżona liczba meczów z sum per kolejka (bez COUNT(*) po historii)
+    queue_stats = list(SummonerQueueStats.objects.filter(summoner=summ, games__gt=0)
+                                                 .select_related('queue')
+                                                 .order_by('-games'))
+    estimated_total = sum(qs.games for qs in queue_stats)
+
+    # Championy do formularza filtrów – tylko te, którymi Summoner grał
+    champion_choices = Champion.objects.filter(summonerchampion__summoner=summ).order_by('name')
+
+    return {
+        'queue_stats': queue_stats,
         'page_obj': page_obj,
-        'region': region
+        'estimated_total': estimated_total,
+        'filters': filters,
+        'filter_query': urlencode(filters),
+        'champion_choices': champion_choices,
+        'history_lanes': HISTORY_LANES,
+        'region': region,
     }
 
-    return render(request, 'stats/summoner_detail.html', context)
+
+def job_status(request, gameName, tagLine, job_id):
+    """
+    Zwraca w JSON-ie stan zlecenia pobrania danych (odpytywane przez stronę profilu).
+    Zlecenie musi należeć do Summonera z adresu – samo kolejne ID nie wystarcza.
+    """
+    job = get_object_or_404(IngestionJob, pk=job_id, summoner__gameName__iexact=gameName,
+                            summoner__tagLine__iexact=tagLine)
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'finished_at': job.finished_at,
+    })
 
 
 def summoner_list(request):